@@ -1,51 +1,40 @@
-import asyncio
 import json
-from typing import Any, Dict, Set
+from typing import Dict, Optional
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 import os
 from dotenv import load_dotenv
 
 from .routers.analysis import router as analysis_router
+from .routers.diagnostics import router as diagnostics_router
+from .routers.jobs import router as jobs_router
+from .routers.records import router as records_router
+from .routers.stats import router as stats_router
 from .services.db import init_db, close_db
-
-
-class ConnectionManager:
-    """Tracks active WebSocket connections and provides broadcast helpers."""
-
-    def __init__(self) -> None:
-        self.active_connections: Set[WebSocket] = set()
-
-    async def connect(self, websocket: WebSocket) -> None:
-        await websocket.accept()
-        self.active_connections.add(websocket)
-
-    def disconnect(self, websocket: WebSocket) -> None:
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-
-    async def broadcast(self, message: Dict[str, Any]) -> None:
-        if not self.active_connections:
-            return
-        data = json.dumps(message)
-        send_tasks = []
-        for connection in list(self.active_connections):
-            send_tasks.append(self._safe_send(connection, data))
-        await asyncio.gather(*send_tasks, return_exceptions=True)
-
-    async def _safe_send(self, websocket: WebSocket, data: str) -> None:
-        try:
-            await websocket.send_text(data)
-        except Exception:
-            # Drop bad connection silently
-            self.disconnect(websocket)
-
+from .services.graph_service import init_graph, close_graph
+from .services.http_client import init_http_client, close_http_client
+from .services.html_extract import close_html_pool
+from .services.vector_store import init_vector_store, close_vector_store
+from .services.ann_index import ANN_TOPIC, init_ann_index, close_ann_index, receive_shared
+from .services.outbox import init_outbox, close_outbox
+from .services.rollups import init_rollups, close_rollups
+from .services.sentiment import init_sentiment
+from .services.jobs import get_job_manager
+from .services.threat_feed import THREAT_FEED_TOPIC, get_threat_feed
+from .services.leader import LeaderLease
+from .services.ws_logger import configure_logging, get_log_pipeline
+from .services.event_bus import create_event_bus
+from .services.metrics import get_metrics
+from .services.rate_limit import render_prometheus as render_limiter_metrics
+from .services.ws_manager import ConnectionManager
 
 
 # Load environment variables from backend/.env if present
 load_dotenv()
+configure_logging()
 
 manager = ConnectionManager()
 
@@ -62,24 +51,41 @@ app.add_middleware(
 
 # Routers
 app.include_router(analysis_router, prefix="/api/v1", tags=["analysis"])
+app.include_router(jobs_router, prefix="/api/v1/jobs", tags=["jobs"])
+app.include_router(records_router, prefix="/api/v1/records", tags=["records"])
+app.include_router(stats_router, prefix="/api/v1/stats", tags=["stats"])
+app.include_router(diagnostics_router, prefix="/api/v1/diagnostics", tags=["diagnostics"])
 
 
 @app.websocket("/ws/threats")
-async def websocket_threats(websocket: WebSocket) -> None:
-    """Simple WebSocket pushing demo threat alerts periodically."""
-    await manager.connect(websocket)
+async def websocket_threats(websocket: WebSocket, topics: Optional[str] = None) -> None:
+    """WebSocket streaming logs, threat alerts and job results.
+
+    ``?topics=logs,threats,jobs`` limits what the client receives (default:
+    everything). Clients can change it later by sending
+    ``{"action": "subscribe"|"unsubscribe", "topics": [...]}`` and check the
+    connection with ``{"action": "ping"}``. Alerts themselves come from the
+    shared threat feed (``services.threat_feed``), not from this handler.
+    """
+    await manager.connect(websocket, topics.split(",") if topics else None)
     try:
-        # Keep the connection alive and send periodic pings
         while True:
-            await asyncio.sleep(15)
-            await manager.broadcast(
-                {
-                    "type": "threat",
-                    "level": "L3",
-                    "message": "Rising sentiment anomaly detected",
-                }
-            )
+            try:
+                request = json.loads(await websocket.receive_text())
+            except ValueError:
+                continue
+            if not isinstance(request, dict):
+                continue
+            action = request.get("action")
+            if action == "subscribe":
+                manager.subscribe(websocket, request.get("topics") or [])
+            elif action == "unsubscribe":
+                manager.unsubscribe(websocket, request.get("topics") or [])
+            elif action == "ping":
+                await manager.send_to(websocket, {"type": "pong", "ts": request.get("ts")})
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect(websocket)
 
 
@@ -93,6 +99,12 @@ async def health() -> Dict[str, str]:
     return {"status": "ok"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics() -> PlainTextResponse:
+    """Stage/dependency latency histograms, provider limiter gauges and error counters (Prometheus format)."""
+    return PlainTextResponse(get_metrics().render_prometheus() + render_limiter_metrics(), media_type="text/plain; version=0.0.4")
+
+
 # Expose manager to other modules
 def get_ws_manager() -> ConnectionManager:
     return manager
@@ -100,13 +112,64 @@ def get_ws_manager() -> ConnectionManager:
 
 @app.on_event("startup")
 async def on_startup() -> None:
+    # Cross-worker event bus (EVENT_BUS=local|unix|redis|memory)
+    await manager.attach_bus(create_event_bus())
+    # Batched log streaming to WebSocket clients
+    get_log_pipeline().attach(manager.broadcast, lambda: manager.has_subscribers("logs"))
+    get_log_pipeline().start()
     # Initialize MongoDB connection
     await init_db()
+    # Time-bucketed analysis counters for the dashboards
+    await init_rollups()
+    # In-process sentiment model, loaded once
+    await init_sentiment()
+    # Shared outbound HTTP connection pool
+    await init_http_client()
+    # Pooled Neo4j driver and batched graph writer
+    await init_graph()
+    # Vector index handle and batched upsert buffer
+    await init_vector_store()
+    # Local near-duplicate index (memory-mapped snapshot); workers share new
+    # vectors and one of them (the lease holder) writes the snapshots
+    manager.on_bus_topic(ANN_TOPIC, receive_shared)
+    share_vectors = manager.sharer(ANN_TOPIC)
+    await init_ann_index(share=share_vectors, lease=LeaderLease("ann_index") if share_vectors else None)
+    # Drain queued Mongo/Pinecone/Neo4j/rollup writes (including any left from the last run)
+    await init_outbox()
+    # Start job queue workers
+    await get_job_manager().start()
+    # One shared producer publishes threat alerts to subscribers; with several
+    # workers they pool their counts and one of them (the lease holder) detects
+    manager.on_bus_topic(THREAT_FEED_TOPIC, get_threat_feed().receive)
+    share_threats = manager.sharer(THREAT_FEED_TOPIC)
+    get_threat_feed().start(manager.broadcast, share=share_threats, lease=LeaderLease("threat_feed") if share_threats else None)
 
 
 @app.on_event("shutdown")
 async def on_shutdown() -> None:
+    # Stop the threat alert producer
+    await get_threat_feed().stop()
+    # Stop job queue workers
+    await get_job_manager().stop()
+    # Cancel a running rollup backfill
+    await close_rollups()
+    # Flush write-behind writes while the sinks are still open
+    await close_outbox()
+    # Flush queued vector upserts
+    await close_vector_store()
+    # Snapshot the near-duplicate index
+    await close_ann_index()
+    # Flush pending graph writes and close Neo4j driver
+    await close_graph()
     # Close MongoDB connection
     await close_db()
+    # Close outbound HTTP connection pool
+    await close_http_client()
+    # Stop HTML parser processes
+    close_html_pool()
+    # Send any buffered log events
+    await get_log_pipeline().stop()
+    # Leave the cross-worker event bus
+    await manager.close_bus()
 
 
@@ -1,11 +1,19 @@
-from typing import Any, Dict
+import logging
+from typing import Any, Dict, List, Optional
 
-from fastapi import APIRouter, BackgroundTasks
+from fastapi import APIRouter, BackgroundTasks, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
+from ..services.batch_pipeline import BATCH_MAX_ITEMS, stream_batch_ndjson
+from ..services.cache import CACHE_MODES
 from ..services.llm_agent import run_agent_workflow
+from ..services.metrics import TRACE_HEADER, finish_trace, start_trace, trace_requested
+from ..services.progress import STREAM_FORMATS, stream_workflow
 from ..services.ws_logger import send_ws_log
 
+logger = logging.getLogger(__name__)
+
 
 router = APIRouter()
 
@@ -15,19 +23,34 @@ class QueryPayload(BaseModel):
     payload: Dict[str, Any] = Field(..., description="Payload to analyze")
 
 
+class BatchItemPayload(QueryPayload):
+    type: str = Field(..., pattern="^(url|text)$", description="Type of analysis: url|text")
+
+
+class BatchQueryPayload(BaseModel):
+    items: List[BatchItemPayload] = Field(..., description="Items to analyze (url/text)")
+
+
 @router.post("/query")
-async def query(payload: QueryPayload, background_tasks: BackgroundTasks) -> Dict[str, Any]:
+async def query(
+    payload: QueryPayload,
+    background_tasks: BackgroundTasks,
+    cache: str = Query("default", pattern=f"^({'|'.join(CACHE_MODES)})$", description="Verdict cache mode: default|bypass|refresh"),
+    trace: Optional[str] = Header(None, alias=TRACE_HEADER, description="Set to 1 to include a per-stage timing trace"),
+) -> Dict[str, Any]:
     """Accepts an analysis request and runs the full AI verification workflow.
     
     Returns actual analysis results from Gemini AI, sentiment analysis, and evidence.
+    Identical content is served from the verdict cache unless ``cache=bypass``
+    (skip the cache entirely) or ``cache=refresh`` (recompute and overwrite).
+    With the ``X-Filtr-Trace: 1`` header the response also carries a ``trace``
+    of every stage and dependency span the request ran.
     """
     import time
-    request_start = time.time()
+    request_start = time.perf_counter()
     
-    print(f"\n{'#'*80}")
-    print(f"📥 [API REQUEST] Received query - Type: {payload.type}")
-    print(f"📦 [API REQUEST] Payload: {payload.payload}")
-    print(f"{'#'*80}")
+    logger.info("📥 [API REQUEST] Received query - Type: %s", payload.type)
+    logger.debug("📦 [API REQUEST] Payload: %s", payload.payload)
     # Broadcast start to UI
     try:
         await send_ws_log("INFO", "Received query", {"type": payload.type, "payload_preview": str(payload.payload)[:200]})
@@ -35,12 +58,16 @@ async def query(payload: QueryPayload, background_tasks: BackgroundTasks) -> Dic
         pass
     
     # Run the full agent workflow synchronously to return real results
-    result = await run_agent_workflow(payload.type, payload.payload)
+    trace_token = start_trace() if trace_requested(trace) else None
+    try:
+        result = await run_agent_workflow(payload.type, payload.payload, cache_mode=cache)
+    finally:
+        trace_result = finish_trace(trace_token) if trace_token is not None else None
+    if trace_result is not None:
+        result["trace"] = trace_result
     
-    request_end = time.time()
-    print(f"\n{'#'*80}")
-    print(f"📤 [API RESPONSE] Returning result - Total API time: {request_end - request_start:.2f}s")
-    print(f"{'#'*80}\n")
+    request_end = time.perf_counter()
+    logger.info("📤 [API RESPONSE] Returning result - Total API time: %.2fs", request_end - request_start)
     # Broadcast completion to UI
     try:
         await send_ws_log("INFO", "Returning analysis result", {"type": payload.type, "duration_s": round(request_end - request_start, 2), "verdict": result.get("verdict")})
@@ -50,3 +77,50 @@ async def query(payload: QueryPayload, background_tasks: BackgroundTasks) -> Dic
     return result
 
 
+@router.post("/query/stream")
+async def query_stream(
+    payload: QueryPayload,
+    cache: str = Query("default", pattern=f"^({'|'.join(CACHE_MODES)})$", description="Verdict cache mode: default|bypass|refresh"),
+    stream_format: str = Query("sse", alias="format", pattern=f"^({'|'.join(STREAM_FORMATS)})$", description="sse|ndjson"),
+) -> StreamingResponse:
+    """Runs the same workflow as ``/query`` and streams its progress for this request only.
+
+    Events, each sent as soon as it is ready: ``accepted``, ``scout`` (text
+    length and preview), ``embeddings``, ``near_duplicate``, ``sentiment``,
+    ``gemini`` (``{"section", "text"}`` deltas while the model writes its
+    VERDICT/CONFIDENCE/SUMMARY/REASONING/EVIDENCE_SOURCES sections), then
+    ``result`` with the same body ``/query`` returns, or ``error``.
+    Server-Sent Events by default; ``format=ndjson`` sends one
+    ``{"event": ..., "data": ...}`` object per line.
+    """
+    logger.info("📥 [API REQUEST] Received streaming query - Type: %s", payload.type)
+    media_type = "text/event-stream" if stream_format == "sse" else "application/x-ndjson"
+    return StreamingResponse(
+        stream_workflow(
+            lambda: run_agent_workflow(payload.type, payload.payload, cache_mode=cache),
+            stream_format,
+            accepted={"type": payload.type},
+        ),
+        media_type=media_type,
+        # Disable proxy buffering so events are not held back
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/query/batch")
+async def query_batch(
+    payload: BatchQueryPayload,
+    cache: str = Query("default", pattern=f"^({'|'.join(CACHE_MODES)})$", description="Verdict cache mode: default|bypass|refresh"),
+) -> StreamingResponse:
+    """Runs many items through the staged Scout/Verify/Store pipeline.
+
+    Streams one NDJSON line per item in completion order:
+    ``{"index": <position in items>, "status": "ok"|"error", "result"|"error": ..., "duration_s": ...}``.
+    """
+    if not payload.items:
+        raise HTTPException(status_code=400, detail="items must not be empty")
+    if len(payload.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_ITEMS} items per batch")
+
+    items = [item.model_dump() for item in payload.items]
+    return StreamingResponse(stream_batch_ndjson(items, cache_mode=cache), media_type="application/x-ndjson")
@@ -0,0 +1,130 @@
+from typing import Any, Dict
+
+from fastapi import APIRouter, Query
+
+from ..services.ann_index import ann_index_stats
+from ..services.batch_pipeline import get_batch_pipeline
+from ..services.cache import get_verdict_cache
+from ..services.fetch_cache import get_fetch_cache
+from ..services.graph_service import get_graph_buffer
+from ..services.http_client import http_stats
+from ..services.jobs import get_job_manager
+from ..services.llm_agent import get_analysis_graph
+from ..services.metrics import get_metrics
+from ..services.outbox import get_outbox
+from ..services.rate_limit import limiter_stats
+from ..services.sentiment import get_sentiment_batcher
+from ..services.threat_feed import get_threat_feed
+from ..services.vector_store import get_upsert_buffer
+from ..services.ws_logger import get_log_pipeline
+from ..services.llm_client import get_embedding_client, get_generation_client
+
+
+router = APIRouter()
+
+
+@router.get("/cache")
+async def cache_stats() -> Dict[str, Any]:
+    """Verdict cache size plus hit/miss/coalesce/eviction counters."""
+    return get_verdict_cache().stats()
+
+
+@router.get("/llm")
+async def llm_stats() -> Dict[str, Any]:
+    """In-flight/waiting/timeout counters for the generation and embedding clients."""
+    return {
+        "generate": get_generation_client().stats(),
+        "embed": get_embedding_client().stats(),
+    }
+
+
+@router.get("/batch")
+async def batch_stats() -> Dict[str, Any]:
+    """Embedding micro-batch counters for the batch pipeline."""
+    return get_batch_pipeline().stats()
+
+
+@router.get("/jobs")
+async def job_stats() -> Dict[str, Any]:
+    """Job queue depth, wait/run times and rejection counters."""
+    return await get_job_manager().stats()
+
+
+@router.get("/http")
+async def outbound_http_stats() -> Dict[str, Any]:
+    """Per-host request, new-connection (handshake) and latency stats for the shared HTTP pool."""
+    return http_stats()
+
+
+@router.get("/fetch")
+async def fetch_cache_stats() -> Dict[str, Any]:
+    """URL fetch cache tiers, hit/revalidation counters and bytes saved."""
+    return get_fetch_cache().stats()
+
+
+@router.get("/graph")
+async def graph_stats() -> Dict[str, Any]:
+    """Neo4j write buffer depth, batch sizes and flush latency."""
+    return get_graph_buffer().stats()
+
+
+@router.get("/vectors")
+async def vector_stats() -> Dict[str, Any]:
+    """Vector upsert queue depth, flush sizes, retries and latency."""
+    return get_upsert_buffer().stats()
+
+
+@router.get("/ann")
+async def ann_stats() -> Dict[str, Any]:
+    """Near-duplicate index size, list layout, search latency and snapshot writer."""
+    return ann_index_stats()
+
+
+@router.get("/logs")
+async def log_stats() -> Dict[str, Any]:
+    """WebSocket log buffer depth, filtered/dropped events and frame sizes."""
+    return get_log_pipeline().stats()
+
+
+@router.get("/ws")
+async def ws_stats(clients: bool = Query(False, description="Include the most lagging clients")) -> Dict[str, Any]:
+    """WebSocket connections per topic, queue lag and dropped/disconnected slow consumers."""
+    # Lazy import to avoid circular dependency
+    from app.main import get_ws_manager
+    return get_ws_manager().stats(clients=clients)
+
+
+@router.get("/threats")
+async def threat_stats() -> Dict[str, Any]:
+    """Threat feed window sizes, checks and the last alert published."""
+    return get_threat_feed().stats()
+
+
+@router.get("/spans")
+async def span_stats() -> Dict[str, Any]:
+    """Per-stage and per-dependency latency percentiles, in-flight and error counts."""
+    return get_metrics().stats()
+
+
+@router.get("/outbox")
+async def outbox_stats() -> Dict[str, Any]:
+    """Write-behind outbox backlog, deliveries, retries and dead letters per sink."""
+    return await get_outbox().stats()
+
+
+@router.get("/limits")
+async def rate_limit_stats() -> Dict[str, Any]:
+    """Per-provider token bucket, AIMD concurrency limit, queue depth, 429s and rejected calls."""
+    return limiter_stats()
+
+
+@router.get("/sentiment")
+async def sentiment_stats() -> Dict[str, Any]:
+    """Local sentiment model in use and how many texts were scored per vectorized batch."""
+    return get_sentiment_batcher().stats()
+
+
+@router.get("/stages")
+async def stage_stats() -> Dict[str, Any]:
+    """Per-stage runs, fallbacks, timeouts, hedged attempts and hedge wins of the analysis graph."""
+    return get_analysis_graph().stats()
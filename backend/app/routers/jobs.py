@@ -0,0 +1,41 @@
+from typing import Any, Dict
+
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import Field
+
+from ..services.cache import CACHE_MODES
+from ..services.jobs import JOB_PRIORITIES, QueueFullError, get_job_manager, public_job_view
+from .analysis import QueryPayload
+
+
+router = APIRouter()
+
+
+class JobPayload(QueryPayload):
+    priority: str = Field("normal", pattern=f"^({'|'.join(JOB_PRIORITIES)})$", description="high|normal|low")
+
+
+@router.post("", status_code=202)
+async def submit_job(
+    payload: JobPayload,
+    cache: str = Query("default", pattern=f"^({'|'.join(CACHE_MODES)})$", description="Verdict cache mode: default|bypass|refresh"),
+) -> Dict[str, Any]:
+    """Queues an analysis and returns its job id immediately.
+
+    Poll ``GET /api/v1/jobs/{id}`` or listen for ``job_result`` WebSocket
+    messages. Returns 429 when the queue is full.
+    """
+    try:
+        job = await get_job_manager().submit(payload.type, payload.payload, priority=payload.priority, cache_mode=cache)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    return {"job_id": job["id"], "status": job["status"], "priority": job["priority"]}
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: str) -> Dict[str, Any]:
+    """Job status, plus the analysis result once completed."""
+    job = await get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return public_job_view(job)
@@ -0,0 +1,32 @@
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from ..services.db import InvalidCursor, db_ready, get_analysis_records
+
+
+router = APIRouter()
+
+
+@router.get("")
+async def list_records(
+    limit: int = Query(50, ge=1, le=200, description="Page size"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    input_type: Optional[str] = Query(None, description="Only records of this type: url|text|image|video"),
+    verdict: Optional[str] = Query(None, description="Only records with this verdict"),
+    full: bool = Query(False, description="Return full payloads and results instead of a summary"),
+) -> Dict[str, Any]:
+    """Stored analyses, newest first, with cursor pagination.
+
+    Follow ``next_cursor`` until it is null. By default each item carries
+    only the verdict, confidence, summary and source URL.
+    """
+    if not db_ready():
+        raise HTTPException(status_code=503, detail="Database not configured")
+    try:
+        items, next_cursor = await get_analysis_records(
+            limit=limit, cursor=cursor, input_type=input_type, verdict=verdict, full=full
+        )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor}
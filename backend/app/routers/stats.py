@@ -0,0 +1,50 @@
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from ..services.rollups import GRANULARITIES, get_rollup_backfill, get_stats, rollups_ready
+
+
+router = APIRouter()
+
+
+@router.get("")
+async def analysis_stats(
+    granularity: str = Query("hour", pattern=f"^({'|'.join(GRANULARITIES)})$", description="Bucket size: minute|hour|day"),
+    since: Optional[datetime] = Query(None, description="Window start (ISO 8601, UTC if no offset)"),
+    until: Optional[datetime] = Query(None, description="Window end (ISO 8601, default now)"),
+    top_domains: int = Query(10, ge=1, le=100, description="Source domains reported per bucket"),
+) -> Dict[str, Any]:
+    """Analysis counts by verdict, input type, sentiment and source domain per time bucket.
+
+    Served from pre-aggregated rollups; the default window is the last 60
+    minutes, 24 hours or 30 days for the chosen granularity.
+    """
+    if not rollups_ready():
+        raise HTTPException(status_code=503, detail="Database not configured")
+    try:
+        return await get_stats(granularity, since=since, until=until, top_domains=top_domains)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/backfill", status_code=202)
+async def start_backfill() -> Dict[str, Any]:
+    """Rebuilds the rollups from the stored analysis records in the background.
+
+    Poll ``GET /api/v1/stats/backfill`` for progress. Returns 409 while a
+    rebuild is already running.
+    """
+    if not rollups_ready():
+        raise HTTPException(status_code=503, detail="Database not configured")
+    backfill = get_rollup_backfill()
+    if not backfill.start():
+        raise HTTPException(status_code=409, detail="Backfill already running")
+    return backfill.stats()
+
+
+@router.get("/backfill")
+async def backfill_status() -> Dict[str, Any]:
+    """Status and progress of the last rollup backfill."""
+    return get_rollup_backfill().stats()
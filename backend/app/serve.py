@@ -0,0 +1,48 @@
+"""Start the API with several uvicorn workers wired to one event bus.
+
+Run from ``backend/``:
+
+    python -m app.serve --workers 4 --port 8000
+
+With more than one worker and no explicit ``EVENT_BUS``, workers exchange
+WebSocket broadcasts (logs, threat alerts, job results) over Unix sockets
+in ``EVENT_BUS_DIR``, so a dashboard sees events from every worker no
+matter which one it is connected to. Set ``EVENT_BUS=redis`` to span hosts.
+Jobs then live in a SQLite file shared by the workers (``JOB_BACKEND=sqlite``),
+so a job can be polled through any of them; the per-process in-memory job
+backend is refused.
+"""
+import argparse
+import glob
+import os
+import sys
+
+import uvicorn
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "1")))
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        # Workers inherit the environment, so they all pick the same bus and job store
+        os.environ.setdefault("EVENT_BUS", "unix")
+        os.environ.setdefault("JOB_BACKEND", "sqlite")
+        if os.environ["JOB_BACKEND"].lower() == "memory":
+            sys.exit("JOB_BACKEND=memory keeps jobs in one worker, so polls through the others would 404; "
+                     "use JOB_BACKEND=sqlite or --workers 1")
+    if os.environ.get("EVENT_BUS") == "unix":
+        from app.services.event_bus import EVENT_BUS_DIR
+
+        # Sockets left behind by a previous run would only cause failed sends
+        for path in glob.glob(os.path.join(EVENT_BUS_DIR, "*.sock")):
+            os.unlink(path)
+
+    uvicorn.run("app.main:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
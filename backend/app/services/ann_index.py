@@ -0,0 +1,438 @@
+import asyncio
+import base64
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .leader import LeaderLease
+from .llm_client import embedding_client
+from .vector_store import LOCAL_EMBED_DIM, LOCAL_EMBED_MODEL
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+ANN_ENABLED = os.getenv("ANN_ENABLED", "1") not in ("0", "false", "False", "")
+ANN_INDEX_DIR = os.getenv("ANN_INDEX_DIR", "data/ann_index")
+ANN_DUP_THRESHOLD = float(os.getenv("ANN_DUP_THRESHOLD", "0.95"))
+# Local n-gram vectors (used while the embedding provider is unavailable)
+# live in their own index; they compare wording, so the match is stricter
+ANN_LOCAL_INDEX_DIR = os.getenv("ANN_LOCAL_INDEX_DIR", f"{ANN_INDEX_DIR}-local")
+ANN_LOCAL_DUP_THRESHOLD = float(os.getenv("ANN_LOCAL_DUP_THRESHOLD", "0.97"))
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "16"))
+# Below this many vectors a flat scan is faster than training an IVF
+ANN_MIN_TRAIN = int(os.getenv("ANN_MIN_TRAIN", "4096"))
+# Rebuild (retrain + merge) once the unindexed delta grows past this many vectors
+ANN_REBUILD_DELTA = int(os.getenv("ANN_REBUILD_DELTA", "20000"))
+ANN_SNAPSHOT_INTERVAL_S = float(os.getenv("ANN_SNAPSHOT_INTERVAL_S", "300"))
+# Analyses kept in memory for recently indexed records; older matches are read from Mongo
+ANN_RECENT_ANALYSES = int(os.getenv("ANN_RECENT_ANALYSES", "10000"))
+
+# Event bus topic on which workers share newly indexed vectors
+ANN_TOPIC = "ann_vectors"
+
+
+def _normalize(x: Any) -> np.ndarray:
+    x = np.asarray(x, dtype=np.float32)
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+def _assign(x: np.ndarray, centroids: np.ndarray, chunk: int = 16384) -> np.ndarray:
+    """Nearest centroid (by cosine) for every row, computed in bounded-memory chunks."""
+    out = np.empty(len(x), dtype=np.int32)
+    for start in range(0, len(x), chunk):
+        out[start:start + chunk] = np.argmax(x[start:start + chunk] @ centroids.T, axis=1)
+    return out
+
+
+def _train_centroids(x: np.ndarray, nlist: int, iters: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on a sample of the data."""
+    rng = np.random.default_rng(seed)
+    sample = x[rng.choice(len(x), size=min(len(x), nlist * 64), replace=False)]
+    centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+    for _ in range(iters):
+        labels = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        counts = np.bincount(labels, minlength=nlist)
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty clusters from random sample points
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()), replace=False)]
+        centroids = _normalize(sums)
+    return centroids
+
+
+class IVFIndex:
+    """In-process approximate nearest-neighbour index over unit vectors (cosine).
+
+    The *base* segment is an inverted file: vectors are sorted by their
+    coarse centroid so each list is a contiguous slice (and can stay a
+    read-only memory map after loading a snapshot). New vectors go to a flat
+    *delta* segment that is scanned exactly; ``rebuild`` retrains the
+    centroids and merges the delta into the base. Each row carries only
+    its record id (a fixed-width string array, memory-mapped along with
+    the vectors), so a snapshot of millions of vectors stays on disk.
+
+    The index holds vectors of one embedding ``model`` (taken from the first
+    add); vectors of any other model are rejected like a wrong dimension,
+    since equal dimensions do not make two embedding spaces comparable.
+    """
+
+    def __init__(self, dim: Optional[int] = None, nprobe: int = ANN_NPROBE, model: Optional[str] = None) -> None:
+        self.dim = dim
+        self.model = model
+        self.nprobe = nprobe
+        self._lock = threading.Lock()
+        self._centroids: Optional[np.ndarray] = None
+        self._offsets: Optional[np.ndarray] = None
+        self._base = np.zeros((0, dim or 0), dtype=np.float32)
+        self._base_ids: np.ndarray = np.zeros(0, dtype=str)
+        self._delta = np.zeros((0, dim or 0), dtype=np.float32)
+        self._delta_n = 0
+        self._delta_ids: List[str] = []
+        self.dirty = False
+        self.searches = 0
+        self.total_search_s = 0.0
+        self.rebuilds = 0
+
+    def __len__(self) -> int:
+        return len(self._base_ids) + self._delta_n
+
+    def add(self, vector: Sequence[float], record_id: str, model: Optional[str] = None) -> None:
+        self.add_many(_normalize(vector).reshape(1, -1), [record_id], model=model, normalized=True)
+
+    def add_many(self, vectors: Any, ids: List[str], model: Optional[str] = None, normalized: bool = False) -> None:
+        x = np.asarray(vectors, dtype=np.float32) if normalized else _normalize(vectors)
+        with self._lock:
+            if len(self) == 0 and self.model is None:
+                self.model = model
+            if model != self.model:
+                raise ValueError(f"Embedding model {model!r} does not match index model {self.model!r}")
+            if self.dim is None:
+                self.dim = x.shape[1]
+                self._base = np.zeros((0, self.dim), dtype=np.float32)
+                self._delta = np.zeros((0, self.dim), dtype=np.float32)
+            if x.shape[1] != self.dim:
+                raise ValueError(f"Vector dim {x.shape[1]} does not match index dim {self.dim}")
+            needed = self._delta_n + len(x)
+            if needed > len(self._delta):
+                grown = np.zeros((max(needed, 2 * len(self._delta), 1024), self.dim), dtype=np.float32)
+                grown[:self._delta_n] = self._delta[:self._delta_n]
+                self._delta = grown
+            self._delta[self._delta_n:needed] = x
+            self._delta_n = needed
+            self._delta_ids.extend(ids)
+            self.dirty = True
+
+    def search(self, vector: Sequence[float], k: int = 1, model: Optional[str] = None) -> List[Tuple[float, str]]:
+        """Top-``k`` ``(cosine similarity, record id)`` pairs, best first."""
+        if self.dim is None or len(self) == 0:
+            return []
+        if model != self.model:
+            raise ValueError(f"Embedding model {model!r} does not match index model {self.model!r}")
+        started = time.perf_counter()
+        q = _normalize(vector).reshape(-1)
+        with self._lock:
+            centroids, offsets = self._centroids, self._offsets
+            base, base_ids = self._base, self._base_ids
+            delta, delta_ids = self._delta[:self._delta_n], self._delta_ids[:self._delta_n]
+
+        scores: List[np.ndarray] = []
+        owners: List[Tuple[Sequence[str], np.ndarray]] = []
+        if centroids is not None:
+            probe = np.argsort(centroids @ q)[::-1][:self.nprobe]
+            for lst in probe:
+                start, end = int(offsets[lst]), int(offsets[lst + 1])
+                if end > start:
+                    scores.append(np.asarray(base[start:end]) @ q)
+                    owners.append((base_ids, np.arange(start, end)))
+        elif len(base_ids):
+            scores.append(np.asarray(base) @ q)
+            owners.append((base_ids, np.arange(len(base_ids))))
+        if len(delta_ids):
+            scores.append(delta @ q)
+            owners.append((delta_ids, np.arange(len(delta_ids))))
+        if not scores:
+            return []
+
+        all_scores = np.concatenate(scores)
+        segment = np.concatenate([np.full(len(rows), i) for i, (_, rows) in enumerate(owners)])
+        rows = np.concatenate([rows for _, rows in owners])
+        k = min(k, len(all_scores))
+        top = np.argpartition(-all_scores, k - 1)[:k]
+        top = top[np.argsort(-all_scores[top])]
+        self.searches += 1
+        self.total_search_s += time.perf_counter() - started
+        return [(float(all_scores[i]), str(owners[segment[i]][0][rows[i]])) for i in top]
+
+    def rebuild(self) -> None:
+        """Retrain the coarse quantizer and merge the delta into the base."""
+        with self._lock:
+            n_delta = self._delta_n
+            base, base_ids = self._base, self._base_ids
+            delta, delta_ids = self._delta[:n_delta].copy(), self._delta_ids[:n_delta]
+        vectors = np.concatenate([np.asarray(base), delta]) if len(base_ids) else delta
+        ids = np.concatenate([np.asarray(base_ids), np.array(delta_ids, dtype=str)])
+        centroids = offsets = None
+        if len(ids) >= ANN_MIN_TRAIN:
+            nlist = max(1, int(np.sqrt(len(ids))))
+            centroids = _train_centroids(vectors, nlist)
+            labels = _assign(vectors, centroids)
+            order = np.argsort(labels, kind="stable")
+            vectors = vectors[order]
+            ids = ids[order]
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=nlist))]).astype(np.int64)
+        with self._lock:
+            self._centroids, self._offsets = centroids, offsets
+            self._base, self._base_ids = vectors, ids
+            # Keep anything added while we were rebuilding
+            self._delta = self._delta[n_delta:self._delta_n].copy()
+            self._delta_ids = self._delta_ids[n_delta:]
+            self._delta_n = len(self._delta_ids)
+            self.rebuilds += 1
+
+    def needs_rebuild(self) -> bool:
+        if self._centroids is None:
+            return self._delta_n > 0 and len(self) >= ANN_MIN_TRAIN
+        return self._delta_n >= ANN_REBUILD_DELTA
+
+    def save(self, path: str) -> None:
+        """Write a snapshot directory (rebuilding first so the delta is included)."""
+        if self._delta_n:
+            self.rebuild()
+        with self._lock:
+            self.dirty = False
+            centroids, offsets, base, base_ids = self._centroids, self._offsets, self._base, self._base_ids
+        tmp = f"{path}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        np.save(os.path.join(tmp, "vectors.npy"), np.asarray(base, dtype=np.float32))
+        np.save(os.path.join(tmp, "ids.npy"), np.asarray(base_ids, dtype=str))
+        if centroids is not None:
+            np.save(os.path.join(tmp, "centroids.npy"), centroids)
+            np.save(os.path.join(tmp, "offsets.npy"), offsets)
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump({"dim": self.dim, "model": self.model, "count": len(base_ids)}, f)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, nprobe: int = ANN_NPROBE) -> "IVFIndex":
+        """Open a snapshot; the vectors and record ids are memory-mapped, not read into RAM."""
+        with open(os.path.join(path, "meta.json")) as f:
+            info = json.load(f)
+        index = cls(dim=info["dim"], nprobe=nprobe, model=info.get("model"))
+        index._base = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        if "meta" in info:
+            # Snapshot from before ids.npy: per-row metadata dicts
+            index._base_ids = np.array([meta["record_id"] for meta in info["meta"]], dtype=str)
+        else:
+            index._base_ids = np.load(os.path.join(path, "ids.npy"), mmap_mode="r")
+        if os.path.exists(os.path.join(path, "centroids.npy")):
+            index._centroids = np.load(os.path.join(path, "centroids.npy"))
+            index._offsets = np.load(os.path.join(path, "offsets.npy"))
+        return index
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": ANN_ENABLED,
+            "dim": self.dim,
+            "model": self.model,
+            "vectors": len(self),
+            "indexed": len(self._base_ids),
+            "delta": self._delta_n,
+            "nlist": 0 if self._centroids is None else len(self._centroids),
+            "nprobe": self.nprobe,
+            "threshold": ANN_DUP_THRESHOLD,
+            "searches": self.searches,
+            "avg_search_ms": round(1000 * self.total_search_s / self.searches, 3) if self.searches else 0.0,
+            "rebuilds": self.rebuilds,
+        }
+
+
+ann_index = IVFIndex()
+local_index = IVFIndex(dim=LOCAL_EMBED_DIM, model=LOCAL_EMBED_MODEL)
+_snapshot_task: Optional[asyncio.Task] = None
+# Only one worker writes ANN_INDEX_DIR; the others get its vectors over the event bus
+_lease: Optional[LeaderLease] = None
+_share: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+_writer = True
+# record id -> analysis, most recently indexed last
+_recent: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_recent_lock = threading.Lock()
+
+
+def _snapshot_writer() -> bool:
+    return _writer and (_lease is None or _lease.try_acquire())
+
+
+def _index_for(model: str) -> IVFIndex:
+    return local_index if model == LOCAL_EMBED_MODEL else ann_index
+
+
+def _indexes() -> List[Tuple[IVFIndex, str]]:
+    return [(ann_index, ANN_INDEX_DIR), (local_index, ANN_LOCAL_INDEX_DIR)]
+
+
+async def _snapshot_loop() -> None:
+    while True:
+        await asyncio.sleep(ANN_SNAPSHOT_INTERVAL_S)
+        for index, path in _indexes():
+            try:
+                if index.dirty and _snapshot_writer():
+                    await asyncio.to_thread(index.save, path)
+                elif index.needs_rebuild():
+                    await asyncio.to_thread(index.rebuild)
+            except Exception as e:
+                logger.warning("ANN snapshot failed: %s", e)
+
+
+async def _load_snapshot(path: str, model: str) -> Optional[IVFIndex]:
+    if not os.path.exists(os.path.join(path, "meta.json")):
+        return None
+    try:
+        snapshot = await asyncio.to_thread(IVFIndex.load, path)
+    except Exception as e:
+        logger.error("Failed to load ANN index snapshot: %s", e)
+        return None
+    if snapshot.model != model:
+        # Untagged (older) snapshots may mix in local fallback vectors
+        logger.warning("Ignoring ANN index snapshot of embedding model %r (now %r)", snapshot.model, model)
+        return None
+    logger.info("Loaded ANN index snapshot of %s with %s vectors", model, len(snapshot))
+    return snapshot
+
+
+async def init_ann_index(
+    share: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+    lease: Optional[LeaderLease] = None,
+    writer: bool = True,
+) -> None:
+    """Load the on-disk snapshot (if any) and start periodic snapshots.
+
+    With several workers, ``share`` sends newly indexed vectors to the
+    others (they arrive through ``receive_shared``) and only the holder of
+    ``lease`` writes snapshots, so no worker's vectors are overwritten.
+    Job subprocesses pass ``writer=False``: they never write snapshots and
+    their parent indexes the vectors they share (``adopt_shared``).
+    Provider and local vectors are kept (and snapshotted) separately.
+    """
+    global ann_index, local_index, _snapshot_task, _share, _lease, _writer
+    if not ANN_ENABLED:
+        return
+    _share, _lease, _writer = share, lease, writer
+    ann_index = await _load_snapshot(ANN_INDEX_DIR, embedding_client.embed_model) or ann_index
+    local_index = await _load_snapshot(ANN_LOCAL_INDEX_DIR, LOCAL_EMBED_MODEL) or local_index
+    _snapshot_task = asyncio.create_task(_snapshot_loop())
+
+
+async def close_ann_index() -> None:
+    """Stop periodic snapshots and write a final one."""
+    global _snapshot_task
+    if _snapshot_task is not None:
+        _snapshot_task.cancel()
+        await asyncio.gather(_snapshot_task, return_exceptions=True)
+        _snapshot_task = None
+    for index, path in _indexes():
+        if ANN_ENABLED and index.dirty and _snapshot_writer():
+            try:
+                await asyncio.to_thread(index.save, path)
+            except Exception as e:
+                logger.warning("ANN snapshot failed: %s", e)
+    if _lease is not None:
+        _lease.release()
+
+
+def find_near_duplicate(vector: Sequence[float], model: str) -> Optional[Dict[str, Any]]:
+    """``{"record_id", "similarity"}`` of the closest prior analysis at or above ``ANN_DUP_THRESHOLD``, if any.
+
+    Only vectors of the same embedding ``model`` are compared: local
+    vectors are searched in the local index, against
+    ``ANN_LOCAL_DUP_THRESHOLD``.
+    """
+    if not ANN_ENABLED:
+        return None
+    index = _index_for(model)
+    try:
+        hits = index.search(vector, k=1, model=model)
+    except ValueError:
+        # Another embedding model or dimension; nothing comparable
+        return None
+    threshold = ANN_LOCAL_DUP_THRESHOLD if index is local_index else ANN_DUP_THRESHOLD
+    if not hits or hits[0][0] < threshold:
+        return None
+    similarity, record_id = hits[0]
+    return {"record_id": record_id, "similarity": round(similarity, 4)}
+
+
+def recent_analysis(record_id: str) -> Optional[Dict[str, Any]]:
+    """The analysis of a record indexed recently by any worker, if still in memory."""
+    with _recent_lock:
+        return _recent.get(record_id)
+
+
+def remember_analysis(vector: Sequence[float], record_id: str, analysis: Dict[str, Any], model: str) -> None:
+    """Index an analysis so near-identical content can reuse its verdict."""
+    if not ANN_ENABLED:
+        return
+    try:
+        _index_for(model).add(vector, record_id, model=model)
+    except ValueError as e:
+        logger.warning("ANN index add skipped: %s", e)
+        return
+    with _recent_lock:
+        _recent[record_id] = analysis
+        _recent.move_to_end(record_id)
+        while len(_recent) > ANN_RECENT_ANALYSES:
+            _recent.popitem(last=False)
+
+
+async def remember(vector: Sequence[float], record_id: str, analysis: Dict[str, Any], model: str) -> None:
+    """``remember_analysis`` here and in every other worker."""
+    vector = np.asarray(vector, dtype=np.float32)
+    await asyncio.to_thread(remember_analysis, vector, record_id, analysis, model)
+    if _share is not None and ANN_ENABLED:
+        await _share({
+            "vector": base64.b64encode(vector.tobytes()).decode("ascii"),
+            "model": model,
+            "record_id": record_id,
+            "analysis": analysis,
+        })
+
+
+def receive_shared(data: str) -> None:
+    """Index a vector another worker shared on ``ANN_TOPIC``."""
+    try:
+        message = json.loads(data)
+        vector = np.frombuffer(base64.b64decode(message["vector"]), dtype=np.float32)
+        remember_analysis(vector, message["record_id"], message["analysis"], message["model"])
+    except (ValueError, KeyError, TypeError) as e:
+        logger.warning("Ignoring malformed shared ANN vector: %s", e)
+
+
+async def adopt_shared(message: Dict[str, Any]) -> None:
+    """``remember`` a vector a job subprocess shared, here and in every other worker."""
+    vector = np.frombuffer(base64.b64decode(message["vector"]), dtype=np.float32)
+    await remember(vector, message["record_id"], message["analysis"], message["model"])
+
+
+def ann_index_stats() -> Dict[str, Any]:
+    return {
+        **ann_index.stats(),
+        "recent_analyses": len(_recent),
+        "snapshot_writer": _writer and (_lease is None or _lease.held),
+        "local": {**local_index.stats(), "threshold": ANN_LOCAL_DUP_THRESHOLD},
+    }
+
+
+def get_ann_index() -> IVFIndex:
+    return ann_index
@@ -0,0 +1,136 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from .cache import make_cache_key, verdict_cache
+from .llm_agent import analyze_content, is_cacheable_input, scout_content
+from .metrics import metrics
+from .stage_dag import reset_deadline, set_deadline
+from .vector_store import EmbeddingBatcher
+from .ws_logger import send_ws_log
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+BATCH_SCOUT_CONCURRENCY = int(os.getenv("BATCH_SCOUT_CONCURRENCY", "16"))
+BATCH_VERIFY_CONCURRENCY = int(os.getenv("BATCH_VERIFY_CONCURRENCY", "8"))
+BATCH_STORE_CONCURRENCY = int(os.getenv("BATCH_STORE_CONCURRENCY", "4"))
+BATCH_EMBED_CHUNK = int(os.getenv("BATCH_EMBED_CHUNK", "32"))
+BATCH_EMBED_LINGER_MS = float(os.getenv("BATCH_EMBED_LINGER_MS", "20"))
+# Per-item budget once verification starts; batches trade latency for complete results
+BATCH_ITEM_DEADLINE_S = float(os.getenv("BATCH_ITEM_DEADLINE_S", "120"))
+
+
+class BatchPipeline:
+    """Staged Scout → Embed → Verify → Store pipeline for many items.
+
+    Every item flows through the stages independently; each stage has its own
+    concurrency cap (shared by all batches in this process), embeddings are
+    micro-batched into one provider call per chunk, and items reaching the
+    sentiment step together are scored in one vectorized pass. Results are
+    yielded in completion order, so a slow item never holds back the others.
+
+    After scouting, an item runs the same ``analysis_graph`` as a single
+    query (deadline, stage fallbacks, ``degraded`` flags and hedging
+    included) under ``BATCH_ITEM_DEADLINE_S``.
+    """
+
+    def __init__(self) -> None:
+        self.scout_sem = asyncio.Semaphore(BATCH_SCOUT_CONCURRENCY)
+        self.verify_sem = asyncio.Semaphore(BATCH_VERIFY_CONCURRENCY)
+        self.store_sem = asyncio.Semaphore(BATCH_STORE_CONCURRENCY)
+        self.embedder = EmbeddingBatcher(BATCH_EMBED_CHUNK, BATCH_EMBED_LINGER_MS / 1000.0)
+
+    async def _process(self, input_type: str, payload: Dict[str, Any], cache_mode: str) -> Dict[str, Any]:
+        async with self.scout_sem:
+            with metrics.span("scout"):
+                text, source_url = await scout_content(input_type, payload)
+
+        if not is_cacheable_input(input_type, text):
+            return await self._analyze(input_type, payload, text, source_url)
+
+        # Duplicates inside (or across) batches share one in-flight analysis
+        cache_key = make_cache_key(input_type, text, source_url)
+        result, cache_status = await verdict_cache.get_or_compute(
+            cache_key,
+            lambda: self._analyze(input_type, payload, text, source_url, cache_key),
+            mode=cache_mode,
+        )
+        result["cache"] = {"status": cache_status, "key": cache_key}
+        return result
+
+    async def _analyze(
+        self,
+        input_type: str,
+        payload: Dict[str, Any],
+        text: str,
+        source_url: Optional[str],
+        cache_key: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        # Only the analyze stage holds a verify slot (released before the
+        # item is stored); queueing for one never eats into the deadline
+        token = set_deadline(BATCH_ITEM_DEADLINE_S)
+        try:
+            started = time.perf_counter()
+            return await analyze_content(
+                input_type, payload, text, source_url, started, started, cache_key,
+                embedder=self.embedder.embed,
+                limits={"analyze": self.verify_sem, "persist": self.store_sem},
+            )
+        finally:
+            reset_deadline(token)
+
+    async def run(self, items: List[Dict[str, Any]], cache_mode: str = "default") -> AsyncIterator[Dict[str, Any]]:
+        """Yield ``{"index", "status", "result"|"error", "duration_s"}`` per item as each completes."""
+        started = time.time()
+        await send_ws_log("INFO", "Batch started", {"items": len(items)})
+        logger.info("📦 [BATCH] Starting batch of %s items", len(items))
+        results: asyncio.Queue = asyncio.Queue()
+
+        async def run_item(index: int, item: Dict[str, Any]) -> None:
+            item_start = time.time()
+            try:
+                result = await self._process(item["type"], item["payload"], cache_mode)
+                line = {"index": index, "status": "ok", "result": result}
+            except Exception as e:
+                logger.error("❌ [BATCH] Item %s failed: %s", index, e)
+                line = {"index": index, "status": "error", "error": str(e)}
+            line["duration_s"] = round(time.time() - item_start, 3)
+            await results.put(line)
+
+        tasks = [asyncio.create_task(run_item(i, item)) for i, item in enumerate(items)]
+        try:
+            for _ in range(len(tasks)):
+                yield await results.get()
+        finally:
+            # Client went away or the batch finished: never leave stragglers running
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        await send_ws_log("INFO", "Batch completed", {"items": len(items), "duration_s": round(time.time() - started, 2)})
+        logger.info("✅ [BATCH] Completed %s items in %.2fs", len(items), time.time() - started)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "embed_batches": self.embedder.batches,
+            "embedded_texts": self.embedder.texts,
+            "avg_embed_batch_size": round(self.embedder.texts / self.embedder.batches, 2) if self.embedder.batches else 0.0,
+        }
+
+
+batch_pipeline = BatchPipeline()
+
+
+def get_batch_pipeline() -> BatchPipeline:
+    return batch_pipeline
+
+
+async def stream_batch_ndjson(items: List[Dict[str, Any]], cache_mode: str = "default") -> AsyncIterator[str]:
+    async for line in batch_pipeline.run(items, cache_mode):
+        yield json.dumps(line, default=str) + "\n"
@@ -0,0 +1,228 @@
+import asyncio
+import copy
+import hashlib
+import os
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from dotenv import load_dotenv
+load_dotenv()
+
+VERDICT_CACHE_MAX_ENTRIES = int(os.getenv("VERDICT_CACHE_MAX_ENTRIES", "10000"))
+VERDICT_CACHE_TTL_S = float(os.getenv("VERDICT_CACHE_TTL_S", "3600"))
+VERDICT_CACHE_PERSISTENT = os.getenv("VERDICT_CACHE_PERSISTENT", "1") not in ("0", "false", "False", "")
+
+CACHE_MODES = ("default", "bypass", "refresh")
+
+# Query parameters that only identify the referrer/campaign, never the content.
+# Only unambiguous tracker names: generic ones like ``s``, ``ref`` or ``share``
+# select content on some sites (e.g. ``?s=`` is WordPress search).
+_TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "gbraid", "wbraid", "msclkid", "yclid", "igshid", "twclid", "ttclid",
+    "mc_cid", "mc_eid", "ref_src", "ref_url", "_ga", "_gl", "_hsenc", "_hsmi", "mkt_tok", "oly_anon_id", "oly_enc_id",
+}
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text so trivially different copies hash to the same key."""
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    return " ".join(text.split())
+
+
+def canonicalize_url(url: str) -> str:
+    """Canonical form of a URL: lowercased host, no fragment, no tracking params, sorted query."""
+    raw = (url or "").strip()
+    parts = urlsplit(raw if "://" in raw else f"http://{raw}")
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    netloc = host
+    if parts.port and parts.port != _DEFAULT_PORTS.get(scheme):
+        netloc = f"{host}:{parts.port}"
+    path = parts.path or "/"
+    if len(path) > 1 and path.endswith("/"):
+        path = path.rstrip("/")
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in _TRACKING_PARAMS
+    )
+    return urlunsplit((scheme, netloc, path, urlencode(query), ""))
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def make_cache_key(input_type: str, text: str, source_url: Optional[str] = None) -> str:
+    """Stable content-addressed key for an analysis.
+
+    Text inputs hash the normalized text; URL inputs hash the canonical URL
+    together with the hash of the extracted content, so an edited article
+    misses the cache even though its URL is unchanged.
+    """
+    if input_type == "url":
+        material = f"url:{canonicalize_url(source_url or '')}:{content_hash(text)}"
+    else:
+        material = f"{input_type}:{content_hash(text)}"
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class VerdictCache:
+    """Two-tier verdict cache with request coalescing.
+
+    Tier 1 is a bounded in-process LRU with a TTL; tier 2 (optional) is the
+    Mongo ``analysis_records`` collection, looked up by ``cache_key``.
+    Concurrent misses for the same key share one in-flight computation.
+    """
+
+    def __init__(self, max_entries: int, ttl_s: float, persistent: bool = True) -> None:
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.persistent = persistent
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.bypasses = 0
+        self.refreshes = 0
+
+    def _get_local(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if time.monotonic() - stored_at > self.ttl_s:
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _put_local(self, key: str, value: Dict[str, Any]) -> None:
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def _get_persistent(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.persistent:
+            return None
+        # Lazy import so the cache can be used without Mongo configured
+        from .db import find_cached_analysis
+        return await find_cached_analysis(key, max_age_s=self.ttl_s)
+
+    def invalidate(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Dict[str, Any]]],
+        mode: str = "default",
+    ) -> Tuple[Dict[str, Any], str]:
+        """Return ``(result, status)`` where status is hit|miss|coalesced|bypass|refresh.
+
+        ``bypass`` neither reads nor writes the cache; ``refresh`` skips the
+        read but stores the freshly computed result.
+        """
+        if mode == "bypass":
+            self.bypasses += 1
+            return await compute(), "bypass"
+
+        if mode != "refresh":
+            cached = self._get_local(key)
+            if cached is not None:
+                self.hits += 1
+                return copy.deepcopy(cached), "hit"
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            try:
+                result = await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # Re-raise our own cancellation; if the leader was cancelled, compute ourselves
+                if not inflight.cancelled():
+                    raise
+            else:
+                self.coalesced += 1
+                return copy.deepcopy(result), "coalesced"
+
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            status = "refresh" if mode == "refresh" else "miss"
+            result = None
+            if mode == "refresh":
+                self.refreshes += 1
+            else:
+                result = await self._get_persistent(key)
+                if result is not None and not is_cacheable_result(result):
+                    result = None  # stored before such results stopped getting a cache key
+                if result is not None:
+                    self.persistent_hits += 1
+                    status = "hit"
+            if result is None:
+                self.misses += 1
+                result = await compute()
+            if is_cacheable_result(result):
+                self._put_local(key, result)
+            future.set_result(result)
+            return copy.deepcopy(result), status
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so an un-awaited failure does not log a warning
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.persistent_hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl_s,
+            "persistent": self.persistent,
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "bypasses": self.bypasses,
+            "refreshes": self.refreshes,
+            "hit_rate": round((self.hits + self.persistent_hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+        }
+
+
+def is_cacheable_result(result: Dict[str, Any]) -> bool:
+    """Never pin provider failures ("Unknown" verdicts) or degraded results in either cache tier."""
+    return result.get("verdict") not in (None, "Unknown") and not result.get("degraded")
+
+
+verdict_cache = VerdictCache(
+    max_entries=VERDICT_CACHE_MAX_ENTRIES,
+    ttl_s=VERDICT_CACHE_TTL_S,
+    persistent=VERDICT_CACHE_PERSISTENT,
+)
+
+
+def get_verdict_cache() -> VerdictCache:
+    return verdict_cache
@@ -0,0 +1,206 @@
+import bisect
+import os
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Target chunk size and the overlap carried into the next chunk, in estimated tokens
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "1000"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "100"))
+# Tokens of one document sent for per-chunk analysis; beyond it chunks are sampled across the document
+CHUNK_TOKEN_BUDGET = int(os.getenv("CHUNK_TOKEN_BUDGET", "16000"))
+# Chunks of one document analyzed at the same time
+CHUNK_CONCURRENCY = int(os.getenv("CHUNK_CONCURRENCY", "8"))
+# Share of the vote for false/misleading chunks that makes an otherwise true document "Misleading"
+CHUNK_FLAG_SHARE = float(os.getenv("CHUNK_FLAG_SHARE", "0.25"))
+
+CHARS_PER_TOKEN = 4
+FALSE_LEANING = ("Likely False", "Misleading")
+
+_PARAGRAPH_END = re.compile(r"[^\n](?=\n)")
+_PARAGRAPH_START = re.compile(r"\n+(?=[^\n])")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+class Chunk:
+    """A span ``[start, end)`` of a document; ``index`` is its position among the document's chunks."""
+
+    def __init__(self, index: int, start: int, end: int, text: str) -> None:
+        self.index = index
+        self.start = start
+        self.end = end
+        self.text = text
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.text)
+
+    def ref(self) -> Dict[str, Any]:
+        return {"index": self.index, "start": self.start, "end": self.end, "tokens": self.tokens}
+
+
+def _last_at_most(points: List[int], low: int, high: int) -> Optional[int]:
+    """Largest point in ``(low, high]``, if any."""
+    i = bisect.bisect_right(points, high)
+    return points[i - 1] if i and points[i - 1] > low else None
+
+
+def split_chunks(
+    text: str,
+    max_tokens: int = CHUNK_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+) -> List[Chunk]:
+    """Split ``text`` into chunks of at most about ``max_tokens``, ending on paragraph boundaries.
+
+    A chunk ends at the last paragraph end that fits (a sentence end, a
+    space or a hard cut for a paragraph longer than half a chunk). Each chunk after
+    the first starts at a sentence up to ``overlap_tokens`` before the end
+    of the previous one, so a claim split across a boundary is seen whole
+    by at least one chunk. Text that fits one chunk comes back as a single
+    chunk of the whole text.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return [Chunk(0, 0, len(text), text)]
+    overlap_chars = overlap_tokens * CHARS_PER_TOKEN
+    paragraph_ends = [m.end() for m in _PARAGRAPH_END.finditer(text)]
+    gaps = [m.span() for m in _SENTENCE_END.finditer(text)]
+    sentence_ends = sorted(set(paragraph_ends).union(gap_start for gap_start, _ in gaps))
+    sentence_starts = sorted({gap_end for _, gap_end in gaps}.union(m.end() for m in _PARAGRAPH_START.finditer(text)))
+
+    chunks: List[Chunk] = []
+    start = 0
+    while True:
+        if len(text) - start <= max_chars:
+            end = len(text)
+        else:
+            limit = start + max_chars
+            half = start + max_chars // 2
+            space = text.rfind(" ", half + 1, limit + 1)
+            end = (
+                _last_at_most(paragraph_ends, half, limit)
+                or _last_at_most(sentence_ends, half, limit)
+                or (space if space > 0 else limit)
+            )
+        chunks.append(Chunk(len(chunks), start, end, text[start:end]))
+        if end >= len(text):
+            return chunks
+        overlap_from = max(start + 1, end - overlap_chars)
+        i = bisect.bisect_left(sentence_starts, overlap_from)
+        if i < len(sentence_starts) and sentence_starts[i] < end:
+            start = sentence_starts[i]
+        else:
+            # No sentence starts in the overlap: start at a word instead
+            space = text.find(" ", overlap_from, end)
+            start = space + 1 if space >= 0 else end
+
+
+def select_chunks(chunks: Sequence[Chunk], budget_tokens: int = CHUNK_TOKEN_BUDGET) -> List[Chunk]:
+    """Chunks to analyze within ``budget_tokens``: all of them, or an even spread including the first and last."""
+    if sum(chunk.tokens for chunk in chunks) <= budget_tokens or len(chunks) <= 2:
+        return list(chunks)
+    average = sum(chunk.tokens for chunk in chunks) / len(chunks)
+    count = max(2, min(len(chunks), int(budget_tokens // average)))
+    while True:
+        picked = [chunks[i] for i in sorted(set(np.linspace(0, len(chunks) - 1, count).round().astype(int)))]
+        if count <= 2 or sum(chunk.tokens for chunk in picked) <= budget_tokens:
+            return picked
+        count -= 1
+
+
+def document_vector(vectors: Sequence[Tuple[str, Any]]) -> Optional[np.ndarray]:
+    """One vector for the whole document: the normalized mean of its chunk vectors."""
+    if not vectors:
+        return None
+    if len(vectors) == 1:
+        return np.asarray(vectors[0][1], dtype=np.float32)
+    mean = np.mean([np.asarray(vector, dtype=np.float32) for _, vector in vectors], axis=0)
+    return mean / max(float(np.linalg.norm(mean)), 1e-12)
+
+
+def _first_sentence(text: str) -> str:
+    return _SENTENCE_END.split(text.strip(), maxsplit=1)[0]
+
+
+def reduce_analyses(chunks: Sequence[Chunk], analyses: Dict[int, Dict[str, Any]], statuses: Dict[int, str]) -> Dict[str, Any]:
+    """Merge per-chunk analyses (keyed by chunk index) into one document analysis.
+
+    Chunks vote for their verdict with weight confidence x length; the top
+    verdict wins, except that an otherwise "Likely True" document whose
+    false-leaning chunks hold ``CHUNK_FLAG_SHARE`` of the vote is
+    "Misleading". Confidence is the agreeing chunks' weighted confidence,
+    scaled down by disagreement. Chunks without a usable analysis
+    ("Unknown" verdicts, timeouts, chunks outside the budget) do not vote.
+    The result references every chunk under ``chunks``.
+    """
+    weights: Dict[str, float] = {}
+    for index, analysis in analyses.items():
+        verdict = analysis.get("verdict", "Uncertain")
+        if verdict == "Unknown":
+            continue
+        weight = float(analysis.get("confidence", 0.5)) * chunks[index].tokens
+        weights[verdict] = weights.get(verdict, 0.0) + weight
+
+    refs = []
+    for chunk in chunks:
+        ref = chunk.ref()
+        analysis = analyses.get(chunk.index)
+        ref["status"] = statuses.get(chunk.index, "skipped")
+        if analysis is not None:
+            ref.update(verdict=analysis.get("verdict"), confidence=analysis.get("confidence"), summary=analysis.get("summary", ""))
+        refs.append(ref)
+
+    voted = [i for i, a in sorted(analyses.items()) if a.get("verdict") != "Unknown"]
+    total = sum(weights.values())
+    if not voted or total <= 0:
+        reasons = "; ".join(sorted({a.get("reasoning", "") for a in analyses.values()} - {""})) or "No part of the document could be analyzed"
+        return {
+            "summary": "Analysis could not be completed for this document.",
+            "verdict": "Unknown",
+            "confidence": 0.0,
+            "reasoning": reasons,
+            "evidence_sources": [],
+            "chunks": refs,
+        }
+
+    verdict = max(weights, key=weights.get)
+    agreeing_verdicts: Tuple[str, ...] = (verdict,)
+    flagged = sum(weights.get(v, 0.0) for v in FALSE_LEANING)
+    # Only actually flagged chunks can turn a "Likely True" document (CHUNK_FLAG_SHARE may be 0)
+    if verdict == "Likely True" and flagged > 0 and flagged >= CHUNK_FLAG_SHARE * total:
+        verdict, agreeing_verdicts = "Misleading", FALSE_LEANING
+    agreeing = [i for i in voted if analyses[i].get("verdict") in agreeing_verdicts]
+    agreement = sum(weights.get(v, 0.0) for v in agreeing_verdicts) / total
+    size = sum(chunks[i].tokens for i in agreeing)
+    mean_confidence = sum(float(analyses[i].get("confidence", 0.5)) * chunks[i].tokens for i in agreeing) / size
+    confidence = round(mean_confidence * (0.5 + 0.5 * agreement), 2)
+
+    n = len(chunks)
+    summary = " ".join(
+        f"[Part {i + 1}/{n}] {_first_sentence(analyses[i].get('summary', ''))}" for i in agreeing[:3]
+    )
+    reasoning = "\n\n".join(
+        f"[Part {i + 1}/{n}: {analyses[i].get('verdict')}, {analyses[i].get('confidence')}] {analyses[i].get('reasoning', '')[:600]}"
+        for i in voted
+    )
+    sources: List[str] = []
+    for i in voted:
+        for source in analyses[i].get("evidence_sources", []):
+            if source not in sources:
+                sources.append(source)
+    return {
+        "summary": summary,
+        "verdict": verdict,
+        "confidence": confidence,
+        "reasoning": reasoning,
+        "evidence_sources": sources[:4],
+        "chunks": refs,
+    }
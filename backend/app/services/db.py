@@ -1,12 +1,37 @@
+import base64
+import binascii
+import logging
 import os
-from typing import Optional, Dict, Any
-from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple
+from datetime import datetime, timedelta
 
+from bson import ObjectId
+from bson.errors import InvalidId
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase, AsyncIOMotorCollection
+from pymongo.errors import BulkWriteError, OperationFailure
 
+from .metrics import metrics
 from dotenv import load_dotenv
 load_dotenv()
+
+logger = logging.getLogger(__name__)
+
 DATABASE_URL = os.getenv("DATABASE_URL", "")
+# Outbox flushes to Mongo with one unordered insert_many per batch
+MONGO_BULK_BATCH = int(os.getenv("MONGO_BULK_BATCH", "500"))
+MONGO_BULK_LINGER_MS = float(os.getenv("MONGO_BULK_LINGER_MS", "200"))
+DUPLICATE_KEY_ERROR = 11000
+
+# Fields returned by the records listing unless the full document is requested
+RECORD_SUMMARY_PROJECTION = {
+    "input_type": 1,
+    "created_at": 1,
+    "cache_key": 1,
+    "payload.url": 1,
+    "result.verdict": 1,
+    "result.confidence": 1,
+    "result.summary": 1,
+}
 
 # MongoDB client and database
 mongo_client: Optional[AsyncIOMotorClient] = None
@@ -19,14 +44,14 @@ async def init_db() -> None:
     global mongo_client, mongo_db, analysis_collection
     
     if not DATABASE_URL:
-        print("Warning: DATABASE_URL not configured")
+        logger.warning("DATABASE_URL not configured")
         return
     
     try:
         mongo_client = AsyncIOMotorClient(DATABASE_URL)
         # Ping the database to verify connection
         await mongo_client.admin.command('ping')
-        print("Successfully connected to MongoDB!")
+        logger.info("Successfully connected to MongoDB!")
         
         # Get database name from URL or use default
         mongo_db = mongo_client.get_default_database()
@@ -37,12 +62,22 @@ async def init_db() -> None:
         # Get collection for analysis records
         analysis_collection = mongo_db.analysis_records
         
-        # Create indexes for better query performance
-        await analysis_collection.create_index("input_type")
-        await analysis_collection.create_index("created_at")
+        # Create indexes for better query performance; the (created_at, _id)
+        # suffix matches the keyset sort of get_analysis_records
+        await analysis_collection.create_index([("created_at", -1), ("_id", -1)])
+        await analysis_collection.create_index([("input_type", 1), ("created_at", -1), ("_id", -1)])
+        await analysis_collection.create_index([("result.verdict", 1), ("created_at", -1), ("_id", -1)])
+        await analysis_collection.create_index([("cache_key", 1), ("created_at", -1)], sparse=True)
+        # The compound indexes above cover the old single-field ones
+        for name in ("input_type_1", "created_at_1"):
+            try:
+                await analysis_collection.drop_index(name)
+            except OperationFailure:
+                # Already dropped (or never created)
+                pass
         
     except Exception as e:
-        print(f"Failed to connect to MongoDB: {e}")
+        logger.error("Failed to connect to MongoDB: %s", e)
         mongo_client = None
         mongo_db = None
         analysis_collection = None
@@ -55,7 +90,12 @@ async def close_db() -> None:
         mongo_client.close()
 
 
-async def create_analysis_record(input_type: str, payload: Dict[str, Any], result: Dict[str, Any]) -> Optional[str]:
+async def create_analysis_record(
+    input_type: str,
+    payload: Dict[str, Any],
+    result: Dict[str, Any],
+    cache_key: Optional[str] = None,
+) -> Optional[str]:
     """
     Create a new analysis record in MongoDB.
     
@@ -63,6 +103,7 @@ async def create_analysis_record(input_type: str, payload: Dict[str, Any], resul
         input_type: Type of analysis (url, text, image, video)
         payload: Input payload
         result: Analysis result
+        cache_key: Content-addressed verdict cache key, if the result is cacheable
     
     Returns:
         The inserted document ID as string, or None if DB not configured
@@ -77,44 +118,190 @@ async def create_analysis_record(input_type: str, payload: Dict[str, Any], resul
             "result": result,
             "created_at": datetime.utcnow()
         }
+        if cache_key:
+            document["cache_key"] = cache_key
         
-        insert_result = await analysis_collection.insert_one(document)
+        with metrics.span("mongo", "dependency"):
+            insert_result = await analysis_collection.insert_one(document)
         return str(insert_result.inserted_id)
     except Exception as e:
-        print(f"Error creating analysis record: {e}")
+        logger.error("Error creating analysis record: %s", e)
         return None
 
 
-async def get_analysis_records(limit: int = 100, skip: int = 0) -> list:
+def db_ready() -> bool:
+    return analysis_collection is not None
+
+
+def new_record_id() -> str:
+    """Client-side record id, so a write-behind insert can be referenced before it lands."""
+    return str(ObjectId())
+
+
+async def write_analysis_records(records: List[Dict[str, Any]]) -> None:
     """
-    Retrieve analysis records from MongoDB.
+    Insert records queued by the outbox.
     
     Args:
-        limit: Maximum number of records to return
-        skip: Number of records to skip
+        records: Documents with a string ``_id`` (see ``new_record_id``) and
+            ``created_at`` as a Unix timestamp
     
-    Returns:
-        List of analysis records
+    The whole batch goes out as one unordered ``insert_many``, so a bad
+    document does not stop the rest. Raises on failure so the outbox
+    retries; a record that already exists (a replay after a crash) counts
+    as written.
     """
-    if analysis_collection is None:
-        return []
-    
+    if analysis_collection is None or not records:
+        return
+    documents = []
+    for record in records:
+        document = {
+            **record,
+            "_id": ObjectId(record["_id"]),
+            "created_at": datetime.utcfromtimestamp(record["created_at"]),
+        }
+        if not document.get("cache_key"):
+            document.pop("cache_key", None)
+        documents.append(document)
     try:
-        cursor = analysis_collection.find().sort("created_at", -1).skip(skip).limit(limit)
-        records = await cursor.to_list(length=limit)
-        
-        # Convert ObjectId to string for JSON serialization
-        for record in records:
-            record["_id"] = str(record["_id"])
-        
-        return records
-    except Exception as e:
-        print(f"Error retrieving analysis records: {e}")
-        return []
+        with metrics.span("mongo", "dependency"):
+            await analysis_collection.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        errors = [err for err in e.details.get("writeErrors", []) if err.get("code") != DUPLICATE_KEY_ERROR]
+        if errors or e.details.get("writeConcernErrors"):
+            raise
+
 
+class InvalidCursor(ValueError):
+    """Raised when a records cursor cannot be decoded."""
 
 
+def encode_cursor(created_at: datetime, record_id: ObjectId) -> str:
+    """Opaque keyset cursor pointing just past ``(created_at, _id)``."""
+    raw = f"{created_at.isoformat()}|{record_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
 
 
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, record_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), ObjectId(record_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError, InvalidId) as e:
+        raise InvalidCursor("Invalid cursor") from e
 
 
+async def get_analysis_records(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    input_type: Optional[str] = None,
+    verdict: Optional[str] = None,
+    full: bool = False,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Retrieve analysis records from MongoDB, newest first.
+    
+    Pages with a keyset on ``(created_at, _id)`` instead of ``skip()``, so
+    every page costs the same index range scan however deep it is.
+    
+    Args:
+        limit: Maximum number of records to return
+        cursor: ``next_cursor`` from the previous page
+        input_type: Only records of this input type
+        verdict: Only records with this verdict
+        full: Return whole documents instead of the summary projection
+    
+    Returns:
+        The records and the cursor of the next page (None on the last page)
+    
+    Raises:
+        InvalidCursor: If ``cursor`` was not produced by this function
+    """
+    if analysis_collection is None:
+        return [], None
+    
+    query: Dict[str, Any] = {}
+    if input_type:
+        query["input_type"] = input_type
+    if verdict:
+        query["result.verdict"] = verdict
+    if cursor:
+        created_at, record_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": record_id}},
+        ]
+    
+    # One extra row tells us whether another page exists
+    with metrics.span("mongo", "dependency"):
+        records = await (
+            analysis_collection.find(query, projection=None if full else RECORD_SUMMARY_PROJECTION)
+            .sort([("created_at", -1), ("_id", -1)])
+            .limit(limit + 1)
+            .to_list(length=limit + 1)
+        )
+    
+    next_cursor = None
+    if len(records) > limit:
+        records = records[:limit]
+        next_cursor = encode_cursor(records[-1]["created_at"], records[-1]["_id"])
+    
+    # Convert ObjectId to string for JSON serialization
+    for record in records:
+        record["_id"] = str(record["_id"])
+    
+    return records, next_cursor
+
+
+async def find_analysis_record(record_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Look up one analysis record by id (the ``result`` and ``payload.url`` only).
+    
+    Returns:
+        The record, or None if missing, not yet written, or DB not configured
+    """
+    if analysis_collection is None:
+        return None
+    
+    try:
+        return await analysis_collection.find_one(
+            {"_id": ObjectId(record_id)},
+            projection={"result": 1, "payload.url": 1},
+        )
+    except InvalidId:
+        return None
+    except Exception as e:
+        logger.error("Error reading analysis record: %s", e)
+        return None
+
+
+async def find_cached_analysis(cache_key: str, max_age_s: float) -> Optional[Dict[str, Any]]:
+    """
+    Look up the most recent analysis result stored under a verdict cache key.
+    
+    Args:
+        cache_key: Content-addressed key computed by the verdict cache
+        max_age_s: Ignore records older than this many seconds
+    
+    Returns:
+        The stored result dict, or None on miss or if DB not configured
+    """
+    if analysis_collection is None:
+        return None
+    
+    try:
+        record = await analysis_collection.find_one(
+            {
+                "cache_key": cache_key,
+                "created_at": {"$gte": datetime.utcnow() - timedelta(seconds=max_age_s)},
+                # Same rule as cache.is_cacheable_result, for records written before it applied here
+                "result.verdict": {"$nin": [None, "Unknown"]},
+                "result.degraded": {"$exists": False},
+            },
+            projection={"result": 1},
+            sort=[("created_at", -1)],
+        )
+        return record["result"] if record else None
+    except Exception as e:
+        logger.error("Error reading cached analysis: %s", e)
+        return None
@@ -0,0 +1,174 @@
+"""Local, CPU-only entity/claim extraction for the knowledge graph.
+
+Rule + gazetteer based (no model, no network): capitalized spans are
+classified by gazetteers, organisation suffixes and person titles, and
+"<person> of <organisation>" is split into both; URLs come from a regex;
+claims are sentences carrying a reporting verb or a statistic.
+"""
+import hashlib
+import re
+from typing import Any, Dict, List, Tuple
+
+MAX_CLAIMS = 5
+
+_ORG_GAZETTEER = {
+    "who", "world health organization", "un", "united nations", "nato", "eu", "european union",
+    "nasa", "fbi", "cia", "cdc", "fda", "imf", "world bank", "unicef", "unesco", "wto", "opec",
+    "reuters", "associated press", "ap", "bbc", "cnn", "fox news", "the new york times",
+    "new york times", "washington post", "the guardian", "al jazeera", "bloomberg",
+    "google", "meta", "facebook", "twitter", "x", "microsoft", "apple", "amazon", "tesla",
+    "openai", "pfizer", "moderna", "congress", "senate", "parliament", "supreme court",
+    "white house", "pentagon", "kremlin", "harvard", "oxford", "mit", "stanford",
+}
+_ORG_SUFFIXES = {
+    "inc", "inc.", "corp", "corp.", "corporation", "ltd", "ltd.", "llc", "plc", "co.", "company",
+    "university", "institute", "ministry", "department", "agency", "commission", "council",
+    "committee", "party", "association", "organization", "organisation", "foundation", "bank",
+    "group", "news", "times", "post", "journal", "press", "network", "bureau", "court", "army",
+    "police", "hospital", "school", "college", "union", "federation", "authority", "board",
+    "institutes", "centers", "centre", "center", "office", "administration", "services",
+}
+_PLACE_GAZETTEER = {
+    "afghanistan", "africa", "america", "argentina", "asia", "australia", "austria", "bangladesh",
+    "belgium", "brazil", "britain", "canada", "chile", "china", "colombia", "cuba", "denmark",
+    "egypt", "england", "ethiopia", "europe", "finland", "france", "gaza", "germany", "greece",
+    "india", "indonesia", "iran", "iraq", "ireland", "israel", "italy", "japan", "kenya", "korea",
+    "north korea", "south korea", "lebanon", "mexico", "netherlands", "new zealand", "nigeria",
+    "norway", "pakistan", "palestine", "peru", "philippines", "poland", "portugal", "qatar",
+    "russia", "saudi arabia", "scotland", "singapore", "south africa", "spain", "sweden",
+    "switzerland", "syria", "taiwan", "thailand", "turkey", "ukraine", "united kingdom", "uk",
+    "united states", "us", "usa", "venezuela", "vietnam", "wales", "yemen", "london", "paris",
+    "berlin", "moscow", "beijing", "tokyo", "delhi", "new delhi", "mumbai", "washington",
+    "new york", "los angeles", "chicago", "san francisco", "toronto", "sydney", "dubai",
+    "jerusalem", "kyiv", "kiev", "brussels", "geneva", "rome", "madrid", "istanbul", "cairo",
+    "lagos", "nairobi", "seoul", "shanghai", "hong kong", "california", "texas", "florida",
+}
+_PERSON_TITLES = {
+    "mr", "mrs", "ms", "dr", "prof", "professor", "president", "senator", "governor", "minister",
+    "prime minister", "secretary", "chancellor", "king", "queen", "prince", "princess", "pope",
+    "general", "judge", "justice", "sir", "dame", "ceo", "rep", "representative", "mayor",
+}
+# Capitalized words that start sentences/headlines but are not names
+_STOPWORDS = {
+    "the", "a", "an", "this", "that", "these", "those", "it", "its", "he", "she", "they", "we",
+    "i", "you", "in", "on", "at", "for", "of", "and", "but", "or", "if", "when", "while", "after",
+    "before", "as", "by", "with", "from", "to", "according", "however", "meanwhile", "also",
+    "there", "here", "what", "why", "how", "who", "breaking", "update", "monday", "tuesday",
+    "wednesday", "thursday", "friday", "saturday", "sunday", "january", "february", "march",
+    "april", "may", "june", "july", "august", "september", "october", "november", "december",
+    "see", "read", "watch", "click", "share", "said", "says", "latest", "exclusive", "opinion",
+}
+
+_URL_RE = re.compile(r"\bhttps?://[^\s<>\"')\]]+", re.IGNORECASE)
+_CAPSPAN_RE = re.compile(
+    r"\b[A-Z][a-zA-Z'’-]*(?:[ \t]+(?:(?:of|for|and|the|de|von|van|al)[ \t]+)?[A-Z][a-zA-Z'’-]*)*"
+)
+_ABBREV_RE = re.compile(r"\b(Inc|Corp|Ltd|Co|Dr|Mr|Mrs|Ms|Prof|St|Jr|Sr|Gen|Gov|Sen|Rep|vs|U\.S|U\.K)\.")
+_TITLE_RE = re.compile(
+    r"\b(" + "|".join(sorted((re.escape(t) for t in _PERSON_TITLES), key=len, reverse=True)) + r")\.?\s+$",
+    re.IGNORECASE,
+)
+_SENTENCE_RE = re.compile(r"[^.!?\n]+[.!?]?")
+_CLAIM_CUE_RE = re.compile(
+    r"\b(claims?|claimed|said|says|stated|announced|reported|alleged|according to|revealed|"
+    r"confirmed|denied|warned|found that|shows? that|proves?|causes?|caused)\b"
+    r"|\d+(?:[.,]\d+)?\s*(?:%|percent|million|billion|thousand|people|deaths|cases)",
+    re.IGNORECASE,
+)
+
+
+def entity_id(entity_type: str, name: str) -> str:
+    """Stable id for an entity node; identical names of the same type dedupe."""
+    key = f"{entity_type}:{' '.join(name.casefold().split())}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def _classify(span: str, prefix: str) -> str:
+    lowered = span.casefold()
+    if lowered in _ORG_GAZETTEER:
+        return "Organization"
+    if lowered in _PLACE_GAZETTEER:
+        return "Place"
+    words = lowered.split()
+    if len(words) > 1 and any(w in _ORG_SUFFIXES for w in words):
+        return "Organization"
+    if _TITLE_RE.search(prefix):
+        return "Person"
+    if 2 <= len(words) <= 3 and all(w not in _STOPWORDS for w in words) and span.replace(" ", "").isalpha():
+        # Two or three bare capitalized words ("Jane Smith") are most often a person
+        return "Person"
+    if len(span) >= 2 and span.isupper() and span.isalpha():
+        return "Organization"
+    return ""
+
+
+def _split_affiliation(span: str, prefix: str) -> Tuple[str, str]:
+    """Split "Jane Smith of Harvard University" into (person, organization); ("", "") if it is not one."""
+    head, sep, tail = span.partition(" of ")
+    tail = _trim_span(tail)
+    if not sep or _classify(tail, "") != "Organization":
+        return "", ""
+    words = head.split()
+    if len(words) > 1 and words[0].casefold() in _PERSON_TITLES:
+        return " ".join(words[1:]), tail
+    if _classify(head, prefix) == "Person":
+        return head, tail
+    return "", ""
+
+
+def _trim_span(span: str) -> str:
+    words = span.split()
+    while words and words[0].casefold().strip(".") in _STOPWORDS:
+        words.pop(0)
+    while words and words[-1].casefold() in {"of", "for", "and", "the", "de", "von", "van", "al"}:
+        words.pop()
+    return " ".join(words).strip(".'’-")
+
+
+def extract_entities(text: str) -> List[Dict[str, Any]]:
+    """Return deduplicated ``{"id", "type", "name", "count"}`` entities found in ``text``."""
+    found: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    def add(entity_type: str, name: str) -> None:
+        key = (entity_type, name.casefold())
+        entity = found.get(key)
+        if entity is None:
+            found[key] = {"id": entity_id(entity_type, name), "type": entity_type, "name": name, "count": 1}
+        else:
+            entity["count"] += 1
+
+    for match in _URL_RE.finditer(text):
+        add("URL", match.group(0).rstrip(".,;:"))
+    # A removed URL ends the sentence around it, so its neighbours never merge into one claim
+    text_wo_urls = _URL_RE.sub("\n", text)
+
+    for match in _CAPSPAN_RE.finditer(text_wo_urls):
+        span = _trim_span(match.group(0))
+        if not span or span.casefold() in _STOPWORDS:
+            continue
+        prefix = text_wo_urls[max(0, match.start() - 20):match.start()]
+        person, organization = _split_affiliation(span, prefix)
+        if person:
+            add("Person", person)
+            add("Organization", organization)
+            continue
+        words = span.split()
+        if len(words) > 1 and words[0].casefold() in _PERSON_TITLES:
+            # "President Jane Smith" -> Person "Jane Smith"
+            add("Person", " ".join(words[1:]))
+            continue
+        entity_type = _classify(span, prefix)
+        if entity_type:
+            add(entity_type, span)
+
+    claims = 0
+    for match in _SENTENCE_RE.finditer(_ABBREV_RE.sub(r"\1", text_wo_urls)):
+        sentence = match.group(0).strip()
+        if len(sentence) < 30 or len(sentence) > 400 or not _CLAIM_CUE_RE.search(sentence):
+            continue
+        add("Claim", sentence)
+        claims += 1
+        if claims >= MAX_CLAIMS:
+            break
+
+    return list(found.values())
@@ -0,0 +1,284 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# "local" (single process), "unix" (workers on one host), "redis" or "memory" (broker stand-in)
+EVENT_BUS = os.getenv("EVENT_BUS", "local").lower()
+EVENT_BUS_DIR = os.getenv("EVENT_BUS_DIR", "/tmp/filtr-bus")
+EVENT_BUS_URL = os.getenv("EVENT_BUS_URL", "redis://localhost:6379/0")
+EVENT_BUS_CHANNEL = os.getenv("EVENT_BUS_CHANNEL", "filtr:events")
+# How often the unix backend re-lists peer sockets
+EVENT_BUS_PEER_REFRESH_S = float(os.getenv("EVENT_BUS_PEER_REFRESH_S", "2"))
+
+# Called with (topic, serialized message) for every event from another worker
+Deliver = Callable[[str, str], None]
+
+
+class EventBus:
+    """Carries serialized broadcast messages to the other worker processes.
+
+    The publisher delivers to its own clients directly; ``publish`` only
+    forwards the event, and each receiving bus hands it to its ``deliver``
+    callback. The base class is the single-process backend (nothing to
+    forward).
+    """
+
+    name = "local"
+    distributed = False
+
+    def __init__(self) -> None:
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._deliver: Optional[Deliver] = None
+        self.published = 0
+        self.received = 0
+        self.send_failures = 0
+
+    async def start(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+
+    async def stop(self) -> None:
+        pass
+
+    async def publish(self, topic: str, data: str) -> None:
+        pass
+
+    def _envelope(self, topic: str, data: str) -> bytes:
+        return json.dumps({"origin": self.worker_id, "topic": topic, "data": data}).encode("utf-8")
+
+    def _receive(self, raw: bytes) -> None:
+        try:
+            event = json.loads(raw)
+        except ValueError:
+            return
+        if event.get("origin") == self.worker_id or self._deliver is None:
+            return
+        self.received += 1
+        self._deliver(event["topic"], event["data"])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "worker_id": self.worker_id,
+            "published": self.published,
+            "received": self.received,
+            "send_failures": self.send_failures,
+        }
+
+
+class UnixSocketBus(EventBus):
+    """Peer-to-peer Unix datagram sockets for workers on one host.
+
+    Every worker binds ``<directory>/<worker_id>.sock`` and sends each event
+    to all the other sockets in the directory. Sends never block: if a peer's
+    receive buffer is full the datagram is dropped and counted, and sockets
+    whose worker is gone are removed.
+    """
+
+    name = "unix"
+    distributed = True
+
+    def __init__(self, directory: str = EVENT_BUS_DIR, peer_refresh_s: float = EVENT_BUS_PEER_REFRESH_S) -> None:
+        super().__init__()
+        self.directory = directory
+        self.peer_refresh_s = peer_refresh_s
+        self.path = os.path.join(directory, f"{self.worker_id}.sock")
+        self._sock: Optional[socket.socket] = None
+        self._peers: List[str] = []
+        self._peers_at = 0.0
+        self.dropped = 0
+
+    async def start(self, deliver: Deliver) -> None:
+        await super().start(deliver)
+        os.makedirs(self.directory, exist_ok=True)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4 * 1024 * 1024)
+        self._sock.bind(self.path)
+        self._sock.setblocking(False)
+        asyncio.get_running_loop().add_reader(self._sock.fileno(), self._on_readable)
+        logger.info("Event bus listening on %s", self.path)
+
+    async def stop(self) -> None:
+        if self._sock is not None:
+            asyncio.get_running_loop().remove_reader(self._sock.fileno())
+            self._sock.close()
+            self._sock = None
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def _on_readable(self) -> None:
+        while self._sock is not None:
+            try:
+                raw = self._sock.recv(1 << 20)
+            except (BlockingIOError, InterruptedError):
+                return
+            self._receive(raw)
+
+    def _peer_paths(self) -> List[str]:
+        now = time.monotonic()
+        if now - self._peers_at >= self.peer_refresh_s:
+            self._peers = [
+                os.path.join(self.directory, name)
+                for name in os.listdir(self.directory)
+                if name.endswith(".sock") and os.path.join(self.directory, name) != self.path
+            ]
+            self._peers_at = now
+        return self._peers
+
+    async def publish(self, topic: str, data: str) -> None:
+        if self._sock is None:
+            return
+        self.published += 1
+        payload = self._envelope(topic, data)
+        for peer in self._peer_paths():
+            try:
+                self._sock.sendto(payload, peer)
+            except BlockingIOError:
+                self.dropped += 1
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Worker exited without cleaning up
+                self._remove_peer(peer)
+            except OSError as e:
+                self.send_failures += 1
+                logger.warning("Event bus send to %s failed: %s", peer, e)
+
+    def _remove_peer(self, peer: str) -> None:
+        if peer in self._peers:
+            self._peers.remove(peer)
+        try:
+            os.unlink(peer)
+        except OSError:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "peers": len(self._peers), "dropped": self.dropped}
+
+
+class InMemoryBroker:
+    """Pub/sub broker stand-in (the subset of Redis the broker bus uses).
+
+    Several ``BrokerBus`` instances sharing one of these behave like workers
+    sharing a real broker, which is enough for tests and benchmarks.
+    """
+
+    def __init__(self) -> None:
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+
+    async def publish(self, channel: str, data: bytes) -> None:
+        for queue in self._subscribers.get(channel, ()):
+            queue.put_nowait(data)
+
+    async def subscribe(self, channel: str) -> AsyncIterator[bytes]:
+        """Register now; the returned iterator yields every later publish."""
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(channel, []).append(queue)
+
+        async def messages() -> AsyncIterator[bytes]:
+            try:
+                while True:
+                    yield await queue.get()
+            finally:
+                self._subscribers[channel].remove(queue)
+
+        return messages()
+
+    async def close(self) -> None:
+        pass
+
+
+class RedisBroker:
+    """Redis pub/sub adapter (requires the optional ``redis`` package)."""
+
+    def __init__(self, url: str = EVENT_BUS_URL) -> None:
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url)
+
+    async def publish(self, channel: str, data: bytes) -> None:
+        await self._redis.publish(channel, data)
+
+    async def subscribe(self, channel: str) -> AsyncIterator[bytes]:
+        pubsub = self._redis.pubsub()
+        await pubsub.subscribe(channel)
+
+        async def messages() -> AsyncIterator[bytes]:
+            try:
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        yield message["data"]
+            finally:
+                await pubsub.aclose()
+
+        return messages()
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+class BrokerBus(EventBus):
+    """Fans events out through an external pub/sub broker (workers on many hosts)."""
+
+    name = "broker"
+    distributed = True
+
+    def __init__(self, broker: Any, channel: str = EVENT_BUS_CHANNEL) -> None:
+        super().__init__()
+        self.broker = broker
+        self.channel = channel
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, deliver: Deliver) -> None:
+        await super().start(deliver)
+        # Subscribe before returning so nothing published after startup is missed
+        stream = await self.broker.subscribe(self.channel)
+        self._task = asyncio.create_task(self._listen(stream))
+
+    async def _listen(self, stream: AsyncIterator[bytes]) -> None:
+        try:
+            async for raw in stream:
+                self._receive(raw)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Event bus subscription ended: %s", e)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.broker.close()
+
+    async def publish(self, topic: str, data: str) -> None:
+        self.published += 1
+        try:
+            await self.broker.publish(self.channel, self._envelope(topic, data))
+        except Exception as e:
+            self.send_failures += 1
+            logger.warning("Event bus publish failed: %s", e)
+
+
+def create_event_bus(kind: str = EVENT_BUS) -> EventBus:
+    if kind == "unix":
+        return UnixSocketBus()
+    if kind == "redis":
+        try:
+            return BrokerBus(RedisBroker())
+        except ImportError:
+            logger.warning("EVENT_BUS=redis but the 'redis' package is missing; using the local bus")
+            return EventBus()
+    if kind == "memory":
+        return BrokerBus(InMemoryBroker())
+    return EventBus()
@@ -0,0 +1,445 @@
+import asyncio
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+load_dotenv()
+
+from .cache import canonicalize_url
+from .html_extract import extract_text_async
+from .http_client import fetch_body
+
+logger = logging.getLogger(__name__)
+
+FETCH_CACHE_ENABLED = os.getenv("FETCH_CACHE_ENABLED", "1") not in ("0", "false", "False", "")
+FETCH_CACHE_DIR = os.getenv("FETCH_CACHE_DIR", "data/fetch_cache")
+FETCH_CACHE_MEMORY_BYTES = int(os.getenv("FETCH_CACHE_MEMORY_BYTES", str(32 * 1024 * 1024)))
+FETCH_CACHE_DISK_BYTES = int(os.getenv("FETCH_CACHE_DISK_BYTES", str(256 * 1024 * 1024)))
+# Freshness when the response carries no Cache-Control max-age or Expires
+FETCH_CACHE_DEFAULT_TTL_S = float(os.getenv("FETCH_CACHE_DEFAULT_TTL_S", "600"))
+FETCH_CACHE_MAX_TTL_S = float(os.getenv("FETCH_CACHE_MAX_TTL_S", "86400"))
+# Pages are read up to this many bytes; other media types are refused
+FETCH_MAX_BYTES = int(os.getenv("FETCH_MAX_BYTES", str(2 * 1024 * 1024)))
+FETCH_ALLOWED_TYPES = tuple(
+    t.strip() for t in os.getenv("FETCH_ALLOWED_TYPES", "text/html,application/xhtml+xml,text/plain").split(",") if t.strip()
+)
+
+# Rough per-entry overhead (dict, key, timestamps) added to the text size
+_ENTRY_OVERHEAD_BYTES = 256
+# A full disk tier is evicted down to this fraction of its budget, so it is not rescanned on every write
+_DISK_LOW_WATER = 0.9
+
+
+def _cache_control(headers: httpx.Headers) -> Dict[str, Optional[str]]:
+    directives: Dict[str, Optional[str]] = {}
+    for value in headers.get_list("cache-control"):
+        for part in value.split(","):
+            name, _, arg = part.strip().partition("=")
+            if name:
+                directives[name.lower()] = arg.strip('"') or None
+    return directives
+
+
+def freshness_ttl(headers: httpx.Headers, default_ttl_s: float = FETCH_CACHE_DEFAULT_TTL_S) -> Optional[float]:
+    """Seconds a response stays fresh, or ``None`` if it must not be stored.
+
+    ``no-store`` disables caching, ``no-cache`` stores but revalidates every
+    time, ``s-maxage``/``max-age`` (minus ``Age``) win over ``Expires``, and
+    responses without any of these get ``default_ttl_s``.
+    """
+    directives = _cache_control(headers)
+    if "no-store" in directives:
+        return None
+    if "no-cache" in directives:
+        return 0.0
+    ttl: Optional[float] = None
+    for name in ("s-maxage", "max-age"):
+        try:
+            ttl = float(directives[name])
+            break
+        except (KeyError, TypeError, ValueError):
+            continue
+    if ttl is not None:
+        try:
+            ttl -= float(headers.get("age", "0"))
+        except ValueError:
+            pass
+    elif "expires" in headers:
+        try:
+            expires = parsedate_to_datetime(headers["expires"]).timestamp()
+            date = parsedate_to_datetime(headers["date"]).timestamp() if "date" in headers else time.time()
+            ttl = expires - date
+        except (TypeError, ValueError):
+            # Invalid Expires means "already expired"
+            ttl = 0.0
+    else:
+        ttl = default_ttl_s
+    return max(0.0, min(ttl, FETCH_CACHE_MAX_TTL_S))
+
+
+def _entry_size(entry: Dict[str, Any]) -> int:
+    return len(entry["text"].encode("utf-8")) + len(entry["url"]) + _ENTRY_OVERHEAD_BYTES
+
+
+class FetchCache:
+    """HTTP-aware cache of extracted page text, keyed on the canonical URL.
+
+    Entries keep the ETag/Last-Modified validators and a freshness deadline
+    derived from Cache-Control/Expires. Fresh entries are served without
+    touching the network; stale ones are revalidated with a conditional GET,
+    and a ``304`` renews them without downloading or re-parsing the page.
+    Tier 1 is an in-memory LRU bounded by ``memory_bytes``; tier 2 is one
+    JSON file per URL under ``directory``, bounded by ``disk_bytes`` and
+    evicted least-recently-used first. Concurrent fetches of one URL share a
+    single request.
+
+    Every worker shares the disk tier: the directory's total size is kept
+    in a ledger file that writers update under an exclusive ``flock``, and
+    eviction rescans the directory under that lock, so the budget holds
+    for the whole host rather than per process.
+    """
+
+    def __init__(
+        self,
+        directory: str = FETCH_CACHE_DIR,
+        memory_bytes: int = FETCH_CACHE_MEMORY_BYTES,
+        disk_bytes: int = FETCH_CACHE_DISK_BYTES,
+        enabled: bool = FETCH_CACHE_ENABLED,
+    ) -> None:
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.enabled = enabled
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._memory_used = 0
+        # Disk tier size as of this worker's last write (None until then)
+        self._disk_used: Optional[int] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.revalidated = 0
+        self.refetched = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.stale_served = 0
+        self.not_stored = 0
+        self.memory_evictions = 0
+        self.disk_evictions = 0
+        self.bytes_fetched = 0
+        self.bytes_saved = 0
+
+    # -- memory tier ---------------------------------------------------------
+
+    def _memory_get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+        return entry
+
+    def _memory_put(self, key: str, entry: Dict[str, Any]) -> None:
+        self._memory_remove(key)
+        size = _entry_size(entry)
+        if size > self.memory_bytes:
+            return
+        self._memory[key] = entry
+        self._memory_used += size
+        while self._memory_used > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= _entry_size(evicted)
+            self.memory_evictions += 1
+
+    def _memory_remove(self, key: str) -> None:
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_used -= _entry_size(entry)
+
+    # -- disk tier -----------------------------------------------------------
+
+    @staticmethod
+    def _file_name(key: str) -> str:
+        return hashlib.sha256(key.encode("utf-8")).hexdigest() + ".json"
+
+    def _scan_disk(self) -> List[Tuple[float, str, int]]:
+        """``(mtime, name, size)`` of every entry file, least recently used first."""
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                try:
+                    st = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue  # removed meanwhile
+                files.append((st.st_mtime, name, st.st_size))
+        files.sort()
+        return files
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Exclusive lock on the disk tier, shared by every process using ``directory``."""
+        os.makedirs(self.directory, exist_ok=True)
+        fd = os.open(os.path.join(self.directory, ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def _read_usage(self) -> int:
+        # Caller holds the lock; a missing or corrupt ledger is rebuilt from the directory
+        try:
+            with open(os.path.join(self.directory, ".usage"), "r") as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            return sum(size for _, _, size in self._scan_disk())
+
+    def _write_usage(self, used: int) -> None:
+        self._write_file(".usage", str(max(0, used)).encode("ascii"))
+        self._disk_used = max(0, used)
+
+    def _file_size(self, name: str) -> int:
+        try:
+            return os.stat(os.path.join(self.directory, name)).st_size
+        except OSError:
+            return 0
+
+    def _read_file(self, name: str) -> Optional[Dict[str, Any]]:
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            # Bump mtime so LRU order survives restarts
+            os.utime(path)
+            return entry
+        except (OSError, ValueError):
+            return None
+
+    def _write_file(self, name: str, data: bytes) -> None:
+        path = os.path.join(self.directory, name)
+        tmp = f"{path}.tmp-{os.getpid()}"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _put_file(self, name: str, data: bytes) -> int:
+        """Write an entry and evict until the directory fits; returns the number of files evicted."""
+        with self._locked():
+            used = self._read_usage() - self._file_size(name)
+            self._write_file(name, data)
+            used += len(data)
+            evicted = 0
+            if used > self.disk_bytes:
+                # Other workers write here too: evict by what is really on disk
+                files = self._scan_disk()
+                used = sum(size for _, _, size in files)
+                target = int(self.disk_bytes * _DISK_LOW_WATER)
+                for _, old_name, size in files:
+                    if used <= target:
+                        break
+                    if old_name == name:
+                        continue
+                    self._remove_file(old_name)
+                    used -= size
+                    evicted += 1
+            self._write_usage(used)
+        return evicted
+
+    def _remove_file(self, name: str) -> None:
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except OSError:
+            pass
+
+    def _delete_files(self, names: Optional[List[str]] = None) -> None:
+        """Remove the named entries (all of them when ``names`` is None) and update the ledger."""
+        with self._locked():
+            if names is None:
+                names = [name for _, name, _ in self._scan_disk()]
+            used = self._read_usage()
+            for name in names:
+                used -= self._file_size(name)
+                self._remove_file(name)
+            self._write_usage(used)
+
+    async def _disk_get(self, key: str) -> Optional[Dict[str, Any]]:
+        # Any worker may have written it: just try the file
+        entry = await asyncio.to_thread(self._read_file, self._file_name(key))
+        if entry is None or entry.get("key") != key:
+            return None
+        return entry
+
+    async def _disk_put(self, key: str, entry: Dict[str, Any]) -> None:
+        data = json.dumps({**entry, "key": key}).encode("utf-8")
+        if len(data) > self.disk_bytes:
+            return
+        try:
+            self.disk_evictions += await asyncio.to_thread(self._put_file, self._file_name(key), data)
+        except OSError as e:
+            logger.warning("Fetch cache write failed: %s", e)
+
+    async def _disk_remove(self, key: str) -> None:
+        name = self._file_name(key)
+        if os.path.exists(os.path.join(self.directory, name)):
+            await asyncio.to_thread(self._delete_files, [name])
+
+    # -- fetching ------------------------------------------------------------
+
+    async def fetch(self, url: str) -> Tuple[str, str]:
+        """Return ``(text, status)``; status is hit|disk_hit|coalesced|revalidated|refetched|stale|miss."""
+        if not self.enabled:
+            text, _ = await self._download(url, None)
+            return text, "miss"
+
+        key = canonicalize_url(url)
+        entry = self._memory_get(key)
+        status = "hit"
+        if entry is None:
+            entry = await self._disk_get(key)
+            status = "disk_hit"
+            if entry is not None:
+                self._memory_put(key, entry)
+        if entry is not None and entry["expires_at"] > time.time():
+            if status == "hit":
+                self.hits += 1
+            else:
+                self.disk_hits += 1
+            self.bytes_saved += entry["body_bytes"]
+            return entry["text"], status
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            try:
+                text = await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # Re-raise our own cancellation; if the leader was cancelled, fetch ourselves
+                if not inflight.cancelled():
+                    raise
+            else:
+                self.coalesced += 1
+                return text, "coalesced"
+
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            text, status = await self._refresh(url, key, entry)
+            future.set_result(text)
+            return text, status
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so an un-awaited failure does not log a warning
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _download(self, url: str, entry: Optional[Dict[str, Any]]) -> Tuple[str, Any]:
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        fetched = await fetch_body(url, FETCH_MAX_BYTES, allowed_types=FETCH_ALLOWED_TYPES, headers=headers)
+        if fetched.status_code == 304:
+            return "", fetched
+        self.bytes_fetched += len(fetched.body)
+        # Parsed off the event loop (process pool for large pages)
+        text = await extract_text_async(fetched.body, fetched.charset)
+        return text, fetched
+
+    async def _refresh(self, url: str, key: str, entry: Optional[Dict[str, Any]]) -> Tuple[str, str]:
+        try:
+            text, fetched = await self._download(url, entry)
+        except httpx.TransportError as e:
+            if entry is None:
+                raise
+            # Origin unreachable: a stale copy beats no content
+            self.stale_served += 1
+            logger.warning("Serving stale copy of %s: %s", url, e)
+            return entry["text"], "stale"
+
+        ttl = freshness_ttl(fetched.headers)
+        if fetched.status_code == 304 and entry is not None:
+            self.revalidated += 1
+            self.bytes_saved += entry["body_bytes"]
+            entry = {
+                **entry,
+                "etag": fetched.headers.get("etag", entry.get("etag")),
+                "last_modified": fetched.headers.get("last-modified", entry.get("last_modified")),
+                "expires_at": time.time() + (ttl or 0.0),
+            }
+            await self._store(key, entry)
+            return entry["text"], "revalidated"
+
+        status = "refetched" if entry is not None else "miss"
+        if entry is not None:
+            self.refetched += 1
+        else:
+            self.misses += 1
+        if ttl is None:
+            self.not_stored += 1
+            self._memory_remove(key)
+            await self._disk_remove(key)
+            return text, status
+        await self._store(key, {
+            "url": url,
+            "text": text,
+            "etag": fetched.headers.get("etag"),
+            "last_modified": fetched.headers.get("last-modified"),
+            "fetched_at": time.time(),
+            "expires_at": time.time() + ttl,
+            "body_bytes": len(fetched.body),
+        })
+        return text, status
+
+    async def _store(self, key: str, entry: Dict[str, Any]) -> None:
+        self._memory_put(key, entry)
+        await self._disk_put(key, entry)
+
+    async def clear(self) -> None:
+        self._memory.clear()
+        self._memory_used = 0
+        await asyncio.to_thread(self._delete_files)
+
+    def stats(self) -> Dict[str, Any]:
+        served = self.hits + self.disk_hits + self.revalidated + self.coalesced + self.stale_served
+        lookups = served + self.refetched + self.misses
+        return {
+            "enabled": self.enabled,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_used,
+            "memory_limit_bytes": self.memory_bytes,
+            "disk_bytes": self._disk_used,
+            "disk_limit_bytes": self.disk_bytes,
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "revalidated": self.revalidated,
+            "refetched": self.refetched,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "stale_served": self.stale_served,
+            "not_stored": self.not_stored,
+            "memory_evictions": self.memory_evictions,
+            "disk_evictions": self.disk_evictions,
+            "bytes_fetched": self.bytes_fetched,
+            "bytes_saved": self.bytes_saved,
+            "hit_rate": round(served / lookups, 4) if lookups else 0.0,
+        }
+
+
+fetch_cache = FetchCache()
+
+
+def get_fetch_cache() -> FetchCache:
+    return fetch_cache
@@ -1,36 +1,249 @@
+import asyncio
+import logging
 import os
-from typing import Any
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 
-from neo4j import GraphDatabase
+from neo4j import AsyncDriver, AsyncGraphDatabase
 
+from .cache import content_hash
+from .entity_extractor import extract_entities
+from .metrics import metrics
 from dotenv import load_dotenv
 load_dotenv()
+
+logger = logging.getLogger(__name__)
+
 NEO4J_URI = os.getenv("NEO4J_URI", "")
 NEO4J_USER = os.getenv("NEO4J_USER", "")
 NEO4J_PASS = os.getenv("NEO4J_PASS", "")
+NEO4J_POOL_SIZE = int(os.getenv("NEO4J_POOL_SIZE", "20"))
+NEO4J_BATCH_SIZE = int(os.getenv("NEO4J_BATCH_SIZE", "200"))
+NEO4J_FLUSH_INTERVAL_MS = float(os.getenv("NEO4J_FLUSH_INTERVAL_MS", "500"))
+NEO4J_BUFFER_MAX = int(os.getenv("NEO4J_BUFFER_MAX", "10000"))
 
+# Neo4j driver (created once at startup)
+graph_driver: Optional[AsyncDriver] = None
 
-async def write_entities_and_relationships(text: str) -> None:
-    """Minimal example writing a single node for the input text.
+DOCUMENTS_CYPHER = """
+UNWIND $docs AS doc
+MERGE (d:Document {id: doc.id})
+SET d.text = doc.text, d.updated_at = timestamp()
+"""
+
+MENTIONS_CYPHER = """
+UNWIND $mentions AS m
+MERGE (e:Entity {id: m.entity_id})
+ON CREATE SET e.name = m.name, e.type = m.type
+WITH e, m
+MATCH (d:Document {id: m.doc_id})
+MERGE (d)-[r:MENTIONS]->(e)
+SET r.count = m.count
+"""
+
+
+def document_id(text: str) -> str:
+    """Stable, process-independent node id (unlike the salted builtin ``hash``)."""
+    return content_hash(text)
+
+
+async def _neo4j_write_batch(docs: List[Dict[str, Any]]) -> None:
+    async with graph_driver.session() as session:
+        await session.execute_write(_write_documents, docs)
+
+
+def flatten_mentions(docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """One row per (document, entity) pair for the ``MENTIONS`` UNWIND."""
+    return [
+        {
+            "doc_id": doc["id"],
+            "entity_id": entity["id"],
+            "name": entity["name"],
+            "type": entity["type"],
+            "count": entity["count"],
+        }
+        for doc in docs
+        for entity in doc.get("entities", ())
+    ]
 
-    Replace with proper entity extraction and relationship modeling.
+
+async def _write_documents(tx, docs: List[Dict[str, Any]]) -> None:
+    result = await tx.run(DOCUMENTS_CYPHER, docs=[{"id": d["id"], "text": d["text"]} for d in docs])
+    await result.consume()
+    mentions = flatten_mentions(docs)
+    if mentions:
+        result = await tx.run(MENTIONS_CYPHER, mentions=mentions)
+        await result.consume()
+
+
+class GraphWriteBuffer:
+    """Buffers graph writes and flushes them as ``UNWIND`` batches.
+
+    A flush happens when ``batch_size`` documents are pending or every
+    ``flush_interval_s``, whichever comes first. ``write_batch`` does the
+    actual write, so a local stand-in can replace Neo4j.
     """
+
+    def __init__(
+        self,
+        write_batch: Callable[[List[Dict[str, Any]]], Awaitable[None]],
+        batch_size: int = NEO4J_BATCH_SIZE,
+        flush_interval_s: float = NEO4J_FLUSH_INTERVAL_MS / 1000.0,
+        max_pending: int = NEO4J_BUFFER_MAX,
+    ) -> None:
+        self.write_batch = write_batch
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self.max_pending = max_pending
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.flush_failures = 0
+        self.docs_written = 0
+        self.dropped = 0
+        self.total_flush_s = 0.0
+        self.max_flush_s = 0.0
+        self.last_flush_s = 0.0
+
+    def add(self, doc: Dict[str, Any]) -> None:
+        if doc["id"] not in self._pending and len(self._pending) >= self.max_pending:
+            # Graph writes are best-effort: shed load instead of growing without bound
+            self.dropped += 1
+            return
+        # Same id twice before a flush collapses into one MERGE
+        self._pending[doc["id"]] = doc
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval_s)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            while self._pending:
+                ids = list(self._pending)[: self.batch_size]
+                batch = [self._pending.pop(doc_id) for doc_id in ids]
+                started = time.perf_counter()
+                try:
+                    with metrics.span("neo4j", "dependency"):
+                        await self.write_batch(batch)
+                except Exception as e:
+                    self.flush_failures += 1
+                    logger.warning("⚠️ [GRAPH] Batch write of %s docs failed: %s", len(batch), e)
+                    # Put the batch back (unless newer versions arrived) and retry on the next tick
+                    for doc in batch:
+                        self._pending.setdefault(doc["id"], doc)
+                    return
+                elapsed = time.perf_counter() - started
+                self.flushes += 1
+                self.docs_written += len(batch)
+                self.last_flush_s = elapsed
+                self.total_flush_s += elapsed
+                self.max_flush_s = max(self.max_flush_s, elapsed)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "batch_size": self.batch_size,
+            "flush_interval_s": self.flush_interval_s,
+            "flushes": self.flushes,
+            "flush_failures": self.flush_failures,
+            "docs_written": self.docs_written,
+            "batches_per_s": round(self.flushes / self.total_flush_s, 2) if self.total_flush_s else 0.0,
+            "dropped": self.dropped,
+            "avg_batch_size": round(self.docs_written / self.flushes, 2) if self.flushes else 0.0,
+            "last_flush_s": round(self.last_flush_s, 4),
+            "avg_flush_s": round(self.total_flush_s / self.flushes, 4) if self.flushes else 0.0,
+            "max_flush_s": round(self.max_flush_s, 4),
+        }
+
+
+graph_buffer = GraphWriteBuffer(_neo4j_write_batch)
+
+
+async def init_graph() -> None:
+    """Create the pooled async Neo4j driver and start the write buffer."""
+    global graph_driver
     if not (NEO4J_URI and NEO4J_USER and NEO4J_PASS):
+        logger.warning("Neo4j not configured")
         return
-
-    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASS))
     try:
-        with driver.session() as session:
-            session.execute_write(_create_document_node, text)
-    finally:
-        driver.close()
+        graph_driver = AsyncGraphDatabase.driver(
+            NEO4J_URI,
+            auth=(NEO4J_USER, NEO4J_PASS),
+            max_connection_pool_size=NEO4J_POOL_SIZE,
+        )
+        await graph_driver.verify_connectivity()
+        async with graph_driver.session() as session:
+            await session.run("CREATE CONSTRAINT document_id IF NOT EXISTS FOR (d:Document) REQUIRE d.id IS UNIQUE")
+            await session.run("CREATE CONSTRAINT entity_id IF NOT EXISTS FOR (e:Entity) REQUIRE e.id IS UNIQUE")
+        logger.info("Successfully connected to Neo4j!")
+        graph_buffer.start()
+    except Exception as e:
+        logger.error("Failed to connect to Neo4j: %s", e)
+        if graph_driver is not None:
+            await graph_driver.close()
+        graph_driver = None
+
+
+async def close_graph() -> None:
+    """Flush pending graph writes and close the Neo4j driver."""
+    global graph_driver
+    if graph_driver is not None:
+        await graph_buffer.stop()
+        await graph_driver.close()
+        graph_driver = None
+
+
+def build_graph_document(text: str) -> Dict[str, Any]:
+    """Document node plus the deduplicated entities it mentions."""
+    return {"id": document_id(text), "text": text, "entities": extract_entities(text)}
 
 
-def _create_document_node(tx, text: str) -> Any:
-    return tx.run(
-        "MERGE (d:Document {id: $id}) SET d.text = $text RETURN d",
-        id=hash(text),
-        text=text,
-    ).single()
+async def write_entities_and_relationships(text: str) -> None:
+    """Extract entities and queue the document for the next batched graph write.
+
+    Returns immediately; the write buffer flushes ``Document``/``Entity``
+    nodes and ``MENTIONS`` edges in ``UNWIND`` batches.
+    """
+    if graph_driver is None:
+        return
+    # Entity extraction is CPU-bound; keep it off the event loop
+    graph_buffer.add(await asyncio.to_thread(build_graph_document, text))
+
+
+def graph_ready() -> bool:
+    return graph_driver is not None
+
+
+async def write_graph_documents(items: List[Dict[str, Any]]) -> None:
+    """Extract entities for texts queued by the outbox and write them in one ``UNWIND`` batch; raises on failure."""
+    if graph_driver is None:
+        return
+    # Entity extraction is CPU-bound; keep it off the event loop
+    docs = await asyncio.to_thread(lambda: {d["id"]: d for d in (build_graph_document(item["text"]) for item in items)})
+    with metrics.span("neo4j", "dependency"):
+        await _neo4j_write_batch(list(docs.values()))
 
 
+def get_graph_buffer() -> GraphWriteBuffer:
+    return graph_buffer
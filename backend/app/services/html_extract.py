@@ -0,0 +1,138 @@
+"""Article text extraction from fetched HTML.
+
+Uses lxml's C parser when it is installed (BeautifulSoup's pure-Python
+``html.parser`` otherwise) and stops collecting paragraphs as soon as
+``max_chars`` of text are gathered. Documents of ``HTML_POOL_MIN_BYTES`` or
+more are parsed in a small process pool so a huge page never holds the
+event loop or the GIL; smaller ones go to a thread.
+"""
+import asyncio
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Union
+
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Long articles are analyzed in chunks (see services.chunking); this only bounds pathological pages
+MAX_CONTENT_CHARS = int(os.getenv("FETCH_MAX_CHARS", "100000"))
+HTML_POOL_MIN_BYTES = int(os.getenv("HTML_POOL_MIN_BYTES", str(256 * 1024)))
+HTML_PARSE_WORKERS = int(os.getenv("HTML_PARSE_WORKERS", "2"))
+
+# Non-content tags removed before extraction
+DROP_TAGS = ("script", "style", "nav", "footer", "header", "aside", "iframe", "noscript", "svg", "form")
+TEXT_TAGS = ("p", "h2", "h3", "h4", "h5", "h6")
+MIN_BLOCK_CHARS = 20  # Filter out very short snippets
+
+try:
+    import lxml.html
+    from lxml.etree import ParserError
+    HAVE_LXML = True
+except ImportError:
+    HAVE_LXML = False
+
+
+def _clean(text: str) -> str:
+    return " ".join(text.split())
+
+
+def _finish(blocks: List[str], max_chars: int) -> str:
+    content = "\n".join(line.strip() for block in blocks for line in block.split("\n") if line.strip())
+    return content[:max_chars]
+
+
+def _extract_lxml(html: Union[bytes, str], encoding: Optional[str], max_chars: int) -> str:
+    parser = lxml.html.HTMLParser(encoding=encoding) if encoding and isinstance(html, bytes) else None
+    try:
+        doc = lxml.html.document_fromstring(html, parser=parser)
+    except (ParserError, ValueError):
+        return ""
+    for element in list(doc.iter(*DROP_TAGS)):
+        element.drop_tree()
+
+    main = doc.find(".//article")
+    if main is None:
+        main = doc.find(".//main")
+    if main is None:
+        main = doc.find(".//body")
+    if main is None:
+        return _finish([_clean(doc.text_content())], max_chars)
+
+    blocks: List[str] = []
+    title = doc.find(".//h1")
+    if title is not None:
+        blocks.append(_clean(title.text_content()))
+    total = sum(len(b) for b in blocks)
+    for element in main.iter(*TEXT_TAGS):
+        text = _clean(element.text_content())
+        if len(text) > MIN_BLOCK_CHARS:
+            blocks.append(text)
+            total += len(text)
+            if total >= max_chars:
+                # Early exit: the rest would be truncated away anyway
+                break
+    return _finish(blocks, max_chars)
+
+
+def _extract_bs4(html: Union[bytes, str], encoding: Optional[str], max_chars: int) -> str:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser", from_encoding=encoding if isinstance(html, bytes) else None)
+    for tag in soup(list(DROP_TAGS)):
+        tag.decompose()
+    main = soup.find("article") or soup.find("main") or soup.find("body")
+    if not main:
+        return _finish([soup.get_text(separator="\n", strip=True)], max_chars)
+    blocks: List[str] = []
+    title = soup.find("h1")
+    if title:
+        blocks.append(title.get_text(strip=True))
+    total = sum(len(b) for b in blocks)
+    for element in main.find_all(list(TEXT_TAGS)):
+        text = element.get_text(strip=True)
+        if len(text) > MIN_BLOCK_CHARS:
+            blocks.append(text)
+            total += len(text)
+            if total >= max_chars:
+                break
+    return _finish(blocks, max_chars)
+
+
+def extract_text(html: Union[bytes, str], encoding: Optional[str] = None, max_chars: int = MAX_CONTENT_CHARS) -> str:
+    """Title plus main-content paragraphs/headings, at most ``max_chars`` characters."""
+    if HAVE_LXML:
+        return _extract_lxml(html, encoding, max_chars)
+    return _extract_bs4(html, encoding, max_chars)
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=HTML_PARSE_WORKERS)
+    return _pool
+
+
+async def extract_text_async(
+    html: Union[bytes, str],
+    encoding: Optional[str] = None,
+    max_chars: int = MAX_CONTENT_CHARS,
+) -> str:
+    """``extract_text`` off the event loop: process pool for large documents, thread otherwise."""
+    if HTML_PARSE_WORKERS > 0 and len(html) >= HTML_POOL_MIN_BYTES:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_pool(), extract_text, html, encoding, max_chars)
+    return await asyncio.to_thread(extract_text, html, encoding, max_chars)
+
+
+def close_html_pool() -> None:
+    """Shut down the parse pool (called at app shutdown)."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
@@ -0,0 +1,410 @@
+import asyncio
+import ipaddress
+import logging
+import os
+import random
+import socket
+import time
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Collection, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import httpcore
+import httpx
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+HTTP_TIMEOUT_S = float(os.getenv("HTTP_TIMEOUT_S", "30"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "200"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "100"))
+HTTP_KEEPALIVE_EXPIRY_S = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_S", "60"))
+HTTP_MAX_PER_HOST = int(os.getenv("HTTP_MAX_PER_HOST", "20"))
+HTTP_HTTP2 = os.getenv("HTTP_HTTP2", "1") not in ("0", "false", "False", "")
+HTTP_DNS_TTL_S = float(os.getenv("HTTP_DNS_TTL_S", "300"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+HTTP_RETRY_BACKOFF_S = float(os.getenv("HTTP_RETRY_BACKOFF_S", "0.25"))
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class HostStats:
+    """Per-host request, new-connection and latency counters."""
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.connections = 0
+        self.retries = 0
+        self.errors = 0
+        self.total_latency_s = 0.0
+        self.max_latency_s = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        reused = max(0, self.requests - self.connections)
+        return {
+            "requests": self.requests,
+            "new_connections": self.connections,
+            "reused_requests": reused,
+            "reuse_ratio": round(reused / self.requests, 4) if self.requests else 0.0,
+            "retries": self.retries,
+            "errors": self.errors,
+            "avg_latency_s": round(self.total_latency_s / self.requests, 4) if self.requests else 0.0,
+            "max_latency_s": round(self.max_latency_s, 4),
+        }
+
+
+_host_stats: Dict[str, HostStats] = {}
+
+
+def _stats_for(host: str) -> HostStats:
+    stats = _host_stats.get(host)
+    if stats is None:
+        stats = _host_stats[host] = HostStats()
+    return stats
+
+
+class CachingDNSBackend(httpcore.AsyncNetworkBackend):
+    """Network backend that caches DNS answers and counts new TCP connections.
+
+    TLS still uses the original hostname for SNI and certificate checks, since
+    httpcore passes the origin host to ``start_tls`` separately.
+    """
+
+    def __init__(self, ttl_s: float = HTTP_DNS_TTL_S, inner: Optional[httpcore.AsyncNetworkBackend] = None) -> None:
+        self.ttl_s = ttl_s
+        self._inner = inner or httpcore.AnyIOBackend()
+        self._cache: Dict[Tuple[str, int], Tuple[float, List[str]]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def _resolve(self, host: str, port: int) -> List[str]:
+        try:
+            ipaddress.ip_address(host)
+            return [host]
+        except ValueError:
+            pass
+        key = (host, port)
+        cached = self._cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        self._cache[key] = (time.monotonic() + self.ttl_s, addresses)
+        return addresses
+
+    async def connect_tcp(
+        self,
+        host: str,
+        port: int,
+        timeout: Optional[float] = None,
+        local_address: Optional[str] = None,
+        socket_options: Any = None,
+    ) -> httpcore.AsyncNetworkStream:
+        _stats_for(host).connections += 1
+        addresses = await self._resolve(host, port)
+        last_error: Optional[Exception] = None
+        for address in addresses:
+            try:
+                return await self._inner.connect_tcp(
+                    address, port, timeout=timeout, local_address=local_address, socket_options=socket_options
+                )
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                last_error = e
+        # Every cached address failed: forget them so the next attempt re-resolves
+        self._cache.pop((host, port), None)
+        raise last_error or httpcore.ConnectError(f"No addresses for {host}")
+
+    async def connect_unix_socket(self, path: str, timeout: Optional[float] = None, socket_options: Any = None) -> httpcore.AsyncNetworkStream:
+        return await self._inner.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    async def sleep(self, seconds: float) -> None:
+        await self._inner.sleep(seconds)
+
+
+# httpcore errors as the httpx ones callers (and the retry loop) catch; subclasses first
+_ERROR_MAP: List[Tuple[type, type]] = [
+    (httpcore.ConnectTimeout, httpx.ConnectTimeout),
+    (httpcore.ReadTimeout, httpx.ReadTimeout),
+    (httpcore.WriteTimeout, httpx.WriteTimeout),
+    (httpcore.PoolTimeout, httpx.PoolTimeout),
+    (httpcore.TimeoutException, httpx.TimeoutException),
+    (httpcore.ConnectError, httpx.ConnectError),
+    (httpcore.ReadError, httpx.ReadError),
+    (httpcore.WriteError, httpx.WriteError),
+    (httpcore.NetworkError, httpx.NetworkError),
+    (httpcore.ProxyError, httpx.ProxyError),
+    (httpcore.UnsupportedProtocol, httpx.UnsupportedProtocol),
+    (httpcore.LocalProtocolError, httpx.LocalProtocolError),
+    (httpcore.RemoteProtocolError, httpx.RemoteProtocolError),
+    (httpcore.ProtocolError, httpx.ProtocolError),
+]
+
+
+@contextmanager
+def _httpx_errors() -> Iterator[None]:
+    try:
+        yield
+    except Exception as e:
+        for core_error, httpx_error in _ERROR_MAP:
+            if isinstance(e, core_error):
+                raise httpx_error(str(e)) from e
+        raise
+
+
+class _ResponseStream(httpx.AsyncByteStream):
+    def __init__(self, stream: Any) -> None:
+        self._stream = stream
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        with _httpx_errors():
+            async for part in self._stream:
+                yield part
+
+    async def aclose(self) -> None:
+        if hasattr(self._stream, "aclose"):
+            await self._stream.aclose()
+
+
+class PooledTransport(httpx.AsyncBaseTransport):
+    """httpx transport over an ``httpcore.AsyncConnectionPool`` with our own ``network_backend``.
+
+    ``httpx.AsyncHTTPTransport`` does not take a network backend, so this
+    is the same bridge without its proxy and retry options.
+    """
+
+    def __init__(self, network_backend: httpcore.AsyncNetworkBackend, limits: httpx.Limits, http2: bool = False) -> None:
+        self._pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            http1=True,
+            http2=http2,
+            network_backend=network_backend,
+        )
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        core_request = httpcore.Request(
+            method=request.method,
+            url=httpcore.URL(
+                scheme=request.url.raw_scheme,
+                host=request.url.raw_host,
+                port=request.url.port,
+                target=request.url.raw_path,
+            ),
+            headers=request.headers.raw,
+            content=request.stream,
+            extensions=request.extensions,
+        )
+        with _httpx_errors():
+            response = await self._pool.handle_async_request(core_request)
+        return httpx.Response(
+            status_code=response.status,
+            headers=response.headers,
+            stream=_ResponseStream(response.stream),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self) -> None:
+        await self._pool.aclose()
+
+
+_client: Optional[httpx.AsyncClient] = None
+_http2_enabled = False
+_dns_backend: Optional[CachingDNSBackend] = None
+_host_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+def _http2_available() -> bool:
+    if not HTTP_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        logger.warning("HTTP_HTTP2 enabled but the 'h2' package is missing; using HTTP/1.1")
+        return False
+
+
+def _build_client() -> httpx.AsyncClient:
+    global _dns_backend, _http2_enabled
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_S,
+    )
+    _http2_enabled = _http2_available()
+    _dns_backend = CachingDNSBackend()
+    return httpx.AsyncClient(
+        transport=PooledTransport(_dns_backend, limits, http2=_http2_enabled),
+        timeout=HTTP_TIMEOUT_S,
+        follow_redirects=True,
+        headers=DEFAULT_HEADERS,
+    )
+
+
+async def init_http_client() -> None:
+    """Create the shared outbound client (called at app startup)."""
+    global _client
+    if _client is None:
+        _client = _build_client()
+
+
+async def close_http_client() -> None:
+    """Close the shared outbound client (called at app shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Shared client; created lazily for contexts without app startup (workers, scripts)."""
+    global _client
+    if _client is None:
+        _client = _build_client()
+    return _client
+
+
+def _host_semaphore(host: str) -> asyncio.Semaphore:
+    sem = _host_semaphores.get(host)
+    if sem is None:
+        sem = _host_semaphores[host] = asyncio.Semaphore(HTTP_MAX_PER_HOST)
+    return sem
+
+
+def _backoff_s(attempt: int) -> float:
+    # Full jitter: uniform in [0, base * 2^attempt]
+    return random.uniform(0, HTTP_RETRY_BACKOFF_S * (2 ** attempt))
+
+
+async def request(
+    method: str,
+    url: str,
+    retries: Optional[int] = None,
+    retry_statuses: Collection[int] = RETRY_STATUSES,
+    **kwargs: Any,
+) -> httpx.Response:
+    """Send a request through the shared pool with per-host limits and jittered retries.
+
+    Retries transport errors and ``retry_statuses`` (429/502/503/504 by
+    default); the final response (whatever its status) or error is
+    returned/raised to the caller. Callers behind a rate limiter leave 429
+    out so the limiter sees it.
+    """
+    client = get_http_client()
+    host = httpx.URL(url).host
+    stats = _stats_for(host)
+    attempts = (HTTP_RETRIES if retries is None else retries) + 1
+    for attempt in range(attempts):
+        started = time.perf_counter()
+        try:
+            async with _host_semaphore(host):
+                response = await client.request(method, url, **kwargs)
+        except httpx.TransportError:
+            stats.errors += 1
+            if attempt + 1 >= attempts:
+                raise
+        else:
+            elapsed = time.perf_counter() - started
+            stats.requests += 1
+            stats.total_latency_s += elapsed
+            stats.max_latency_s = max(stats.max_latency_s, elapsed)
+            if response.status_code not in retry_statuses or attempt + 1 >= attempts:
+                return response
+            await response.aclose()
+        stats.retries += 1
+        await asyncio.sleep(_backoff_s(attempt))
+    raise RuntimeError("unreachable")
+
+
+class UnsupportedContentType(Exception):
+    """The server answered with a media type the caller did not accept."""
+
+
+class FetchedBody(NamedTuple):
+    status_code: int
+    headers: httpx.Headers
+    body: bytes
+    charset: Optional[str]
+    truncated: bool
+
+
+async def fetch_body(
+    url: str,
+    max_bytes: int,
+    allowed_types: Optional[Tuple[str, ...]] = None,
+    retries: Optional[int] = None,
+    **kwargs: Any,
+) -> FetchedBody:
+    """Stream a GET response body, stopping after ``max_bytes``.
+
+    The Content-Type is checked before any of the body is read, so a PDF or
+    video is refused without downloading it. A ``304 Not Modified`` answer to
+    a conditional request comes back with an empty body. Retries follow the
+    same rules as ``request``.
+    """
+    client = get_http_client()
+    host = httpx.URL(url).host
+    stats = _stats_for(host)
+    attempts = (HTTP_RETRIES if retries is None else retries) + 1
+    for attempt in range(attempts):
+        started = time.perf_counter()
+        try:
+            async with _host_semaphore(host):
+                async with client.stream("GET", url, **kwargs) as response:
+                    if response.status_code in RETRY_STATUSES and attempt + 1 < attempts:
+                        fetched = None
+                    else:
+                        fetched = await _read_capped(response, max_bytes, allowed_types)
+        except httpx.TransportError:
+            stats.errors += 1
+            if attempt + 1 >= attempts:
+                raise
+        else:
+            elapsed = time.perf_counter() - started
+            stats.requests += 1
+            stats.total_latency_s += elapsed
+            stats.max_latency_s = max(stats.max_latency_s, elapsed)
+            if fetched is not None:
+                return fetched
+        stats.retries += 1
+        await asyncio.sleep(_backoff_s(attempt))
+    raise RuntimeError("unreachable")
+
+
+async def _read_capped(response: httpx.Response, max_bytes: int, allowed_types: Optional[Tuple[str, ...]]) -> FetchedBody:
+    if response.status_code == 304:
+        return FetchedBody(304, response.headers, b"", None, False)
+    response.raise_for_status()
+    media_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+    if allowed_types and media_type and media_type not in allowed_types:
+        raise UnsupportedContentType(f"Unsupported content type: {media_type}")
+    chunks: List[bytes] = []
+    size = 0
+    truncated = False
+    async for chunk in response.aiter_bytes():
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= max_bytes:
+            # Leaving the stream block closes the connection and drops the rest
+            truncated = size > max_bytes
+            break
+    body = b"".join(chunks)[:max_bytes]
+    return FetchedBody(response.status_code, response.headers, body, response.charset_encoding, truncated)
+
+
+def http_stats() -> Dict[str, Any]:
+    return {
+        "http2": _http2_enabled,
+        "dns_cache": {
+            "hits": _dns_backend.hits if _dns_backend else 0,
+            "misses": _dns_backend.misses if _dns_backend else 0,
+        },
+        "hosts": {host: stats.as_dict() for host, stats in _host_stats.items()},
+    }
@@ -0,0 +1,529 @@
+import abc
+import asyncio
+import itertools
+import json
+import logging
+import multiprocessing
+import multiprocessing.util
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from .ws_logger import get_log_pipeline, send_ws_log
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "1000"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# "inprocess" runs jobs on this event loop; "process" runs each job in a worker process
+JOB_WORKER_MODE = os.getenv("JOB_WORKER_MODE", "inprocess").lower()
+JOB_RESULT_TTL_S = float(os.getenv("JOB_RESULT_TTL_S", "3600"))
+# "memory" keeps jobs in this process; "sqlite" shares them between the workers on one host
+JOB_BACKEND = os.getenv("JOB_BACKEND", "memory").lower()
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "data/jobs.sqlite3")
+# How often idle job workers look for jobs submitted through other workers
+JOB_POLL_MS = float(os.getenv("JOB_POLL_MS", "200"))
+
+JOB_PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+class JobBackend(abc.ABC):
+    """Storage + queue interface for jobs; swap in a shared backend to scale out."""
+
+    @abc.abstractmethod
+    async def enqueue(self, job: Dict[str, Any]) -> None:
+        """Store ``job`` and queue it by priority; raise ``QueueFullError`` at capacity."""
+
+    @abc.abstractmethod
+    async def dequeue(self) -> Dict[str, Any]:
+        """Wait for and return the next job to run."""
+
+    @abc.abstractmethod
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """The job, or None if unknown or expired."""
+
+    @abc.abstractmethod
+    async def update(self, job_id: str, **fields: Any) -> None:
+        """Set ``fields`` on a stored job."""
+
+    @abc.abstractmethod
+    async def depth(self) -> int:
+        """Number of queued jobs."""
+
+
+class InMemoryJobBackend(JobBackend):
+    """Bounded priority queue and job table living in this process."""
+
+    def __init__(self, maxsize: int = JOB_QUEUE_MAX, result_ttl_s: float = JOB_RESULT_TTL_S) -> None:
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue(maxsize=maxsize)
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._seq = itertools.count()
+        self.result_ttl_s = result_ttl_s
+
+    async def enqueue(self, job: Dict[str, Any]) -> None:
+        try:
+            # Sequence number keeps FIFO order within a priority
+            self._queue.put_nowait((JOB_PRIORITIES[job["priority"]], next(self._seq), job["id"]))
+        except asyncio.QueueFull:
+            raise QueueFullError(f"Job queue is full ({self._queue.maxsize} jobs)")
+        self._jobs[job["id"]] = job
+        self._prune()
+
+    async def dequeue(self) -> Dict[str, Any]:
+        while True:
+            _, _, job_id = await self._queue.get()
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self._jobs.get(job_id)
+
+    async def update(self, job_id: str, **fields: Any) -> None:
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.update(fields)
+
+    async def depth(self) -> int:
+        return self._queue.qsize()
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.result_ttl_s
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.get("finished_at") and job["finished_at"] < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+class SQLiteJobBackend(JobBackend):
+    """Job queue and table in a SQLite file shared by the workers on one host.
+
+    A job submitted through one worker can be run by any of them and
+    polled through any of them. Claiming is one ``BEGIN IMMEDIATE``
+    transaction, so each job runs exactly once; idle workers poll every
+    ``poll_interval_s`` and are woken at once by jobs submitted locally.
+    A job whose process dies while running it stays ``running``.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        id TEXT NOT NULL UNIQUE,
+        priority INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        finished_at REAL,
+        doc TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS jobs_queued ON jobs (status, priority, seq);
+    """
+
+    def __init__(
+        self,
+        path: str = JOB_DB_PATH,
+        maxsize: int = JOB_QUEUE_MAX,
+        result_ttl_s: float = JOB_RESULT_TTL_S,
+        poll_interval_s: float = JOB_POLL_MS / 1000.0,
+    ) -> None:
+        self.path = path
+        self.maxsize = maxsize
+        self.result_ttl_s = result_ttl_s
+        self.poll_interval_s = poll_interval_s
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._wakeup = asyncio.Event()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(self.SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _write(self, fn: Any) -> Any:
+        # BEGIN IMMEDIATE takes the write lock up front, so workers queue instead of deadlocking
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                value = fn(conn)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            return value
+
+    def _insert(self, job: Dict[str, Any]) -> None:
+        def insert(conn: sqlite3.Connection) -> None:
+            conn.execute("DELETE FROM jobs WHERE finished_at < ?", (time.time() - self.result_ttl_s,))
+            (queued,) = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()
+            if queued >= self.maxsize:
+                raise QueueFullError(f"Job queue is full ({self.maxsize} jobs)")
+            conn.execute(
+                "INSERT INTO jobs (id, priority, status, doc) VALUES (?, ?, ?, ?)",
+                (job["id"], JOB_PRIORITIES[job["priority"]], job["status"], json.dumps(job, default=str)),
+            )
+        self._write(insert)
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        def claim(conn: sqlite3.Connection) -> Optional[Dict[str, Any]]:
+            row = conn.execute(
+                "SELECT seq, doc FROM jobs WHERE status = 'queued' ORDER BY priority, seq LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            # Claimed rows are no longer "queued"; the manager marks them running right after
+            conn.execute("UPDATE jobs SET status = 'claimed' WHERE seq = ?", (row[0],))
+            return json.loads(row[1])
+        return self._write(claim)
+
+    def _select(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connection().execute("SELECT doc FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _update(self, job_id: str, fields: Dict[str, Any]) -> None:
+        def update(conn: sqlite3.Connection) -> None:
+            row = conn.execute("SELECT doc FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            job = {**json.loads(row[0]), **fields}
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, doc = ? WHERE id = ?",
+                (job["status"], job.get("finished_at"), json.dumps(job, default=str), job_id),
+            )
+        self._write(update)
+
+    async def enqueue(self, job: Dict[str, Any]) -> None:
+        await asyncio.to_thread(self._insert, job)
+        self._wakeup.set()
+
+    async def dequeue(self) -> Dict[str, Any]:
+        while True:
+            self._wakeup.clear()
+            job = await asyncio.to_thread(self._claim)
+            if job is not None:
+                return job
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval_s)
+            except asyncio.TimeoutError:
+                pass
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._select, job_id)
+
+    async def update(self, job_id: str, **fields: Any) -> None:
+        await asyncio.to_thread(self._update, job_id, fields)
+
+    def _depth(self) -> int:
+        with self._lock:
+            (queued,) = self._connection().execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()
+        return queued
+
+    async def depth(self) -> int:
+        return await asyncio.to_thread(self._depth)
+
+
+def create_job_backend(kind: str = JOB_BACKEND) -> JobBackend:
+    if kind == "sqlite":
+        return SQLiteJobBackend()
+    return InMemoryJobBackend()
+
+
+# Per-process event loop for JOB_WORKER_MODE=process. Reused across jobs so
+# clients bound to a loop (grpc.aio, httpx pools) survive between jobs.
+_subprocess_loop: Optional[asyncio.AbstractEventLoop] = None
+# WebSocket log frames and ANN vectors a job subprocess hands to its parent
+_subprocess_logs: List[Dict[str, Any]] = []
+_subprocess_vectors: List[Dict[str, Any]] = []
+
+
+async def _collect_log_frame(frame: Dict[str, Any]) -> None:
+    _subprocess_logs.append(frame)
+
+
+async def _collect_vector(message: Dict[str, Any]) -> None:
+    _subprocess_vectors.append(message)
+
+
+async def _open_subprocess_services() -> None:
+    from .ann_index import init_ann_index
+    from .db import init_db
+    from .graph_service import init_graph
+    from .http_client import init_http_client
+    from .outbox import init_outbox
+    from .rollups import init_rollups
+    from .sentiment import init_sentiment
+    from .vector_store import init_vector_store
+    await init_db()
+    await init_rollups()
+    await init_sentiment()
+    await init_http_client()
+    await init_graph()
+    await init_vector_store()
+    # The parent indexes (and relays) the vectors and writes the snapshots
+    await init_ann_index(share=_collect_vector, writer=False)
+    await init_outbox()
+    get_log_pipeline().attach(_collect_log_frame, lambda: True)
+
+
+async def _close_subprocess_services() -> None:
+    from .ann_index import close_ann_index
+    from .db import close_db
+    from .graph_service import close_graph
+    from .http_client import close_http_client
+    from .outbox import close_outbox
+    from .vector_store import close_vector_store
+    await close_outbox()
+    await close_vector_store()
+    await close_ann_index()
+    await close_graph()
+    await close_db()
+    await close_http_client()
+
+
+def _init_job_subprocess() -> None:
+    """``ProcessPoolExecutor`` initializer: open the services the app opens at startup."""
+    global _subprocess_loop
+    _subprocess_loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_subprocess_loop)
+    _subprocess_loop.run_until_complete(_open_subprocess_services())
+    # Flush buffered writes when the pool shuts this process down
+    multiprocessing.util.Finalize(None, _close_job_subprocess, exitpriority=10)
+
+
+def _close_job_subprocess() -> None:
+    _subprocess_loop.run_until_complete(_close_subprocess_services())
+
+
+async def _run_job_here(input_type: str, payload: Dict[str, Any], cache_mode: str) -> Dict[str, Any]:
+    from .llm_agent import run_agent_workflow
+    from .threat_feed import get_threat_feed
+    pipeline = get_log_pipeline()
+    pipeline.start()
+    result, error = None, None
+    try:
+        result = await run_agent_workflow(input_type, payload, cache_mode=cache_mode)
+    except Exception as e:
+        error = str(e)
+    await pipeline.stop()
+    output = {
+        "result": result,
+        "error": error,
+        "logs": list(_subprocess_logs),
+        "vectors": list(_subprocess_vectors),
+        "threat_buckets": get_threat_feed().take_buckets(),
+    }
+    _subprocess_logs.clear()
+    _subprocess_vectors.clear()
+    return output
+
+
+def _run_job_in_subprocess(input_type: str, payload: Dict[str, Any], cache_mode: str) -> Dict[str, Any]:
+    return _subprocess_loop.run_until_complete(_run_job_here(input_type, payload, cache_mode))
+
+
+async def _adopt_subprocess_output(output: Dict[str, Any]) -> None:
+    """Publish the logs, threat observations and vectors of a job that ran in a subprocess."""
+    from .ann_index import adopt_shared
+    from .threat_feed import get_threat_feed
+    get_threat_feed().merge(output["threat_buckets"])
+    for message in output["vectors"]:
+        await adopt_shared(message)
+    if not output["logs"]:
+        return
+    try:
+        # Lazy import to avoid circular dependency
+        from app.main import get_ws_manager
+        for frame in output["logs"]:
+            await get_ws_manager().broadcast(frame)
+    except Exception:
+        pass
+
+
+class JobManager:
+    """Accepts analysis jobs and drains them with a pool of workers.
+
+    ``submit`` returns immediately (or raises ``QueueFullError`` for
+    backpressure); results are polled via ``get`` and pushed to WebSocket
+    clients as ``job_result`` messages.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[JobBackend] = None,
+        workers: int = JOB_WORKERS,
+        mode: str = JOB_WORKER_MODE,
+    ) -> None:
+        self.backend = backend or create_job_backend()
+        self.workers = workers
+        self.mode = mode
+        self._tasks: List[asyncio.Task] = []
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.submitted = 0
+        self.rejected = 0
+        self.started = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.running = 0
+        self.total_wait_s = 0.0
+        self.max_wait_s = 0.0
+        self.total_run_s = 0.0
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        if self.mode == "process":
+            # Spawned, not forked: a fork would inherit this process's running services
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_job_subprocess,
+            )
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info("Started %s job workers (%s)", self.workers, self.mode)
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def submit(
+        self,
+        input_type: str,
+        payload: Dict[str, Any],
+        priority: str = "normal",
+        cache_mode: str = "default",
+    ) -> Dict[str, Any]:
+        job = {
+            "id": uuid.uuid4().hex,
+            "status": "queued",
+            "priority": priority,
+            "input_type": input_type,
+            "payload": payload,
+            "cache_mode": cache_mode,
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        }
+        try:
+            await self.backend.enqueue(job)
+        except QueueFullError:
+            self.rejected += 1
+            raise
+        self.submitted += 1
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self.backend.get(job_id)
+
+    async def _execute(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        if self._pool is not None:
+            loop = asyncio.get_running_loop()
+            output = await loop.run_in_executor(
+                self._pool, _run_job_in_subprocess, job["input_type"], job["payload"], job["cache_mode"]
+            )
+            await _adopt_subprocess_output(output)
+            if output["error"] is not None:
+                raise RuntimeError(output["error"])
+            return output["result"]
+        from .llm_agent import run_agent_workflow
+        return await run_agent_workflow(job["input_type"], job["payload"], cache_mode=job["cache_mode"])
+
+    async def _worker(self, worker_id: int) -> None:
+        while True:
+            job = await self.backend.dequeue()
+            started = time.time()
+            wait_s = started - job["submitted_at"]
+            self.started += 1
+            self.total_wait_s += wait_s
+            self.max_wait_s = max(self.max_wait_s, wait_s)
+            self.running += 1
+            await self.backend.update(job["id"], status="running", started_at=started)
+            try:
+                result = await self._execute(job)
+                self.completed += 1
+                await self.backend.update(job["id"], status="completed", result=result, finished_at=time.time())
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                await self.backend.update(job["id"], status="cancelled", finished_at=time.time())
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.error("❌ [JOBS] Job %s failed on worker %s: %s", job['id'], worker_id, e)
+                await self.backend.update(job["id"], status="failed", error=str(e), finished_at=time.time())
+            finally:
+                self.running -= 1
+                self.total_run_s += time.time() - started
+            await self._publish(job["id"])
+
+    async def _publish(self, job_id: str) -> None:
+        job = await self.backend.get(job_id)
+        if job is None:
+            return
+        try:
+            # Lazy import to avoid circular dependency
+            from app.main import get_ws_manager
+            await get_ws_manager().broadcast({"type": "job_result", "payload": public_job_view(job)})
+        except Exception:
+            pass
+        await send_ws_log("INFO", "Job finished", {"job_id": job_id, "status": job["status"]})
+
+    async def stats(self) -> Dict[str, Any]:
+        # Waits are recorded when a job starts, run times when it finishes
+        finished = self.completed + self.failed + self.cancelled
+        return {
+            "backend": type(self.backend).__name__,
+            "mode": self.mode,
+            "workers": self.workers,
+            "queue_depth": await self.backend.depth(),
+            "queue_max": JOB_QUEUE_MAX,
+            "running": self.running,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "avg_wait_s": round(self.total_wait_s / self.started, 4) if self.started else 0.0,
+            "max_wait_s": round(self.max_wait_s, 4),
+            "avg_run_s": round(self.total_run_s / finished, 4) if finished else 0.0,
+        }
+
+
+def public_job_view(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Job fields safe to return to clients (drops the raw payload)."""
+    view = {k: job[k] for k in ("id", "status", "priority", "input_type", "submitted_at", "started_at", "finished_at")}
+    if job["status"] == "completed":
+        view["result"] = job["result"]
+    elif job["status"] == "failed":
+        view["error"] = job["error"]
+    return view
+
+
+job_manager = JobManager()
+
+
+def get_job_manager() -> JobManager:
+    return job_manager
@@ -0,0 +1,55 @@
+import fcntl
+import logging
+import os
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Lock files electing one worker per host for singleton duties (threat alerts, ANN snapshots)
+LEADER_LOCK_DIR = os.getenv("LEADER_LOCK_DIR", "data/locks")
+
+
+class LeaderLease:
+    """Host-wide leadership for one ``role``: an exclusive ``flock`` on ``<directory>/<role>.lock``.
+
+    ``try_acquire`` never blocks; the holder keeps the lock until it
+    releases it or exits (the kernel drops it with the process), after
+    which the next worker to try takes over.
+    """
+
+    def __init__(self, role: str, directory: str = LEADER_LOCK_DIR) -> None:
+        self.role = role
+        self.path = os.path.join(directory, f"{role}.lock")
+        self._fd: Optional[int] = None
+        self.acquired = 0
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        self.acquired += 1
+        logger.info("This worker (pid %s) now leads %s", os.getpid(), self.role)
+        return True
+
+    def release(self) -> None:
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"role": self.role, "held": self.held, "acquired": self.acquired}
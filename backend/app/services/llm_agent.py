@@ -1,117 +1,239 @@
 import asyncio
+import logging
 import os
-from typing import Any, Dict, List
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
-import httpx
-import google.generativeai as genai
-
-from .vector_store import upsert_embeddings, embed_texts
+from .vector_store import Embeddings, upsert_embeddings, embed_texts, local_embeddings, shareable, vector_records
 from .graph_service import write_entities_and_relationships
-from .db import create_analysis_record
+from .db import create_analysis_record, find_analysis_record, new_record_id
+from .cache import is_cacheable_result, make_cache_key, verdict_cache
+from .llm_client import generation_client
+from .ann_index import find_near_duplicate, recent_analysis, remember
+from .threat_feed import threat_feed
+from .metrics import metrics
+from .progress import PROGRESS_PREVIEW_CHARS, emit, streaming
+from .outbox import outbox
+from .rollups import rollup_event, write_rollups
+from .chunking import CHUNK_CONCURRENCY, Chunk, document_vector, reduce_analyses, select_chunks, split_chunks
+from .sentiment import sentiment_batcher
+from .http_client import RETRY_STATUSES, request as http_request
+from .rate_limit import AdaptiveLimiter, RateLimited, retry_after_seconds
+from .stage_dag import STATUS_KEY, Stage, StageGraph, request_deadline, reset_deadline, set_deadline, time_left
+from .fetch_cache import fetch_cache
 from .ws_logger import send_ws_log
 from dotenv import load_dotenv
 load_dotenv()
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
+logger = logging.getLogger(__name__)
+
+# Ask the remote HF model when the local sentiment model finds no sentiment-bearing words
+# (e.g. non-English text); off by default, the local model answers everything
+SENTIMENT_REMOTE_FALLBACK = os.getenv("SENTIMENT_REMOTE_FALLBACK", "0") not in ("0", "false", "False", "")
 HF_SENTIMENT_URL = os.getenv(
     "HF_SENTIMENT_URL",
     "https://api-inference.huggingface.co/models/cardiffnlp/twitter-roberta-base-sentiment",
 )
 
-# Configure Gemini
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+# Quota of the sentiment endpoint (0 = no token bucket) and its AIMD limiter bounds
+HF_SENTIMENT_RATE_PER_S = float(os.getenv("HF_SENTIMENT_RATE_PER_S", "0"))
+HF_SENTIMENT_BURST = float(os.getenv("HF_SENTIMENT_BURST", "0"))
+HF_SENTIMENT_MAX_CONCURRENCY = int(os.getenv("HF_SENTIMENT_MAX_CONCURRENCY", "16"))
+HF_SENTIMENT_LATENCY_TARGET_S = float(os.getenv("HF_SENTIMENT_LATENCY_TARGET_S", "5"))
+HF_SENTIMENT_QUEUE_TIMEOUT_S = float(os.getenv("HF_SENTIMENT_QUEUE_TIMEOUT_S", "10"))
+# Time budget of one workflow run; stages still pending at the deadline fall back to defaults
+WORKFLOW_DEADLINE_S = float(os.getenv("WORKFLOW_DEADLINE_S", "45"))
+# Characters of a document handed to the knowledge graph (entity extraction and the Document node)
+GRAPH_TEXT_MAX_CHARS = int(os.getenv("GRAPH_TEXT_MAX_CHARS", "50000"))
+# Time kept back from the request deadline to merge the chunk analyses that did finish
+CHUNK_REDUCE_RESERVE_S = 0.25
+
+# Prefix of the text returned by fetch_url_content when the fetch fails
+FETCH_ERROR_PREFIX = "Failed to fetch URL content:"
 
 
 async def fetch_url_content(url: str) -> str:
     """Fetch and extract text content from a URL."""
     await send_ws_log("INFO", "Starting URL fetch", {"url": url})
-    print(f"\n🌐 [URL FETCH] Starting to fetch: {url}")
+    logger.info("🌐 [URL FETCH] Starting to fetch: %s", url)
     try:
-        from bs4 import BeautifulSoup
+        await send_ws_log("DEBUG", "Making HTTP request", {"url": url})
+        logger.debug("📡 [URL FETCH] Making HTTP request...")
+        # Conditional, streamed fetch behind the page cache (see services.fetch_cache)
+        with metrics.span("fetch", "dependency"):
+            final_content, cache_status = await fetch_cache.fetch(url)
+        await send_ws_log("DEBUG", "Got page content", {"cache": cache_status})
+        logger.info("✅ [URL FETCH] Page content ready (cache: %s)", cache_status)
+
+        await send_ws_log("INFO", "Extracted text content", {"chars": len(final_content)})
+        logger.info("✅ [URL FETCH] Extracted %s chars of text content", len(final_content))
+        return final_content
         
-        async with httpx.AsyncClient(
-            timeout=30, 
-            follow_redirects=True,
-            headers={
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-        ) as client:
-            await send_ws_log("DEBUG", "Making HTTP request", {"url": url})
-            print(f"📡 [URL FETCH] Making HTTP request...")
-            response = await client.get(url)
-            response.raise_for_status()
-            await send_ws_log("DEBUG", "Got HTTP response", {"status_code": response.status_code, "size": len(response.text)})
-            print(f"✅ [URL FETCH] Got response: {response.status_code}, size: {len(response.text)} chars")
-            
-            # Extract text using BeautifulSoup
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Remove script, style, and other non-content tags
-            for tag in soup(['script', 'style', 'nav', 'footer', 'header', 'aside', 'iframe']):
-                tag.decompose()
-            
-            # Try to find main content area first
-            main_content = soup.find('article') or soup.find('main') or soup.find('body')
-            
-            if main_content:
-                # Extract text from paragraphs and headings
-                text_elements = []
-                
-                # Get title
-                title = soup.find('h1')
-                if title:
-                    text_elements.append(title.get_text(strip=True))
-                
-                # Get all paragraphs and headings from main content
-                for element in main_content.find_all(['p', 'h2', 'h3', 'h4', 'h5', 'h6']):
-                    text = element.get_text(strip=True)
-                    if len(text) > 20:  # Filter out very short snippets
-                        text_elements.append(text)
-                
-                content = '\n\n'.join(text_elements)
-            else:
-                content = soup.get_text(separator='\n', strip=True)
-            
-            # Clean up extra whitespace
-            content = '\n'.join(line.strip() for line in content.split('\n') if line.strip())
-            
-            # Limit to first 8000 characters for analysis
-            final_content = content[:8000] if len(content) > 8000 else content
-            await send_ws_log("INFO", "Extracted text content", {"chars": len(final_content)})
-            print(f"✅ [URL FETCH] Extracted {len(final_content)} chars of text content")
-            return final_content
-            
     except Exception as e:
         await send_ws_log("ERROR", "URL fetch failed", {"error": str(e)})
-        print(f"❌ [URL FETCH] Error: {str(e)}")
-        return f"Failed to fetch URL content: {str(e)}"
+        logger.error("❌ [URL FETCH] Error: %s", e)
+        return f"{FETCH_ERROR_PREFIX} {str(e)}"
+
+
+# Header -> section of the structured Gemini response
+GEMINI_SECTIONS = {
+    "VERDICT:": "verdict",
+    "CONFIDENCE:": "confidence",
+    "SUMMARY:": "summary",
+    "REASONING:": "reasoning",
+    "EVIDENCE_SOURCES:": "evidence",
+}
+# Sections streamed token by token; the others are emitted once their line is complete
+STREAMED_SECTIONS = ("summary", "reasoning")
+
+
+class GeminiResponseParser:
+    """Incremental parser for the VERDICT/CONFIDENCE/SUMMARY/REASONING/EVIDENCE_SOURCES format.
+
+    ``feed`` takes response chunks as they arrive and returns
+    ``{"section", "text"}`` deltas: SUMMARY and REASONING text as soon as it
+    is known not to be the start of another header, VERDICT, CONFIDENCE and
+    each evidence source once their line is complete. Concatenating a
+    section's deltas gives its text; a delta with ``"start": True`` begins
+    the section anew (the model repeated its header). The parsed fields
+    (``result()``) are identical whether the response arrived in one piece
+    or in many.
+    """
+
+    def __init__(self) -> None:
+        self.chunks: List[str] = []
+        self.verdict = "Uncertain"
+        self.confidence = 0.5
+        self.summary = ""
+        self.reasoning = ""
+        self.evidence_sources: List[str] = []
+        self._section: Optional[str] = None
+        self._line = ""
+        self._streamed = 0
+
+    @property
+    def text(self) -> str:
+        return "".join(self.chunks)
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        self.chunks.append(chunk)
+        self._line += chunk
+        deltas: List[Dict[str, Any]] = []
+        while "\n" in self._line:
+            line, self._line = self._line.split("\n", 1)
+            deltas += self._complete_line(line)
+        deltas += self._stream_partial(self._line, complete=False)
+        return deltas
+
+    def close(self) -> List[Dict[str, Any]]:
+        """Flush the last (unterminated) line."""
+        line, self._line = self._line, ""
+        return self._complete_line(line) if line else []
+
+    def _stream_partial(self, line: str, complete: bool) -> List[Dict[str, Any]]:
+        # Trailing whitespace is held back until more text follows on the line
+        stripped = line.strip()
+        if not stripped:
+            return []
+        header = next((h for h in GEMINI_SECTIONS if stripped.startswith(h)), None)
+        if header is None and not complete and any(h.startswith(stripped) for h in GEMINI_SECTIONS):
+            return []  # may still turn into a header
+        if header is not None:
+            section, body, separator = GEMINI_SECTIONS[header], stripped[len(header):].lstrip(), ""
+        else:
+            section, body = self._section, stripped
+            separator = " " if section in STREAMED_SECTIONS and getattr(self, section) else ""
+        if section not in STREAMED_SECTIONS or len(body) <= self._streamed:
+            return []
+        delta: Dict[str, Any] = {"section": section, "text": body[self._streamed:]}
+        if self._streamed == 0:
+            delta["text"] = separator + delta["text"]
+            if header is not None:
+                delta["start"] = True
+        self._streamed = len(body)
+        return [delta]
+
+    def _complete_line(self, line: str) -> List[Dict[str, Any]]:
+        deltas = self._stream_partial(line, complete=True)
+        self._streamed = 0
+        line = line.strip()
+        if line.startswith('VERDICT:'):
+            self.verdict = line.replace('VERDICT:', '').strip()
+            deltas.append({"section": "verdict", "text": self.verdict})
+        elif line.startswith('CONFIDENCE:'):
+            try:
+                self.confidence = float(line.replace('CONFIDENCE:', '').strip())
+            except Exception:
+                self.confidence = 0.5
+            deltas.append({"section": "confidence", "text": self.confidence})
+        elif line.startswith('SUMMARY:'):
+            self._section = 'summary'
+            self.summary = line.replace('SUMMARY:', '').strip()
+        elif line.startswith('REASONING:'):
+            self._section = 'reasoning'
+            self.reasoning = line.replace('REASONING:', '').strip()
+        elif line.startswith('EVIDENCE_SOURCES:'):
+            self._section = 'evidence'
+        elif line and self._section == 'summary':
+            self.summary += ' ' + line
+        elif line and self._section == 'reasoning':
+            self.reasoning += ' ' + line
+        elif line and self._section == 'evidence':
+            self.evidence_sources.append(line.lstrip('-*• '))
+            deltas.append({"section": "evidence", "text": self.evidence_sources[-1]})
+        return deltas
+
+    def result(self) -> Dict[str, Any]:
+        return {
+            "summary": self.summary.strip() or self.text[:200],
+            "verdict": self.verdict,
+            "confidence": self.confidence,
+            "reasoning": self.reasoning.strip() or "Analysis completed",
+            "evidence_sources": self.evidence_sources[:4] if self.evidence_sources else ["factcheck.org", "snopes.com", "politifact.com"],
+        }
 
 
-async def call_gemini_analyze(text: str, source_url: str = None) -> Dict[str, Any]:
-    """Real Gemini API integration for misinformation detection and credibility analysis."""
+def emit_gemini_deltas(deltas: List[Dict[str, Any]]) -> None:
+    for delta in deltas:
+        emit("gemini", delta)
+
+
+def unknown_analysis(summary: str, reasoning: str) -> Dict[str, Any]:
+    """Analysis placeholder when Gemini could not produce one (never cached)."""
+    return {
+        "summary": summary,
+        "verdict": "Unknown",
+        "confidence": 0.0,
+        "reasoning": reasoning,
+        "evidence_sources": [],
+    }
+
+
+async def call_gemini_analyze(text: str, source_url: str = None, part: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
+    """Real Gemini API integration for misinformation detection and credibility analysis.
+
+    ``part`` is ``(number, total)`` when ``text`` is one chunk of a longer
+    document; such calls run side by side, so they are not streamed.
+    """
     await send_ws_log("INFO", "Starting Gemini analysis", {"text_chars": len(text)})
-    print(f"\n🤖 [GEMINI] Starting AI analysis (text length: {len(text)} chars)...")
+    logger.info("🤖 [GEMINI] Starting AI analysis (text length: %s chars)...", len(text))
 
-    if not GEMINI_API_KEY:
+    if not generation_client.configured:
         await send_ws_log("ERROR", "Gemini API key not configured")
-        print("❌ [GEMINI] API key not configured!")
-        return {
-            "summary": "Gemini API not configured. Cannot analyze content.",
-            "verdict": "Unknown",
-            "confidence": 0.0,
-            "reasoning": "API key missing",
-            "evidence_sources": [],
-        }
+        logger.error("❌ [GEMINI] API key not configured!")
+        return unknown_analysis("Gemini API not configured. Cannot analyze content.", "API key missing")
 
     try:
-        await send_ws_log("DEBUG", "Invoking Gemini model")
-        print(f"🔑 [GEMINI] API key found, creating model...")
-        model = genai.GenerativeModel('gemini-2.5-flash')
+        await send_ws_log("DEBUG", "Invoking Gemini model", {"provider": generation_client.provider.name})
+        logger.debug("🔑 [GEMINI] Provider configured (%s)...", generation_client.provider.name)
 
         source_info = f"\n\nSource URL: {source_url}" if source_url else ""
+        part_info = (
+            f"\n\nThis is part {part[0]} of {part[1]} of a longer document, split on paragraph boundaries. "
+            "Judge the claims made in this part."
+        ) if part else ""
 
-        prompt = f"""You are an expert misinformation detection AI. Analyze the following content for credibility, bias, and potential misinformation.
+        prompt = f"""You are an expert misinformation detection AI. Analyze the following content for credibility, bias, and potential misinformation.{part_info}
 
 Content to analyze:
 {text}
@@ -137,191 +259,528 @@ EVIDENCE_SOURCES: [List 2-4 suggested reputable sources to verify these claims,
 Keep your response factual, objective, and actionable."""
 
         await send_ws_log("DEBUG", "Sending prompt to Gemini AI", {"prompt_length": len(prompt)})
-        print(f"📤 [GEMINI] Sending prompt to Gemini AI...")
-
-        response = model.generate_content(prompt)
-        text_response = response.text
+        logger.debug("📤 [GEMINI] Sending prompt to Gemini AI...")
+
+        # Non-blocking: rate-limited, timed-out async call. Streaming requests
+        # get the response token by token, parsed into sections on the fly.
+        parser = GeminiResponseParser()
+        if streaming() and part is None:
+            text_response = await generation_client.generate(prompt, on_chunk=lambda chunk: emit_gemini_deltas(parser.feed(chunk)))
+            emit_gemini_deltas(parser.close())
+        else:
+            text_response = await generation_client.generate(prompt)
+            parser.feed(text_response)
+            parser.close()
 
         await send_ws_log("INFO", "Received Gemini response", {"chars": len(text_response)})
-        print(f"✅ [GEMINI] Got response from AI ({len(text_response)} chars)")
-        await send_ws_log("DEBUG", "Parsing Gemini response")
-        print(f"📝 [GEMINI] Parsing structured response...")
-
-        # Parse the structured response
-        verdict = "Uncertain"
-        confidence = 0.5
-        summary = ""
-        reasoning = ""
-        evidence_sources = []
-
-        lines = text_response.split('\n')
-        current_section = None
-
-        for line in lines:
-            line = line.strip()
-            if line.startswith('VERDICT:'):
-                verdict = line.replace('VERDICT:', '').strip()
-            elif line.startswith('CONFIDENCE:'):
-                try:
-                    confidence = float(line.replace('CONFIDENCE:', '').strip())
-                except Exception:
-                    confidence = 0.5
-            elif line.startswith('SUMMARY:'):
-                current_section = 'summary'
-                summary = line.replace('SUMMARY:', '').strip()
-            elif line.startswith('REASONING:'):
-                current_section = 'reasoning'
-                reasoning = line.replace('REASONING:', '').strip()
-            elif line.startswith('EVIDENCE_SOURCES:'):
-                current_section = 'evidence'
-            elif line and current_section == 'summary' and not any(line.startswith(x) for x in ['VERDICT:', 'CONFIDENCE:', 'REASONING:', 'EVIDENCE_SOURCES:']):
-                summary += ' ' + line
-            elif line and current_section == 'reasoning' and not any(line.startswith(x) for x in ['VERDICT:', 'CONFIDENCE:', 'SUMMARY:', 'EVIDENCE_SOURCES:']):
-                reasoning += ' ' + line
-            elif line and current_section == 'evidence' and (line.startswith(('-', '*', '•')) or (line and not line.startswith(('VERDICT:', 'CONFIDENCE:', 'SUMMARY:', 'REASONING:')))):
-                evidence_sources.append(line.lstrip('-*• '))
-
-        result = {
-            "summary": summary.strip() or text_response[:200],
-            "verdict": verdict,
-            "confidence": confidence,
-            "reasoning": reasoning.strip() or "Analysis completed",
-            "evidence_sources": evidence_sources[:4] if evidence_sources else ["factcheck.org", "snopes.com", "politifact.com"],
-        }
+        logger.info("✅ [GEMINI] Got response from AI (%s chars)", len(text_response))
+
+        result = parser.result()
+        verdict, confidence = result["verdict"], result["confidence"]
 
         await send_ws_log("INFO", "Gemini analysis complete", {"verdict": verdict, "confidence": confidence})
-        print(f"✅ [GEMINI] Analysis complete - Verdict: {verdict}, Confidence: {confidence}")
+        logger.info("✅ [GEMINI] Analysis complete - Verdict: %s, Confidence: %s", verdict, confidence)
         return result
 
     except Exception as e:
         await send_ws_log("ERROR", "Gemini analysis error", {"error": str(e)})
-        print(f"❌ [GEMINI] Error during analysis: {str(e)}")
-        return {
-            "summary": f"Analysis error: {str(e)}",
-            "verdict": "Unknown",
-            "confidence": 0.0,
-            "reasoning": "Failed to complete analysis",
-            "evidence_sources": [],
-        }
+        logger.error("❌ [GEMINI] Error during analysis: %s", e)
+        return unknown_analysis(f"Analysis error: {str(e)}", "Failed to complete analysis")
+
+
+async def analyze_document(text: str, source_url: Optional[str], chunks: List[Chunk]) -> Dict[str, Any]:
+    """Gemini analysis of a whole document: one call, or map-reduce over its chunks.
+
+    Long documents are analyzed chunk by chunk, concurrently, within the
+    token budget (see ``services.chunking``); the per-chunk verdicts are
+    merged by ``reduce_analyses``. If the request deadline comes first,
+    the chunks that finished are merged and the rest marked ``timeout``.
+    """
+    if len(chunks) == 1:
+        return await call_gemini_analyze(text, source_url)
+
+    selected = select_chunks(chunks)
+    emit("chunks", {"count": len(chunks), "analyzed": [chunk.index for chunk in selected], "tokens": sum(chunk.tokens for chunk in chunks)})
+    await send_ws_log("INFO", "Analyzing document in chunks", {"chunks": len(chunks), "analyzed": len(selected)})
+    logger.info("🧩 [GEMINI] Analyzing %s of %s chunks (%s chars)", len(selected), len(chunks), len(text))
+    semaphore = asyncio.Semaphore(CHUNK_CONCURRENCY)
+
+    async def analyze_chunk(chunk: Chunk) -> Dict[str, Any]:
+        async with semaphore:
+            analysis = await call_gemini_analyze(chunk.text, source_url, part=(chunk.index + 1, len(chunks)))
+        emit("chunk", {"index": chunk.index, "verdict": analysis.get("verdict"), "confidence": analysis.get("confidence")})
+        return analysis
+
+    tasks = {chunk.index: asyncio.create_task(analyze_chunk(chunk)) for chunk in selected}
+    remaining = time_left(float("inf"))
+    try:
+        done, _ = await asyncio.wait(
+            tasks.values(), timeout=None if remaining == float("inf") else max(0.0, remaining - CHUNK_REDUCE_RESERVE_S),
+        )
+    finally:
+        for task in tasks.values():
+            task.cancel()
+    analyses = {index: task.result() for index, task in tasks.items() if task in done}
+    statuses = {
+        index: "timeout" if index not in analyses else "failed" if analyses[index].get("verdict") == "Unknown" else "analyzed"
+        for index in tasks
+    }
+    return reduce_analyses(chunks, analyses, statuses)
+
+
+hf_limiter = AdaptiveLimiter(
+    "hf_sentiment",
+    rate_per_s=HF_SENTIMENT_RATE_PER_S,
+    burst=HF_SENTIMENT_BURST,
+    max_concurrency=HF_SENTIMENT_MAX_CONCURRENCY,
+    latency_target_s=HF_SENTIMENT_LATENCY_TARGET_S,
+    queue_timeout_s=HF_SENTIMENT_QUEUE_TIMEOUT_S,
+)
+
+
+async def _post_sentiment(text: str, headers: Dict[str, str]) -> Any:
+    # 429s go back to the limiter (which backs off and retries) instead of the HTTP retry loop
+    res = await http_request(
+        "POST", HF_SENTIMENT_URL, headers=headers, json={"inputs": text}, timeout=time_left(20),
+        retry_statuses=RETRY_STATUSES - {429},
+    )
+    if res.status_code == 429:
+        raise RateLimited("HF inference API quota exceeded", retry_after_seconds(res.headers.get("retry-after")))
+    res.raise_for_status()
+    return res.json()
+
+
+async def analyze_sentiment(text: str) -> Dict[str, Any]:
+    """Sentiment of the whole text (and each paragraph) from the in-process model.
+
+    Concurrent calls are scored together (see ``services.sentiment``). The
+    remote HF model is only asked when ``SENTIMENT_REMOTE_FALLBACK`` is set
+    and the local model found nothing to go on.
+    """
+    with metrics.span("sentiment_model", "dependency"):
+        sentiment = await sentiment_batcher.analyze(text)
+    if sentiment["evidence"] == 0 and SENTIMENT_REMOTE_FALLBACK:
+        return await call_hf_sentiment(text[:512])  # Limit for the remote model
+    logger.debug("💭 [SENTIMENT] %s (compound %s, %s words of evidence)", sentiment_label(sentiment), sentiment["compound"], sentiment["evidence"])
+    emit("sentiment", {"label": sentiment_label(sentiment), "raw": sentiment["raw"], "compound": sentiment["compound"]})
+    return sentiment
 
 
 async def call_hf_sentiment(text: str) -> Dict[str, Any]:
     await send_ws_log("INFO", "Starting sentiment analysis", {"text_chars": len(text)})
-    print(f"\n💭 [SENTIMENT] Analyzing sentiment (text length: {len(text)} chars)...")
+    logger.info("💭 [SENTIMENT] Analyzing sentiment (text length: %s chars)...", len(text))
     headers = {"Authorization": f"Bearer {os.getenv('HUGGINGFACEHUB_API_TOKEN', '')}"}
     try:
-        async with httpx.AsyncClient(timeout=20) as client:
-            res = await client.post(HF_SENTIMENT_URL, headers=headers, json={"inputs": text})
-            res.raise_for_status()
-            data = res.json()
-            await send_ws_log("INFO", "Sentiment analysis result", {"result_preview": str(data)[:200]})
-            print(f"✅ [SENTIMENT] Got sentiment result: {data}")
-            return {"raw": data}
+        with metrics.span("hf_sentiment", "dependency"):
+            deadline = time.monotonic() + hf_limiter.queue_timeout_s
+            if request_deadline() is not None:
+                deadline = min(deadline, request_deadline())
+            data = await hf_limiter.run(lambda: _post_sentiment(text, headers), deadline=deadline)
+        await send_ws_log("INFO", "Sentiment analysis result", {"result_preview": str(data)[:200]})
+        logger.info("✅ [SENTIMENT] Got sentiment result: %s", data)
+        sentiment = {"raw": data, "model": "hf"}
+        emit("sentiment", {"label": sentiment_label(sentiment), "raw": data})
+        return sentiment
     except Exception as e:
         await send_ws_log("WARN", "Sentiment analysis failed", {"error": str(e)})
-        print(f"⚠️ [SENTIMENT] Using default sentiment due to error: {str(e)}")
-        return {"raw": [{"label": "NEUTRAL", "score": 0.5}]}
+        return default_sentiment(e)
 
 
-async def run_agent_workflow(input_type: str, payload: Dict[str, Any]) -> Dict[str, Any]:
-    """Implements the Scout → Verify → Synthesize → Respond workflow for misinformation detection.
+def default_sentiment(reason: Any) -> Dict[str, Any]:
+    """Neutral sentiment used when the real one failed or was not waited for."""
+    logger.warning("⚠️ [SENTIMENT] Using default sentiment: %s", reason)
+    sentiment = {"raw": [{"label": "NEUTRAL", "score": 0.5}]}
+    emit("sentiment", {"label": sentiment_label(sentiment), "raw": sentiment["raw"], "fallback": True})
+    return sentiment
 
-    - Scout: parse input, extract/fetch text content
-    - Verify: run sentiment analysis, generate embeddings, store in vector DB and graph
-    - Synthesize: deep analysis with Gemini for credibility assessment
-    - Respond: return structured verification result with evidence
-    """
-    import time
-    start_time = time.time()
-    await send_ws_log("INFO", "Workflow started", {"type": input_type})
-    print(f"\n{'='*80}")
-    print(f"🚀 [WORKFLOW] Starting agent workflow - Type: {input_type}")
-    print(f"{'='*80}")
 
-    # Scout: Extract or fetch content
+# cardiffnlp/twitter-roberta-base-sentiment reports generic label ids
+_SENTIMENT_LABELS = {"label_0": "negative", "label_1": "neutral", "label_2": "positive"}
+
+
+def sentiment_label(sentiment: Dict[str, Any]) -> Optional[str]:
+    """Top label of an ``analyze_sentiment`` result as negative/neutral/positive."""
+    scores = sentiment.get("raw")
+    # The inference API nests per-input lists: [[{label, score}, ...]]
+    while isinstance(scores, list) and scores and isinstance(scores[0], list):
+        scores = scores[0]
+    if not isinstance(scores, list) or not scores:
+        return None
+    try:
+        top = max(scores, key=lambda s: s.get("score", 0))
+    except (AttributeError, TypeError):
+        return None
+    label = str(top.get("label", "")).lower()
+    label = _SENTIMENT_LABELS.get(label, label)
+    for name in ("negative", "neutral", "positive"):
+        if label and name.startswith(label[:3]):
+            return name
+    return None
+
+
+async def scout_content(input_type: str, payload: Dict[str, Any]) -> Tuple[str, Optional[str]]:
+    """Scout: parse input and extract/fetch its text content.
+
+    Returns ``(text, source_url)``; ``source_url`` is only set for URL inputs.
+    """
     await send_ws_log("DEBUG", "SCOUT - Extracting content")
-    print(f"\n📍 [STEP 1/5] SCOUT - Extracting content...")
+    logger.debug("📍 [STEP 1/5] SCOUT - Extracting content...")
     text = ""
     source_url = None
     
     if input_type == "url":
         source_url = payload.get("url", "")
-        print(f"🔗 [SCOUT] URL provided: {source_url}")
+        logger.debug("🔗 [SCOUT] URL provided: %s", source_url)
         await send_ws_log("DEBUG", "SCOUT - fetching URL", {"url": source_url})
         text = await fetch_url_content(source_url)
     elif input_type == "text":
         text = str(payload.get("text", "")).strip() or "No text provided"
-        print(f"📝 [SCOUT] Text provided ({len(text)} chars)")
+        logger.debug("📝 [SCOUT] Text provided (%s chars)", len(text))
     elif input_type == "image":
         text = "Image analysis not yet implemented"
-        print(f"🖼️ [SCOUT] Image analysis requested (not implemented yet)")
+        logger.info("🖼️ [SCOUT] Image analysis requested (not implemented yet)")
     elif input_type == "video":
         text = "Video analysis not yet implemented"
-        print(f"🎥 [SCOUT] Video analysis requested (not implemented yet)")
+        logger.info("🎥 [SCOUT] Video analysis requested (not implemented yet)")
     else:
         text = "Unsupported input type"
-        print(f"❌ [SCOUT] Unsupported input type: {input_type}")
+        logger.error("❌ [SCOUT] Unsupported input type: %s", input_type)
 
-    scout_time = time.time()
-    await send_ws_log("INFO", "SCOUT completed", {"duration_s": round(scout_time - start_time, 2), "chars": len(text)})
-    print(f"✅ [SCOUT] Content extracted in {scout_time - start_time:.2f}s")
+    return text, source_url
 
-    # Verify: Run parallel analysis tasks
-    await send_ws_log("DEBUG", "VERIFY - starting parallel tasks")
-    print(f"\n📍 [STEP 2/5] VERIFY - Running parallel analysis...")
-    print(f"🔄 [VERIFY] Starting 3 parallel tasks: Sentiment, Embeddings, Gemini AI")
-    
-    sentiment_task = asyncio.create_task(call_hf_sentiment(text[:512]))  # Limit for sentiment
-    embedding_task = asyncio.create_task(embed_texts([text[:1000]]))  # Limit for embeddings
-    gemini_task = asyncio.create_task(call_gemini_analyze(text, source_url))
-
-    await send_ws_log("DEBUG", "VERIFY - waiting for sentiment")
-    print(f"⏳ [VERIFY] Waiting for sentiment analysis...")
-    sentiment = await sentiment_task
-    sentiment_time = time.time()
-    await send_ws_log("INFO", "Sentiment completed", {"duration_s": round(sentiment_time - scout_time, 2)})
-    print(f"✅ [VERIFY] Sentiment completed in {sentiment_time - scout_time:.2f}s")
-    
-    await send_ws_log("DEBUG", "VERIFY - waiting for embeddings")
-    print(f"⏳ [VERIFY] Waiting for embeddings...")
-    vectors = await embedding_task
-    embedding_time = time.time()
-    await send_ws_log("INFO", "Embeddings completed", {"duration_s": round(embedding_time - sentiment_time, 2)})
-    print(f"✅ [VERIFY] Embeddings completed in {embedding_time - sentiment_time:.2f}s")
-    
-    await send_ws_log("DEBUG", "VERIFY - waiting for Gemini AI")
-    print(f"⏳ [VERIFY] Waiting for Gemini AI analysis...")
-    gemini_analysis = await gemini_task
-    gemini_time = time.time()
-    await send_ws_log("INFO", "Gemini completed", {"duration_s": round(gemini_time - embedding_time, 2)})
-    print(f"✅ [VERIFY] Gemini AI completed in {gemini_time - embedding_time:.2f}s")
-
-    # Store in vector database and knowledge graph
+
+def is_cacheable_input(input_type: str, text: str) -> bool:
+    """Only real content is cached; placeholders and fetch failures are not."""
+    if input_type == "url":
+        return not text.startswith(FETCH_ERROR_PREFIX)
+    return input_type == "text"
+
+
+async def run_agent_workflow(
+    input_type: str,
+    payload: Dict[str, Any],
+    cache_mode: str = "default",
+    deadline_s: float = WORKFLOW_DEADLINE_S,
+) -> Dict[str, Any]:
+    """Implements the Scout → Verify → Synthesize → Respond workflow for misinformation detection.
+
+    - Scout: parse input, extract/fetch text content
+    - Cache: look up the content-addressed verdict cache (see ``services.cache``)
+    - Verify: run sentiment analysis, generate embeddings, deep analysis with Gemini
+    - Synthesize: build the credibility assessment and queue it for storage
+    - Respond: return structured verification result with evidence
+
+    Everything after scouting runs as a stage graph (see ``analyze_content``)
+    under a ``deadline_s`` budget that provider calls inherit.
+    ``cache_mode`` is one of ``default``, ``bypass`` or ``refresh``.
+    """
+    token = set_deadline(deadline_s)
+    try:
+        return await _run_agent_workflow(input_type, payload, cache_mode)
+    finally:
+        reset_deadline(token)
+
+
+async def _run_agent_workflow(input_type: str, payload: Dict[str, Any], cache_mode: str) -> Dict[str, Any]:
+    start_time = time.perf_counter()
+    await send_ws_log("INFO", "Workflow started", {"type": input_type})
+    logger.info("🚀 [WORKFLOW] Starting agent workflow - Type: %s", input_type)
+
+    with metrics.span("workflow"):
+        with metrics.span("scout"):
+            text, source_url = await scout_content(input_type, payload)
+
+        scout_time = time.perf_counter()
+        emit("scout", {
+            "chars": len(text),
+            "source_url": source_url,
+            "preview": text[:PROGRESS_PREVIEW_CHARS],
+            "duration_s": round(scout_time - start_time, 3),
+        })
+        await send_ws_log("INFO", "SCOUT completed", {"duration_s": round(scout_time - start_time, 2), "chars": len(text)})
+        logger.info("✅ [SCOUT] Content extracted in %.2fs", scout_time - start_time)
+
+        if not is_cacheable_input(input_type, text):
+            return await analyze_content(input_type, payload, text, source_url, start_time, scout_time)
+
+        cache_key = make_cache_key(input_type, text, source_url)
+        result, cache_status = await verdict_cache.get_or_compute(
+            cache_key,
+            lambda: analyze_content(input_type, payload, text, source_url, start_time, scout_time, cache_key),
+            mode=cache_mode,
+        )
+    result["cache"] = {"status": cache_status, "key": cache_key}
+    if cache_status in ("hit", "coalesced"):
+        await send_ws_log("INFO", "Verdict served from cache", {"status": cache_status, "verdict": result.get("verdict")})
+        logger.info("⚡ [CACHE] Verdict served from cache (%s) in %.2fs", cache_status, time.perf_counter() - start_time)
+    return result
+
+
+async def _chunk_stage(r: Dict[str, Any]) -> List[Chunk]:
+    chunks = split_chunks(r["text"])
+    if len(chunks) > 1:
+        logger.info("🧩 [SCOUT] Split %s chars into %s chunks", len(r["text"]), len(chunks))
+    return chunks
+
+
+async def _embed_stage(r: Dict[str, Any]) -> Embeddings:
+    # One vector per chunk, all in one batched call
+    texts = [chunk.text for chunk in r["chunk"]]
+    if r["embedder"] is not None and len(texts) == 1:
+        # Batch items: single texts from many items share one micro-batched call
+        vectors = await r["embedder"](texts[0])
+    else:
+        vectors = await embed_texts(texts)
+    ready_after = time.perf_counter() - r["scout_time"]
+    emit("embeddings", {"count": len(vectors), "ready_after_s": round(ready_after, 3)})
+    await send_ws_log("INFO", "Embeddings completed", {"ready_after_s": round(ready_after, 2)})
+    logger.info("✅ [VERIFY] Embeddings ready after %.2fs", ready_after)
+    return vectors
+
+
+async def _sentiment_stage(r: Dict[str, Any]) -> Dict[str, Any]:
+    sentiment = await analyze_sentiment(r["text"])
+    ready_after = time.perf_counter() - r["scout_time"]
+    await send_ws_log("INFO", "Sentiment completed", {"ready_after_s": round(ready_after, 2)})
+    logger.info("✅ [VERIFY] Sentiment ready after %.2fs", ready_after)
+    return sentiment
+
+
+async def _analyze_stage(r: Dict[str, Any]) -> Dict[str, Any]:
+    # A near-duplicate of an earlier analysis skips Gemini
+    near_duplicate = r["near_duplicate"]
+    if near_duplicate is not None:
+        analysis = near_duplicate["analysis"]
+    else:
+        analysis = await analyze_document(r["text"], r["source_url"], r["chunk"])
+    ready_after = time.perf_counter() - r["scout_time"]
+    await send_ws_log("INFO", "Gemini completed", {"ready_after_s": round(ready_after, 2)})
+    logger.info("✅ [VERIFY] Gemini AI ready after %.2fs", ready_after)
+    return analysis
+
+
+async def _synthesize_stage(r: Dict[str, Any]) -> Dict[str, Any]:
+    result = await synthesize_result(r["input_type"], r["text"], r["source_url"], r["analyze"], r["sentiment"])
+    annotate_near_duplicate(result, r["near_duplicate"])
+    threat_feed.observe(result["verdict"], sentiment_label(r["sentiment"]))
+    return result
+
+
+# Stages whose fallback changes the answer. A skipped near-duplicate lookup
+# or local embeddings leave the verdict intact, so they neither mark the
+# result degraded nor keep it out of the cache.
+VERDICT_STAGES = ("sentiment", "analyze")
+
+
+def degraded_stages(status: Dict[str, str]) -> List[str]:
+    return sorted(name for name, state in status.items() if state != "ok" and name in VERDICT_STAGES)
+
+
+async def _persist_stage(r: Dict[str, Any]) -> Optional[str]:
+    # Every other stage has finished, so the stored record can say which fell back
+    return await persist_analysis(
+        r["input_type"], r["payload"], r["synthesize"], r["embed"], r["text"], r["cache_key"],
+        r["analyze"], r["near_duplicate"], degraded_stages(r[STATUS_KEY]), [chunk.text for chunk in r["chunk"]],
+    )
+
+
+# Chunk → Verify (embed, sentiment, near-duplicate lookup, Gemini) → Synthesize → Store.
+# Embeddings and sentiment are hedged: both are idempotent and cheap (for
+# sentiment this only matters when it falls back to the remote model).
+# Gemini is not, since a duplicate call costs generation quota. Synthesize
+# and persist are quick local work that must finish even past the deadline.
+analysis_graph = StageGraph("analysis", [
+    Stage("chunk", _chunk_stage, deadline=False),
+    Stage("embed", _embed_stage, deps=("chunk",), hedge=True, fallback=lambda r: local_embeddings([c.text for c in r["chunk"]])),
+    Stage("sentiment", _sentiment_stage, optional=True, hedge=True, fallback=lambda r: default_sentiment("not ready in time")),
+    Stage("near_duplicate", lambda r: lookup_near_duplicate(r["embed"]), deps=("embed",), optional=True, fallback=lambda r: None),
+    Stage("analyze", _analyze_stage, deps=("near_duplicate", "chunk"), fallback=lambda r: unknown_analysis("Analysis timed out", "Deadline exceeded")),
+    Stage("synthesize", _synthesize_stage, deps=("analyze", "sentiment"), deadline=False),
+    Stage("persist", _persist_stage, deps=("synthesize", "embed"), deadline=False),
+])
+
+
+def get_analysis_graph() -> StageGraph:
+    return analysis_graph
+
+
+async def analyze_content(
+    input_type: str,
+    payload: Dict[str, Any],
+    text: str,
+    source_url: Optional[str],
+    start_time: float,
+    scout_time: float,
+    cache_key: Optional[str] = None,
+    embedder: Optional[Callable[[str], Awaitable[Embeddings]]] = None,
+    limits: Optional[Dict[str, asyncio.Semaphore]] = None,
+) -> Dict[str, Any]:
+    """Verify → Synthesize → Store → Respond for already-scouted content.
+
+    Runs ``analysis_graph``: each stage starts as soon as its inputs exist,
+    so the VERIFY log lines report when each result became available
+    (relative to the end of scouting). Verdict stages that fell back to a
+    default (timed out, failed, or were not waited for) are listed under
+    ``degraded`` in the result; every fallback is logged. Batches pass a shared ``embedder`` for
+    single-chunk texts and per-stage ``limits`` (see ``StageGraph.run``).
+    """
+    await send_ws_log("DEBUG", "VERIFY - starting analysis stages")
+    logger.debug("📍 [STEP 2/5] VERIFY - Running analysis stages...")
+
+    results, status = await analysis_graph.run({
+        "input_type": input_type,
+        "payload": payload,
+        "text": text,
+        "source_url": source_url,
+        "cache_key": cache_key,
+        "scout_time": scout_time,
+        "embedder": embedder,
+    }, limits)
+    result = results["synthesize"]
+    if results["persist"]:
+        result["record_id"] = results["persist"]
+    degraded = degraded_stages(status)
+    if degraded:
+        result["degraded"] = degraded
+    fallbacks = {name: state for name, state in status.items() if state != "ok"}
+    if fallbacks:
+        await send_ws_log("WARN", "Analysis degraded", {"stages": fallbacks})
+
+    end_time = time.perf_counter()
+    total_time = end_time - start_time
+    await send_ws_log("INFO", "WORKFLOW completed", {"total_time_s": round(total_time, 2), "verdict": result.get("verdict")})
+    logger.info("✅ [WORKFLOW] COMPLETED - Total time: %.2fs", total_time)
+    logger.info(
+        "📊 [WORKFLOW] Breakdown: scout %.2fs, stages %.2fs (degraded: %s) - Verdict=%s, Confidence=%s",
+        scout_time - start_time, end_time - scout_time, ", ".join(sorted(fallbacks)) or "none",
+        result['verdict'], result['confidence'],
+    )
+
+    return result
+
+
+async def lookup_near_duplicate(vectors: Embeddings) -> Optional[Dict[str, Any]]:
+    """Nearest prior analysis above the ANN similarity threshold, if any (see ``services.ann_index``).
+
+    Chunked documents are compared by the mean of their chunk vectors.
+    Local fallback vectors are only matched against the local index, so
+    dedupe keeps working while the embedding provider is unavailable.
+    """
+    if not vectors:
+        return None
+    match = await asyncio.to_thread(find_near_duplicate, document_vector(vectors), vectors.model)
+    if match is not None:
+        analysis = recent_analysis(match["record_id"]) or analysis_from_record(await find_analysis_record(match["record_id"]))
+        if analysis is None:
+            # Not in memory and not (yet) in Mongo: nothing to reuse
+            return None
+        match["analysis"] = analysis
+        emit("near_duplicate", {
+            "record_id": match["record_id"],
+            "similarity": match["similarity"],
+            "verdict": match["analysis"].get("verdict"),
+        })
+        await send_ws_log("INFO", "Near-duplicate of a prior analysis", {"record_id": match["record_id"], "similarity": match["similarity"]})
+        logger.info("♻️ [ANN] Reusing verdict of record %s (similarity %s)", match['record_id'], match['similarity'])
+    return match
+
+
+def analysis_from_record(record: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Rebuild the reusable Gemini analysis from a stored record (see ``synthesize_result``)."""
+    if record is None or not is_cacheable_result(record.get("result") or {}):
+        return None
+    result = record["result"]
+    source_url = (record.get("payload") or {}).get("url")
+    analysis = {
+        "summary": result.get("summary", ""),
+        "verdict": result["verdict"],
+        "confidence": result.get("confidence", 0.5),
+        "reasoning": result.get("reasoning", ""),
+        # The evidence list is the model's sources plus, first, the analyzed URL itself
+        "evidence_sources": [e["source"] for e in result.get("evidence", []) if e.get("source") != source_url],
+    }
+    if "chunks" in result:
+        analysis["chunks"] = result["chunks"]
+    return analysis
+
+
+def annotate_near_duplicate(result: Dict[str, Any], near_duplicate: Optional[Dict[str, Any]]) -> None:
+    """Record which earlier analysis a reused verdict came from."""
+    if near_duplicate is not None:
+        result["near_duplicate"] = {
+            "record_id": near_duplicate["record_id"],
+            "similarity": near_duplicate["similarity"],
+        }
+
+
+async def remember_result(
+    vectors: Embeddings,
+    record_id: Optional[str],
+    gemini_analysis: Dict[str, Any],
+    near_duplicate: Optional[Dict[str, Any]],
+    chunk_texts: List[str],
+) -> None:
+    """Index a fresh analysis so later near-duplicates can reuse it.
+
+    Besides the provider embeddings, every analysis is indexed by its local
+    embeddings, which lookups use while the provider is unavailable.
+    """
+    if near_duplicate is not None or not vectors:
+        return
+    if gemini_analysis.get("verdict") == "Unknown":
+        return
+    record_id = record_id or vectors[0][0]
+    if shareable(vectors):
+        await remember(document_vector(vectors), record_id, gemini_analysis, vectors.model)
+    local = vectors if vectors.local else await asyncio.to_thread(local_embeddings, chunk_texts)
+    await remember(document_vector(local), record_id, gemini_analysis, local.model)
+
+
+def vector_metadata(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Metadata stored alongside each embedding in the vector DB."""
+    return {
+        "input_type": result.get("input_type"),
+        "verdict": result.get("verdict"),
+        "confidence": result.get("confidence"),
+    }
+
+
+async def store_outputs(
+    vectors: Embeddings,
+    text: str,
+    metadata: Optional[Dict[str, Any]] = None,
+) -> None:
+    """Store: upsert embeddings into the vector DB and write the knowledge graph."""
     await send_ws_log("DEBUG", "STORE - starting storage operations")
-    print(f"\n📍 [STEP 3/5] STORE - Saving to Vector DB and Knowledge Graph...")
-    store_start = time.time()
+    logger.debug("📍 [STEP 3/5] STORE - Saving to Vector DB and Knowledge Graph...")
     try:
         await send_ws_log("DEBUG", "STORE - upserting embeddings")
-        print(f"💾 [STORE] Upserting embeddings to Pinecone...")
-        await upsert_embeddings(vectors)
-        await send_ws_log("INFO", "STORE - embeddings upserted")
-        print(f"✅ [STORE] Embeddings stored")
+        logger.debug("💾 [STORE] Upserting embeddings to Pinecone...")
+        await upsert_embeddings(vectors, metadata)
+        await send_ws_log("INFO", "STORE - embeddings queued for upsert")
+        logger.info("✅ [STORE] Embeddings queued")
 
         await send_ws_log("DEBUG", "STORE - writing graph entities")
-        print(f"🕸️ [STORE] Writing entities to Neo4j graph...")
-        await write_entities_and_relationships(text[:2000])  # Limit for graph processing
+        logger.debug("🕸️ [STORE] Writing entities to Neo4j graph...")
+        await write_entities_and_relationships(text[:GRAPH_TEXT_MAX_CHARS])
         await send_ws_log("INFO", "STORE - graph entities written")
-        print(f"✅ [STORE] Graph entities stored")
+        logger.info("✅ [STORE] Graph entities stored")
     except Exception as e:
         await send_ws_log("WARN", "STORE failed", {"error": str(e)})
-        print(f"⚠️ [STORE] Warning: Failed to store in vector DB or graph: {e}")
-    
-    store_time = time.time()
-    print(f"✅ [STORE] Storage completed in {store_time - gemini_time:.2f}s")
+        logger.warning("⚠️ [STORE] Failed to store in vector DB or graph: %s", e)
+
 
+async def synthesize_result(
+    input_type: str,
+    text: str,
+    source_url: Optional[str],
+    gemini_analysis: Dict[str, Any],
+    sentiment: Dict[str, Any],
+) -> Dict[str, Any]:
+    """Synthesize + Respond: build the evidence list and the final result dict."""
     # Synthesize: Build evidence list from Gemini suggestions
     await send_ws_log("DEBUG", "SYNTHESIZE - building evidence")
-    print(f"\n📍 [STEP 4/5] SYNTHESIZE - Building evidence list...")
+    logger.debug("📍 [STEP 4/5] SYNTHESIZE - Building evidence list...")
     evidence = []
     for idx, source in enumerate(gemini_analysis.get("evidence_sources", [])[:4]):
         confidence = gemini_analysis.get("confidence", 0.5)
@@ -340,11 +799,11 @@ async def run_agent_workflow(input_type: str, payload: Dict[str, Any]) -> Dict[s
         })
     
     await send_ws_log("INFO", "SYNTHESIZE completed", {"evidence_count": len(evidence)})
-    print(f"✅ [SYNTHESIZE] Built evidence list with {len(evidence)} sources")
+    logger.info("✅ [SYNTHESIZE] Built evidence list with %s sources", len(evidence))
 
     # Respond: Craft comprehensive result
     await send_ws_log("DEBUG", "RESPOND - crafting final result")
-    print(f"\n📍 [STEP 5/5] RESPOND - Crafting final result...")
+    logger.debug("📍 [STEP 5/5] RESPOND - Crafting final result...")
     result = {
         "status": "completed",
         "summary": gemini_analysis.get("summary", "Analysis completed"),
@@ -356,37 +815,134 @@ async def run_agent_workflow(input_type: str, payload: Dict[str, Any]) -> Dict[s
         "input_type": input_type,
         "analyzed_text_length": len(text)
     }
-    
-    # Persist to MongoDB if configured
+    if "chunks" in gemini_analysis:
+        # Which spans of the text each part of the verdict came from
+        result["chunks"] = gemini_analysis["chunks"]
+    return result
+
+
+async def persist_outputs(
+    input_type: str,
+    payload: Dict[str, Any],
+    result: Dict[str, Any],
+    vectors: Embeddings,
+    text: str,
+    cache_key: Optional[str] = None,
+) -> Optional[str]:
+    """Hand the Mongo record, vectors, graph document and rollup counters to the outbox; returns the record id.
+
+    One local transaction replaces four remote writes on the request path;
+    background drainers deliver them (see ``services.outbox``). Without a
+    running outbox the writes happen inline as before.
+    """
+    if not is_cacheable_result(result):
+        # Only results the verdict cache would keep are findable by cache key
+        cache_key = None
+    created_at = time.time()
+    rollup = rollup_event(
+        created_at,
+        input_type,
+        result.get("verdict"),
+        sentiment_label(result.get("sentiment") or {}),
+        payload.get("url") if input_type == "url" else None,
+    )
+    if not outbox.active:
+        return await persist_inline(input_type, payload, result, vectors, text, cache_key, rollup)
+
+    record_id = new_record_id() if outbox.accepts("mongo") else None
+    entries = []
+    if record_id:
+        entries.append(("mongo", {
+            "_id": record_id,
+            "input_type": input_type,
+            "payload": payload,
+            "result": result,
+            "cache_key": cache_key,
+            "created_at": created_at,
+        }))
+        # Rollups count persisted analyses, so a backfill from the records agrees with them
+        if outbox.accepts("rollups"):
+            entries.append(("rollups", rollup))
+    if shareable(vectors) and outbox.accepts("pinecone"):
+        entries.append(("pinecone", {"vectors": vector_records(vectors, vector_metadata(result))}))
+    if outbox.accepts("neo4j"):
+        entries.append(("neo4j", {"text": text[:GRAPH_TEXT_MAX_CHARS]}))
+    try:
+        await outbox.put(entries)
+    except Exception as e:
+        await send_ws_log("WARN", "Outbox write failed, storing inline", {"error": str(e)})
+        logger.warning("⚠️ [STORE] Outbox write failed, storing inline: %s", e)
+        return await persist_inline(input_type, payload, result, vectors, text, cache_key, rollup)
+    await send_ws_log("INFO", "Queued analysis writes", {"id": record_id, "sinks": [sink for sink, _ in entries]})
+    logger.info("✅ [STORE] Queued %s writes (record %s)", len(entries), record_id)
+    return record_id
+
+
+async def persist_analysis(
+    input_type: str,
+    payload: Dict[str, Any],
+    result: Dict[str, Any],
+    vectors: Embeddings,
+    text: str,
+    cache_key: Optional[str],
+    gemini_analysis: Dict[str, Any],
+    near_duplicate: Optional[Dict[str, Any]],
+    degraded: List[str],
+    chunk_texts: List[str],
+) -> Optional[str]:
+    """Store one finished analysis, the same way for single queries and batch items; returns the record id.
+
+    Stages that fell back are recorded under ``degraded`` (which also keeps
+    the record out of the verdict cache), the writes go through
+    ``persist_outputs`` and the analysis is indexed for near-duplicates.
+    """
+    if degraded:
+        result["degraded"] = degraded
+    # Queued in the write-behind outbox, not awaited on the sinks
+    record_id = await persist_outputs(input_type, payload, result, vectors, text, cache_key)
+    await remember_result(vectors, record_id, gemini_analysis, near_duplicate, chunk_texts)
+    return record_id
+
+
+async def persist_inline(
+    input_type: str,
+    payload: Dict[str, Any],
+    result: Dict[str, Any],
+    vectors: Embeddings,
+    text: str,
+    cache_key: Optional[str],
+    rollup: Dict[str, Any],
+) -> Optional[str]:
+    """Write everything directly when the outbox is not available; returns the record id."""
+    await store_outputs(vectors, text, vector_metadata(result))
+    record_id = await persist_result(input_type, payload, result, cache_key)
+    if record_id:
+        try:
+            await write_rollups([rollup])
+        except Exception as e:
+            logger.warning("⚠️ [STORE] Failed to update rollups: %s", e)
+    return record_id
+
+
+async def persist_result(
+    input_type: str,
+    payload: Dict[str, Any],
+    result: Dict[str, Any],
+    cache_key: Optional[str] = None,
+) -> Optional[str]:
+    """Persist the analysis record to MongoDB if configured; returns its id."""
     await send_ws_log("DEBUG", "RESPOND - saving to MongoDB")
-    print(f"💾 [RESPOND] Saving to MongoDB...")
+    logger.debug("💾 [RESPOND] Saving to MongoDB...")
     try:
-        record_id = await create_analysis_record(input_type, payload, result)
+        record_id = await create_analysis_record(input_type, payload, result, cache_key=cache_key)
         if record_id:
             await send_ws_log("INFO", "Saved analysis to MongoDB", {"id": record_id})
-            print(f"✅ [RESPOND] Saved to MongoDB with ID: {record_id}")
+            logger.info("✅ [RESPOND] Saved to MongoDB with ID: %s", record_id)
         else:
             await send_ws_log("WARN", "MongoDB not configured or insert failed")
-            print(f"⚠️ [RESPOND] MongoDB not configured, skipping persistence")
+            logger.warning("⚠️ [RESPOND] MongoDB not configured, skipping persistence")
+        return record_id
     except Exception as e:
         await send_ws_log("ERROR", "RESPOND - failed to persist to MongoDB", {"error": str(e)})
-        print(f"⚠️ [RESPOND] Warning: Failed to persist to MongoDB: {e}")
-    
-    end_time = time.time()
-    total_time = end_time - start_time
-    await send_ws_log("INFO", "WORKFLOW completed", {"total_time_s": round(total_time, 2), "verdict": result.get("verdict")})
-    print(f"\n{'='*80}")
-    print(f"✅ [WORKFLOW] COMPLETED - Total time: {total_time:.2f}s")
-    print(f"📊 [WORKFLOW] Breakdown:")
-    print(f"   - Scout (fetch): {scout_time - start_time:.2f}s")
-    print(f"   - Verify (AI): {gemini_time - scout_time:.2f}s")
-    print(f"   - Store (DB): {store_time - gemini_time:.2f}s")
-    print(f"   - Result: Verdict={result['verdict']}, Confidence={result['confidence']}")
-    print(f"{'='*80}\n")
-    
-    return result
-
-
-
-
-
+        logger.warning("⚠️ [RESPOND] Failed to persist to MongoDB: %s", e)
+        return None
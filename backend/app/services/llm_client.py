@@ -0,0 +1,368 @@
+import abc
+import asyncio
+import hashlib
+import os
+import re
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+import google.generativeai as genai
+from dotenv import load_dotenv
+from google.api_core import exceptions as google_exceptions
+
+from .metrics import metrics
+from .rate_limit import AdaptiveLimiter, RateLimited, TokenBucket
+from .stage_dag import request_deadline, time_left
+
+load_dotenv()
+
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+GEMINI_EMBED_MODEL = os.getenv("GEMINI_EMBED_MODEL", "models/embedding-001")
+
+# "gemini" (default) or "fake" for offline development and load testing
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini").lower()
+LLM_GENERATE_MAX_CONCURRENCY = int(os.getenv("LLM_GENERATE_MAX_CONCURRENCY", "32"))
+LLM_GENERATE_TIMEOUT_S = float(os.getenv("LLM_GENERATE_TIMEOUT_S", "60"))
+LLM_EMBED_MAX_CONCURRENCY = int(os.getenv("LLM_EMBED_MAX_CONCURRENCY", "16"))
+LLM_EMBED_TIMEOUT_S = float(os.getenv("LLM_EMBED_TIMEOUT_S", "20"))
+# Provider quotas (0 = no token bucket; the AIMD concurrency limit still reacts to 429s)
+LLM_GENERATE_RATE_PER_S = float(os.getenv("LLM_GENERATE_RATE_PER_S", "0"))
+LLM_GENERATE_BURST = float(os.getenv("LLM_GENERATE_BURST", "0"))
+LLM_EMBED_RATE_PER_S = float(os.getenv("LLM_EMBED_RATE_PER_S", "0"))
+LLM_EMBED_BURST = float(os.getenv("LLM_EMBED_BURST", "0"))
+# Calls slower than this shrink the concurrency limit (0 = only 429s and timeouts do)
+LLM_GENERATE_LATENCY_TARGET_S = float(os.getenv("LLM_GENERATE_LATENCY_TARGET_S", "20"))
+LLM_EMBED_LATENCY_TARGET_S = float(os.getenv("LLM_EMBED_LATENCY_TARGET_S", "5"))
+# Bounded wait queue; a queued call that has not started after this long is rejected
+LLM_QUEUE_MAX = int(os.getenv("LLM_QUEUE_MAX", "1000"))
+LLM_QUEUE_TIMEOUT_S = float(os.getenv("LLM_QUEUE_TIMEOUT_S", "30"))
+FAKE_LLM_LATENCY_S = float(os.getenv("FAKE_LLM_LATENCY_S", "0.5"))
+FAKE_EMBED_LATENCY_S = float(os.getenv("FAKE_EMBED_LATENCY_S", "0.05"))
+FAKE_EMBED_DIM = int(os.getenv("FAKE_EMBED_DIM", "768"))
+# Quotas the fake provider enforces with 429s (0 = unlimited)
+FAKE_LLM_QUOTA_PER_S = float(os.getenv("FAKE_LLM_QUOTA_PER_S", "0"))
+FAKE_EMBED_QUOTA_PER_S = float(os.getenv("FAKE_EMBED_QUOTA_PER_S", "0"))
+FAKE_LLM_QUOTA_CONCURRENCY = int(os.getenv("FAKE_LLM_QUOTA_CONCURRENCY", "0"))
+
+if GEMINI_API_KEY:
+    genai.configure(api_key=GEMINI_API_KEY)
+
+
+class LLMTimeoutError(Exception):
+    """Raised when a provider call exceeds its timeout."""
+
+
+class LLMProvider(abc.ABC):
+    """Interface every generation/embedding backend implements.
+
+    Implementations must be natively async: nothing here may block the event loop.
+    """
+
+    name = "base"
+    # Names the embedding space; vectors from different models are never compared
+    embed_model = "base"
+
+    @property
+    def configured(self) -> bool:
+        return True
+
+    @abc.abstractmethod
+    async def generate(self, prompt: str) -> str:
+        """Complete ``prompt``; raise ``RateLimited`` when the provider answers 429."""
+
+    async def generate_stream(self, prompt: str) -> AsyncIterator[str]:
+        """Yield the response text in chunks as the model produces it (default: all at once)."""
+        yield await self.generate(prompt)
+
+    @abc.abstractmethod
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """One embedding per text, in order."""
+
+
+class GeminiProvider(LLMProvider):
+    """Gemini via the SDK's async (grpc.aio) API."""
+
+    name = "gemini"
+
+    def __init__(self, model: str = GEMINI_MODEL, embed_model: str = GEMINI_EMBED_MODEL) -> None:
+        self.model_name = model
+        self.embed_model = embed_model
+        self._model: Optional[genai.GenerativeModel] = None
+
+    @property
+    def configured(self) -> bool:
+        return bool(GEMINI_API_KEY)
+
+    async def generate(self, prompt: str) -> str:
+        if self._model is None:
+            self._model = genai.GenerativeModel(self.model_name)
+        try:
+            response = await self._model.generate_content_async(prompt)
+        except google_exceptions.TooManyRequests as e:
+            raise RateLimited(str(e)) from e
+        return response.text
+
+    async def generate_stream(self, prompt: str) -> AsyncIterator[str]:
+        if self._model is None:
+            self._model = genai.GenerativeModel(self.model_name)
+        try:
+            response = await self._model.generate_content_async(prompt, stream=True)
+            async for chunk in response:
+                yield chunk.text
+        except google_exceptions.TooManyRequests as e:
+            raise RateLimited(str(e)) from e
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        # A list of contents is sent as a single batchEmbedContents call
+        try:
+            result = await genai.embed_content_async(
+                model=self.embed_model,
+                content=texts,
+                task_type="retrieval_document",
+            )
+        except google_exceptions.TooManyRequests as e:
+            raise RateLimited(str(e)) from e
+        return result["embedding"]
+
+
+class FakeProvider(LLMProvider):
+    """Deterministic local provider with configurable latency and quotas.
+
+    Lets the workflow (and its concurrency limits) be exercised offline: the
+    sleep yields to the event loop exactly like a real network call would.
+    Like a real API it answers with ``RateLimited`` (and a Retry-After)
+    when calls exceed ``quota_per_s`` / ``embed_quota_per_s`` or more than
+    ``quota_concurrency`` are in flight.
+    """
+
+    name = "fake"
+    embed_model = "fake"
+
+    def __init__(
+        self,
+        latency_s: float = FAKE_LLM_LATENCY_S,
+        embed_latency_s: float = FAKE_EMBED_LATENCY_S,
+        dim: int = FAKE_EMBED_DIM,
+        quota_per_s: float = FAKE_LLM_QUOTA_PER_S,
+        embed_quota_per_s: float = FAKE_EMBED_QUOTA_PER_S,
+        quota_concurrency: int = FAKE_LLM_QUOTA_CONCURRENCY,
+    ) -> None:
+        self.latency_s = latency_s
+        self.embed_latency_s = embed_latency_s
+        self.dim = dim
+        self.quota_concurrency = quota_concurrency
+        self._quotas = {
+            "generate": TokenBucket(quota_per_s, quota_per_s),
+            "embed": TokenBucket(embed_quota_per_s, embed_quota_per_s),
+        }
+        self.in_flight = 0
+        self.accepted = 0
+        self.rejected = 0
+
+    async def _admit(self, operation: str) -> None:
+        bucket = self._quotas[operation]
+        now = time.monotonic()
+        wait = bucket.wait_time(now)
+        if wait > 0 or (self.quota_concurrency and self.in_flight >= self.quota_concurrency):
+            self.rejected += 1
+            await asyncio.sleep(0)
+            raise RateLimited(f"fake {operation} quota exceeded", retry_after_s=round(wait, 3) or None)
+        bucket.take(now)
+        self.accepted += 1
+
+    async def generate(self, prompt: str) -> str:
+        await self._admit("generate")
+        self.in_flight += 1
+        try:
+            await asyncio.sleep(self.latency_s)
+        finally:
+            self.in_flight -= 1
+        return self._response(prompt)
+
+    async def generate_stream(self, prompt: str) -> AsyncIterator[str]:
+        await self._admit("generate")
+        # A few words per chunk, spread over the same total latency as generate()
+        words = re.findall(r"\S+\s*", self._response(prompt))
+        chunks = ["".join(words[i:i + 3]) for i in range(0, len(words), 3)]
+        self.in_flight += 1
+        try:
+            for chunk in chunks:
+                await asyncio.sleep(self.latency_s / len(chunks))
+                yield chunk
+        finally:
+            self.in_flight -= 1
+
+    def _response(self, prompt: str) -> str:
+        digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+        verdicts = ["Likely True", "Likely False", "Misleading", "Uncertain", "Satire"]
+        verdict = verdicts[digest[0] % len(verdicts)]
+        confidence = round(0.5 + (digest[1] / 255) * 0.45, 2)
+        return (
+            f"VERDICT: {verdict}\n\n"
+            f"CONFIDENCE: {confidence}\n\n"
+            "SUMMARY: Offline fake analysis of the submitted content.\n\n"
+            "REASONING: Generated by the local fake provider; no model was called.\n\n"
+            "EVIDENCE_SOURCES:\n- factcheck.org\n- snopes.com\n"
+        )
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        await self._admit("embed")
+        self.in_flight += 1
+        try:
+            await asyncio.sleep(self.embed_latency_s)
+        finally:
+            self.in_flight -= 1
+        vectors = []
+        for text in texts:
+            seed = hashlib.sha256(text.encode("utf-8")).digest()
+            vectors.append([seed[i % len(seed)] / 255.0 for i in range(self.dim)])
+        return vectors
+
+
+class LLMClient:
+    """Rate-limited, timeout-enforcing front for one provider operation.
+
+    Calls go through an ``AdaptiveLimiter`` (see ``services.rate_limit``):
+    a token bucket for the provider's quota and an AIMD concurrency limit
+    of at most ``max_concurrency``, which shrinks on 429s and slow calls.
+    Waiting calls queue without blocking the loop and are rejected once
+    they cannot start within the queue timeout. Timeouts cancel the
+    underlying call, and cancelling the caller cancels it too. Inside a
+    request with a deadline (``services.stage_dag``) both the queue wait
+    and the call timeout are cut short to end by that deadline.
+    """
+
+    def __init__(self, provider: LLMProvider, name: str, max_concurrency: int, timeout_s: float, limiter: AdaptiveLimiter) -> None:
+        self.provider = provider
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.timeout_s = timeout_s
+        self.limiter = limiter
+        self.in_flight = 0
+        self.completed = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.total_latency_s = 0.0
+
+    @property
+    def configured(self) -> bool:
+        return self.provider.configured
+
+    @property
+    def embed_model(self) -> str:
+        return self.provider.embed_model
+
+    async def _attempt(self, coro_factory, timeout_s: float) -> Any:
+        self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            return await asyncio.wait_for(coro_factory(), timeout=timeout_s)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self.total_latency_s += time.perf_counter() - started
+
+    async def _call(self, coro_factory, timeout_s: Optional[float]) -> Any:
+        timeout_s = timeout_s or self.timeout_s
+        deadline = time.monotonic() + self.limiter.queue_timeout_s
+        if request_deadline() is not None:
+            deadline = min(deadline, request_deadline())
+        try:
+            # The timeout is taken when the call starts, after any queueing
+            return await self.limiter.run(lambda: self._attempt(coro_factory, time_left(timeout_s)), deadline=deadline)
+        except asyncio.TimeoutError as e:
+            self.timeouts += 1
+            raise LLMTimeoutError(f"{self.name} call timed out after {timeout_s}s") from e
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        except Exception:
+            self.errors += 1
+            raise
+
+    async def generate(
+        self,
+        prompt: str,
+        timeout_s: Optional[float] = None,
+        on_chunk: Optional[Callable[[str], None]] = None,
+    ) -> str:
+        """Full response text; with ``on_chunk`` the response is streamed and each chunk passed to it as it arrives."""
+        with metrics.span("gemini", "dependency"):
+            if on_chunk is None:
+                return await self._call(lambda: self.provider.generate(prompt), timeout_s)
+            return await self._call(lambda: self._collect(prompt, on_chunk), timeout_s)
+
+    async def _collect(self, prompt: str, on_chunk: Callable[[str], None]) -> str:
+        chunks = []
+        async for chunk in self.provider.generate_stream(prompt):
+            chunks.append(chunk)
+            on_chunk(chunk)
+        return "".join(chunks)
+
+    async def embed(self, texts: List[str], timeout_s: Optional[float] = None) -> List[List[float]]:
+        with metrics.span("embeddings", "dependency"):
+            return await self._call(lambda: self.provider.embed(texts), timeout_s)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "provider": self.provider.name,
+            "max_concurrency": self.max_concurrency,
+            "timeout_s": self.timeout_s,
+            "in_flight": self.in_flight,
+            "waiting": self.limiter.queue_depth,
+            "completed": self.completed,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "cancelled": self.cancelled,
+            "avg_latency_s": round(self.total_latency_s / self.completed, 4) if self.completed else 0.0,
+        }
+
+
+def _make_provider(name: str) -> LLMProvider:
+    if name == "fake":
+        return FakeProvider()
+    return GeminiProvider()
+
+
+_provider = _make_provider(LLM_PROVIDER)
+
+generation_client = LLMClient(
+    _provider,
+    "generate",
+    LLM_GENERATE_MAX_CONCURRENCY,
+    LLM_GENERATE_TIMEOUT_S,
+    AdaptiveLimiter(
+        "gemini",
+        rate_per_s=LLM_GENERATE_RATE_PER_S,
+        burst=LLM_GENERATE_BURST,
+        max_concurrency=LLM_GENERATE_MAX_CONCURRENCY,
+        latency_target_s=LLM_GENERATE_LATENCY_TARGET_S,
+        max_queue=LLM_QUEUE_MAX,
+        queue_timeout_s=LLM_QUEUE_TIMEOUT_S,
+    ),
+)
+embedding_client = LLMClient(
+    _provider,
+    "embed",
+    LLM_EMBED_MAX_CONCURRENCY,
+    LLM_EMBED_TIMEOUT_S,
+    AdaptiveLimiter(
+        "embeddings",
+        rate_per_s=LLM_EMBED_RATE_PER_S,
+        burst=LLM_EMBED_BURST,
+        max_concurrency=LLM_EMBED_MAX_CONCURRENCY,
+        latency_target_s=LLM_EMBED_LATENCY_TARGET_S,
+        max_queue=LLM_QUEUE_MAX,
+        queue_timeout_s=LLM_QUEUE_TIMEOUT_S,
+    ),
+)
+
+
+def get_generation_client() -> LLMClient:
+    return generation_client
+
+
+def get_embedding_client() -> LLMClient:
+    return embedding_client
@@ -0,0 +1,100 @@
+"""Deterministic, CPU-only text embeddings for offline use.
+
+Feature hashing over character 3/4/5-grams of the normalized text: each
+n-gram is hashed (FNV-1a over its UTF-8 bytes, then a 64-bit finalizer) to
+a bucket and a sign, the signed counts are summed per bucket and the row is
+L2-normalized. Texts that share wording share n-grams, so cosine similarity
+tracks lexical overlap. Hashes depend only on the bytes, never on the salted
+builtin ``hash``, so vectors are identical across processes and restarts.
+
+A whole batch is embedded in one vectorized pass: the texts are
+concatenated into a single byte array and every n-gram of every text is
+hashed with NumPy array arithmetic.
+"""
+import os
+from typing import Sequence
+
+import numpy as np
+
+from .cache import normalize_text
+
+LOCAL_EMBED_DIM = int(os.getenv("LOCAL_EMBED_DIM", "768"))
+NGRAM_SIZES = (3, 4, 5)
+
+_FNV_OFFSET = np.uint64(0xCBF29CE484222325)
+_FNV_PRIME = np.uint64(0x100000001B3)
+_MIX_1 = np.uint64(0xFF51AFD7ED558CCD)
+_MIX_2 = np.uint64(0xC4CEB9FE1A85EC53)
+
+
+def _finalize(h: np.ndarray) -> np.ndarray:
+    # murmur3 fmix64: spread FNV's weak low bits before taking the bucket
+    h = h ^ (h >> np.uint64(33))
+    h = h * _MIX_1
+    h = h ^ (h >> np.uint64(33))
+    h = h * _MIX_2
+    return h ^ (h >> np.uint64(33))
+
+
+def embed_local(texts: Sequence[str], dim: int = LOCAL_EMBED_DIM) -> np.ndarray:
+    """Embed ``texts`` into a ``(len(texts), dim)`` float32 matrix of unit rows."""
+    out = np.zeros((len(texts), dim), dtype=np.float32)
+    if not texts:
+        return out
+    # Space-padded so word starts/ends form their own n-grams
+    encoded = [f" {normalize_text(t)} ".encode("utf-8") for t in texts]
+    lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+    buf = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64)
+    doc_of = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)
+    ends = np.cumsum(lengths)
+
+    with np.errstate(over="ignore"):
+        for n in NGRAM_SIZES:
+            if len(buf) < n:
+                continue
+            starts = np.arange(len(buf) - n + 1)
+            # Drop n-grams that would straddle two texts
+            starts = starts[starts + n <= ends[doc_of[starts]]]
+            if not len(starts):
+                continue
+            h = np.full(len(starts), _FNV_OFFSET ^ np.uint64(n), dtype=np.uint64)
+            for j in range(n):
+                h = (h ^ buf[starts + j]) * _FNV_PRIME
+            h = _finalize(h)
+            buckets = (h % np.uint64(dim)).astype(np.int64)
+            signs = np.where(h >> np.uint64(63), -1.0, 1.0)
+            out += np.bincount(
+                doc_of[starts] * dim + buckets, weights=signs, minlength=len(texts) * dim
+            ).reshape(len(texts), dim).astype(np.float32)
+
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    out /= np.maximum(norms, 1e-12)
+    return out
+
+
+def hash_tokens(tokens: Sequence[str]) -> np.ndarray:
+    """64-bit hashes of whole tokens (same FNV-1a + finalizer as the n-grams), one per token.
+
+    The batch is encoded once, newline-separated (tokens must not contain
+    newlines), and all tokens are hashed in parallel one byte position at
+    a time.
+    """
+    if not len(tokens):
+        return np.zeros(0, dtype=np.uint64)
+    raw = np.frombuffer("\n".join(tokens).encode("utf-8"), dtype=np.uint8)
+    ends = np.append(np.flatnonzero(raw == 10), len(raw))
+    offsets = np.concatenate(([0], ends[:-1] + 1))
+    lengths = ends - offsets
+    buf = raw.astype(np.uint64)
+    h = np.full(len(tokens), _FNV_OFFSET, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for j in range(int(lengths.max())):
+            active = np.flatnonzero(lengths > j)
+            h[active] = (h[active] ^ buf[offsets[active] + j]) * _FNV_PRIME
+        return _finalize(h)
+
+
+def rehash(hashes: np.ndarray, salt: int) -> np.ndarray:
+    """Hashes of the same tokens in a separate feature space identified by ``salt``."""
+    with np.errstate(over="ignore"):
+        return _finalize(hashes ^ np.uint64(salt))
@@ -0,0 +1,186 @@
+import contextvars
+import functools
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Recent samples kept per span for the p50/p95/p99 in the JSON stats
+METRICS_RESERVOIR = int(os.getenv("METRICS_RESERVOIR", "2048"))
+# Requests carrying this header (any value but "0") get a per-request trace
+TRACE_HEADER = os.getenv("TRACE_HEADER", "X-Filtr-Trace")
+
+# Histogram bucket upper bounds in seconds (Prometheus ``le`` labels)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# "stage" spans are workflow phases; "dependency" spans are external calls
+KINDS = ("stage", "dependency")
+
+T = TypeVar("T")
+
+
+class SpanStats:
+    """Histogram, in-flight gauge and error counter for one span name."""
+
+    def __init__(self, reservoir: int = METRICS_RESERVOIR) -> None:
+        self.bucket_counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum_s = 0.0
+        self.max_s = 0.0
+        self.errors = 0
+        self.in_flight = 0
+        self.recent: Deque[float] = deque(maxlen=reservoir)
+
+    def observe(self, seconds: float, error: bool = False) -> None:
+        index = 0
+        while index < len(BUCKETS) and seconds > BUCKETS[index]:
+            index += 1
+        self.bucket_counts[index] += 1
+        self.count += 1
+        self.sum_s += seconds
+        self.max_s = max(self.max_s, seconds)
+        self.errors += error
+        self.recent.append(seconds)
+
+    def percentiles(self) -> Dict[str, float]:
+        samples = sorted(self.recent)
+        if not samples:
+            return {"p50_s": 0.0, "p95_s": 0.0, "p99_s": 0.0}
+        last = len(samples) - 1
+        return {f"p{q}_s": round(samples[min(last, int(len(samples) * q / 100))], 6) for q in (50, 95, 99)}
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "avg_s": round(self.sum_s / self.count, 6) if self.count else 0.0,
+            **self.percentiles(),
+            "max_s": round(self.max_s, 6),
+        }
+
+
+# Per-request trace: {"started": perf_counter at start, "spans": [...]}
+_trace: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("filtr_trace", default=None)
+
+
+class Metrics:
+    """Monotonic-clock spans for workflow stages and external dependencies.
+
+    ``span(name, kind)`` times a block with ``time.perf_counter`` and feeds
+    the span's histogram, in-flight gauge and error counter. When the
+    current context carries a trace (``start_trace``), the span is also
+    recorded there; tasks created inside the request copy the context, so
+    spans running concurrently land in the same trace with their real start
+    offsets. Counters are per process.
+    """
+
+    def __init__(self) -> None:
+        self._spans: Dict[Tuple[str, str], SpanStats] = {}
+
+    def _stats_for(self, name: str, kind: str) -> SpanStats:
+        stats = self._spans.get((kind, name))
+        if stats is None:
+            stats = self._spans[(kind, name)] = SpanStats()
+        return stats
+
+    @contextmanager
+    def span(self, name: str, kind: str = "stage") -> Iterator[None]:
+        stats = self._stats_for(name, kind)
+        stats.in_flight += 1
+        error = False
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            error = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            stats.in_flight -= 1
+            stats.observe(elapsed, error)
+            trace = _trace.get()
+            if trace is not None:
+                trace["spans"].append({
+                    "name": name,
+                    "kind": kind,
+                    "start_ms": round((started - trace["started"]) * 1000, 3),
+                    "duration_ms": round(elapsed * 1000, 3),
+                    "error": error,
+                })
+
+    def timed(self, name: str, kind: str = "dependency") -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+        """Decorator form of ``span`` for coroutine functions."""
+        def decorator(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+            @functools.wraps(func)
+            async def wrapper(*args: Any, **kwargs: Any) -> T:
+                with self.span(name, kind):
+                    return await func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {kind: {} for kind in KINDS}
+        for (kind, name), stats in sorted(self._spans.items()):
+            out.setdefault(kind, {})[name] = stats.as_dict()
+        return out
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines: List[str] = [
+            "# HELP filtr_span_duration_seconds Duration of workflow stages and external dependency calls.",
+            "# TYPE filtr_span_duration_seconds histogram",
+        ]
+        spans = sorted(self._spans.items())
+        for (kind, name), stats in spans:
+            labels = f'kind="{kind}",span="{name}"'
+            cumulative = 0
+            for bound, count in zip(BUCKETS, stats.bucket_counts):
+                cumulative += count
+                lines.append(f'filtr_span_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'filtr_span_duration_seconds_bucket{{{labels},le="+Inf"}} {stats.count}')
+            lines.append(f"filtr_span_duration_seconds_sum{{{labels}}} {stats.sum_s:.6f}")
+            lines.append(f"filtr_span_duration_seconds_count{{{labels}}} {stats.count}")
+        lines += [
+            "# HELP filtr_span_in_flight Spans currently running.",
+            "# TYPE filtr_span_in_flight gauge",
+        ]
+        lines += [f'filtr_span_in_flight{{kind="{kind}",span="{name}"}} {stats.in_flight}' for (kind, name), stats in spans]
+        lines += [
+            "# HELP filtr_span_errors_total Spans that ended with an exception.",
+            "# TYPE filtr_span_errors_total counter",
+        ]
+        lines += [f'filtr_span_errors_total{{kind="{kind}",span="{name}"}} {stats.errors}' for (kind, name), stats in spans]
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def get_metrics() -> Metrics:
+    return metrics
+
+
+def start_trace() -> contextvars.Token:
+    """Start collecting spans for the current request (see ``finish_trace``)."""
+    return _trace.set({"started": time.perf_counter(), "spans": []})
+
+
+def finish_trace(token: contextvars.Token) -> Dict[str, Any]:
+    """Stop the trace started with ``token`` and return its spans, ordered by start."""
+    trace = _trace.get()
+    _trace.reset(token)
+    if trace is None:
+        return {"total_ms": 0.0, "spans": []}
+    return {
+        "total_ms": round((time.perf_counter() - trace["started"]) * 1000, 3),
+        "spans": sorted(trace["spans"], key=lambda s: s["start_ms"]),
+    }
+
+
+def trace_requested(header_value: Optional[str]) -> bool:
+    return header_value is not None and header_value not in ("", "0", "false", "False")
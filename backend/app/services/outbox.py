@@ -0,0 +1,358 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .db import MONGO_BULK_BATCH, MONGO_BULK_LINGER_MS, db_ready, write_analysis_records
+from .rollups import ROLLUP_BATCH, ROLLUP_LINGER_MS, rollups_ready, write_rollups
+from .graph_service import NEO4J_BATCH_SIZE, NEO4J_FLUSH_INTERVAL_MS, graph_ready, write_graph_documents
+from .vector_store import PINECONE_FLUSH_INTERVAL_MS, PINECONE_UPSERT_BATCH, vector_store_ready, write_vectors
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_ENABLED = os.getenv("OUTBOX_ENABLED", "1") not in ("0", "false", "False", "")
+OUTBOX_PATH = os.getenv("OUTBOX_PATH", "data/outbox.sqlite3")
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_POLL_MS = float(os.getenv("OUTBOX_POLL_MS", "500"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_BACKOFF_S = float(os.getenv("OUTBOX_BACKOFF_S", "0.5"))
+OUTBOX_MAX_BACKOFF_S = float(os.getenv("OUTBOX_MAX_BACKOFF_S", "60"))
+# Claimed rows are hidden from other drainers (workers) this long
+OUTBOX_LEASE_S = float(os.getenv("OUTBOX_LEASE_S", "60"))
+OUTBOX_FLUSH_TIMEOUT_S = float(os.getenv("OUTBOX_FLUSH_TIMEOUT_S", "10"))
+# SQLite synchronous mode: NORMAL survives process crashes, FULL also power loss
+OUTBOX_SYNC = os.getenv("OUTBOX_SYNC", "NORMAL").upper()
+
+SinkHandler = Callable[[List[Dict[str, Any]]], Awaitable[None]]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sink TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    next_attempt_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    dead INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (sink, dead, next_attempt_at, id);
+"""
+
+
+class SinkState:
+    def __init__(self, handler: SinkHandler, ready: Callable[[], bool], batch_size: int, linger_s: float) -> None:
+        self.handler = handler
+        self.ready = ready
+        self.batch_size = batch_size
+        self.linger_s = linger_s
+        self.wakeup = asyncio.Event()
+        # Set once ``batch_size`` rows arrived since the last claim (ends the linger early)
+        self.full = asyncio.Event()
+        self.unclaimed = 0
+        self.task: Optional[asyncio.Task] = None
+        self.enqueued = 0
+        self.delivered = 0
+        self.batches = 0
+        self.failures = 0
+        self.dead_lettered = 0
+        self.last_error: Optional[str] = None
+
+
+class Outbox:
+    """Durable write-behind queue between the request path and the storage sinks.
+
+    ``put`` appends all of an analysis' writes (Mongo record, vectors, graph
+    document, rollup counters) to a local SQLite table in one transaction and returns; one
+    drainer task per sink claims due rows in batches, hands them to the
+    sink's handler and deletes them once written. Failed batches are retried
+    with jittered exponential backoff and dead-lettered after
+    ``max_attempts``. Claims are leases (``next_attempt_at`` moves
+    ``lease_s`` ahead), so several workers can share one file and rows
+    claimed by a crashed process become due again. Handlers should be
+    idempotent: a row can be delivered twice if a process dies between the
+    write and the delete (the rollup counters accept that rare double count).
+    """
+
+    def __init__(
+        self,
+        path: str = OUTBOX_PATH,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        poll_interval_s: float = OUTBOX_POLL_MS / 1000.0,
+        max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+        backoff_s: float = OUTBOX_BACKOFF_S,
+        max_backoff_s: float = OUTBOX_MAX_BACKOFF_S,
+        lease_s: float = OUTBOX_LEASE_S,
+        enabled: bool = OUTBOX_ENABLED,
+    ) -> None:
+        self.path = path
+        self.batch_size = batch_size
+        self.poll_interval_s = poll_interval_s
+        self.max_attempts = max_attempts
+        self.backoff_s = backoff_s
+        self.max_backoff_s = max_backoff_s
+        self.lease_s = lease_s
+        self.enabled = enabled
+        self._sinks: Dict[str, SinkState] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    # -- storage (called in worker threads) ----------------------------------
+
+    def _open(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={'FULL' if OUTBOX_SYNC == 'FULL' else 'NORMAL'}")
+        conn.executescript(SCHEMA)
+        self._conn = conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        # BEGIN IMMEDIATE takes the write lock up front, so concurrent workers queue instead of deadlocking
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _insert(self, rows: Sequence[Tuple[str, str]]) -> None:
+        now = time.time()
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT INTO outbox (sink, payload, created_at, next_attempt_at) VALUES (?, ?, ?, ?)",
+                [(sink, payload, now, now) for sink, payload in rows],
+            )
+
+    def _claim(self, sink: str, limit: int, ignore_backoff: bool = False) -> List[Tuple[int, int, str]]:
+        now = time.time()
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT id, attempts, payload FROM outbox WHERE sink = ? AND dead = 0 AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+                (sink, float("inf") if ignore_backoff else now, limit),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE outbox SET next_attempt_at = ? WHERE id = ?",
+                [(now + self.lease_s, row[0]) for row in rows],
+            )
+        return rows
+
+    def _delete(self, ids: List[int]) -> None:
+        with self._transaction() as conn:
+            conn.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in ids])
+
+    def _fail(self, rows: List[Tuple[int, int, str]], error: str) -> int:
+        """Schedule a retry for each row (or dead-letter it); returns how many were dead-lettered."""
+        now = time.time()
+        updates = []
+        dead = 0
+        for row_id, attempts, _ in rows:
+            attempts += 1
+            if attempts >= self.max_attempts:
+                dead += 1
+                updates.append((attempts, 1, now, error, row_id))
+            else:
+                # Full jitter: uniform in [0, min(cap, base * 2^attempts)]
+                delay = random.uniform(0, min(self.max_backoff_s, self.backoff_s * (2 ** attempts)))
+                updates.append((attempts, 0, now + delay, error, row_id))
+        with self._transaction() as conn:
+            conn.executemany(
+                "UPDATE outbox SET attempts = ?, dead = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                updates,
+            )
+        return dead
+
+    def _counts(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT sink, dead, COUNT(*), MIN(created_at) FROM outbox GROUP BY sink, dead"
+            ).fetchall()
+        counts: Dict[str, Dict[str, Any]] = {}
+        for sink, dead, count, oldest in rows:
+            entry = counts.setdefault(sink, {"pending": 0, "dead": 0, "oldest_pending_s": None})
+            if dead:
+                entry["dead"] = count
+            else:
+                entry["pending"] = count
+                entry["oldest_pending_s"] = round(time.time() - oldest, 3)
+        return counts
+
+    # -- async API -----------------------------------------------------------
+
+    def register(
+        self,
+        sink: str,
+        handler: SinkHandler,
+        ready: Callable[[], bool] = lambda: True,
+        batch_size: Optional[int] = None,
+        linger_s: float = 0.0,
+    ) -> None:
+        """Route rows for ``sink`` to ``handler``; ``ready`` says whether the sink is configured.
+
+        With ``linger_s`` the drainer waits that long after new rows arrive
+        (or until ``batch_size`` of them are waiting) so writes go out in
+        fuller batches.
+        """
+        self._sinks[sink] = SinkState(handler, ready, batch_size or self.batch_size, linger_s)
+
+    def accepts(self, sink: str) -> bool:
+        state = self._sinks.get(sink)
+        return self._conn is not None and state is not None and state.ready()
+
+    @property
+    def active(self) -> bool:
+        return self._conn is not None
+
+    async def start(self) -> None:
+        if not self.enabled or self._conn is not None:
+            return
+        await asyncio.to_thread(self._open)
+        for sink, state in self._sinks.items():
+            if state.ready():
+                state.task = asyncio.create_task(self._drain(sink, state))
+        logger.info("Outbox at %s draining to %s", self.path, ", ".join(s for s, st in self._sinks.items() if st.task))
+
+    async def put(self, entries: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """Durably record ``(sink, payload)`` writes; returns once they are committed."""
+        if not entries:
+            return
+        rows = [(sink, json.dumps(payload, default=str)) for sink, payload in entries]
+        await asyncio.to_thread(self._insert, rows)
+        for sink, _ in entries:
+            state = self._sinks[sink]
+            state.enqueued += 1
+            state.unclaimed += 1
+            state.wakeup.set()
+            if state.unclaimed >= state.batch_size:
+                state.full.set()
+
+    async def _deliver(self, sink: str, state: SinkState, rows: List[Tuple[int, int, str]]) -> bool:
+        try:
+            await state.handler([json.loads(payload) for _, _, payload in rows])
+        except Exception as e:
+            state.failures += 1
+            state.last_error = str(e)
+            dead = await asyncio.to_thread(self._fail, rows, str(e)[:500])
+            state.dead_lettered += dead
+            logger.warning("Outbox %s batch of %s failed (%s dead-lettered): %s", sink, len(rows), dead, e)
+            return False
+        await asyncio.to_thread(self._delete, [row[0] for row in rows])
+        state.batches += 1
+        state.delivered += len(rows)
+        return True
+
+    async def _drain(self, sink: str, state: SinkState) -> None:
+        while True:
+            # Cleared before claiming so rows put during the claim/delivery still wake us
+            state.wakeup.clear()
+            state.full.clear()
+            state.unclaimed = 0
+            try:
+                rows = await asyncio.to_thread(self._claim, sink, state.batch_size)
+                if rows:
+                    await self._deliver(sink, state, rows)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Outbox %s drainer error: %s", sink, e)
+            try:
+                await asyncio.wait_for(state.wakeup.wait(), timeout=self.poll_interval_s)
+            except asyncio.TimeoutError:
+                continue
+            if state.linger_s > 0:
+                # Flush by size or time, whichever comes first
+                try:
+                    await asyncio.wait_for(state.full.wait(), timeout=state.linger_s)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def flush(self, timeout_s: float = OUTBOX_FLUSH_TIMEOUT_S) -> None:
+        """Deliver everything pending now, ignoring backoff, until empty or ``timeout_s``."""
+        if self._conn is None:
+            return
+        deadline = time.monotonic() + timeout_s
+        for sink, state in self._sinks.items():
+            if not state.ready():
+                continue
+            while time.monotonic() < deadline:
+                rows = await asyncio.to_thread(self._claim, sink, state.batch_size, True)
+                # A failing sink keeps its rows for the next start
+                if not rows or not await self._deliver(sink, state, rows):
+                    break
+
+    async def stop(self) -> None:
+        """Stop the drainers, flush what is pending and close the file."""
+        if self._conn is None:
+            return
+        for state in self._sinks.values():
+            if state.task is not None:
+                state.task.cancel()
+                await asyncio.gather(state.task, return_exceptions=True)
+                state.task = None
+        await self.flush()
+        counts = await asyncio.to_thread(self._counts)
+        left = sum(c["pending"] for c in counts.values())
+        if left:
+            logger.warning("Outbox closed with %s writes pending; they are delivered on next start", left)
+        with self._lock:
+            self._conn.close()
+            self._conn = None
+
+    async def stats(self) -> Dict[str, Any]:
+        # Counting rows is a SQLite query: keep it off the event loop
+        counts = await asyncio.to_thread(self._counts) if self._conn is not None else {}
+        return {
+            "enabled": self.enabled,
+            "active": self._conn is not None,
+            "path": self.path,
+            "sinks": {
+                sink: {
+                    "ready": state.ready(),
+                    "running": state.task is not None,
+                    **counts.get(sink, {"pending": 0, "dead": 0, "oldest_pending_s": None}),
+                    "enqueued": state.enqueued,
+                    "delivered": state.delivered,
+                    "batches": state.batches,
+                    "avg_batch_size": round(state.delivered / state.batches, 2) if state.batches else 0.0,
+                    "failures": state.failures,
+                    "dead_lettered": state.dead_lettered,
+                    "last_error": state.last_error,
+                }
+                for sink, state in self._sinks.items()
+            },
+        }
+
+
+outbox = Outbox()
+
+
+async def init_outbox() -> None:
+    """Route the storage sinks through the outbox and start draining (called after the sinks are initialised)."""
+    outbox.register("mongo", write_analysis_records, ready=db_ready, batch_size=MONGO_BULK_BATCH, linger_s=MONGO_BULK_LINGER_MS / 1000.0)
+    outbox.register("pinecone", write_vectors, ready=vector_store_ready, batch_size=PINECONE_UPSERT_BATCH, linger_s=PINECONE_FLUSH_INTERVAL_MS / 1000.0)
+    outbox.register("neo4j", write_graph_documents, ready=graph_ready, batch_size=NEO4J_BATCH_SIZE, linger_s=NEO4J_FLUSH_INTERVAL_MS / 1000.0)
+    outbox.register("rollups", write_rollups, ready=rollups_ready, batch_size=ROLLUP_BATCH, linger_s=ROLLUP_LINGER_MS / 1000.0)
+    await outbox.start()
+
+
+async def close_outbox() -> None:
+    """Stop the drainers and flush pending writes (called before the sinks close)."""
+    await outbox.stop()
+
+
+def get_outbox() -> Outbox:
+    return outbox
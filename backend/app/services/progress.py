@@ -0,0 +1,104 @@
+import asyncio
+import contextvars
+import json
+import os
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# SSE comment sent when a stream has been quiet this long (keeps proxies from timing it out)
+PROGRESS_HEARTBEAT_S = float(os.getenv("PROGRESS_HEARTBEAT_S", "15"))
+# Characters of scouted text included in the ``scout`` event
+PROGRESS_PREVIEW_CHARS = int(os.getenv("PROGRESS_PREVIEW_CHARS", "280"))
+
+STREAM_FORMATS = ("sse", "ndjson")
+
+_DONE = object()
+
+
+class ProgressStream:
+    """Events of one request's workflow, in the order they were emitted."""
+
+    def __init__(self) -> None:
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self.closed = False
+
+    def put(self, event: str, data: Dict[str, Any]) -> None:
+        if not self.closed:
+            self._queue.put_nowait((event, data))
+
+    def finish(self) -> None:
+        self._queue.put_nowait(_DONE)
+
+    async def get(self, timeout_s: Optional[float] = None) -> Any:
+        return await asyncio.wait_for(self._queue.get(), timeout=timeout_s)
+
+
+# Set only while a streaming request runs its workflow; tasks it creates inherit it
+_stream: contextvars.ContextVar[Optional[ProgressStream]] = contextvars.ContextVar("filtr_progress", default=None)
+
+
+def streaming() -> bool:
+    """Whether the current request streams its progress (so callers can skip building events)."""
+    return _stream.get() is not None
+
+
+def emit(event: str, data: Optional[Dict[str, Any]] = None) -> None:
+    """Send a progress event to the current request's stream; a no-op outside streaming requests."""
+    stream = _stream.get()
+    if stream is not None:
+        stream.put(event, data or {})
+
+
+def format_event(event: str, data: Any, stream_format: str) -> str:
+    payload = json.dumps(data, default=str)
+    if stream_format == "ndjson":
+        return f'{{"event": "{event}", "data": {payload}}}\n'
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+async def stream_workflow(
+    run: Callable[[], Awaitable[Dict[str, Any]]],
+    stream_format: str = "sse",
+    accepted: Optional[Dict[str, Any]] = None,
+) -> AsyncIterator[str]:
+    """Run ``run()`` with a progress stream attached and yield its events as they happen.
+
+    Starts with an ``accepted`` event and ends with ``result`` (or
+    ``error``). If the client goes away the workflow still finishes, so its
+    result is persisted and cached; only the events are dropped.
+    """
+    stream = ProgressStream()
+    token = _stream.set(stream)
+    try:
+        task = asyncio.create_task(run())
+    finally:
+        _stream.reset(token)
+
+    def done(task: asyncio.Task) -> None:
+        if not task.cancelled():
+            task.exception()  # retrieved here so a dropped stream does not log it as unhandled
+        stream.finish()
+
+    task.add_done_callback(done)
+    try:
+        yield format_event("accepted", accepted or {}, stream_format)
+        while True:
+            try:
+                item = await stream.get(PROGRESS_HEARTBEAT_S)
+            except asyncio.TimeoutError:
+                if stream_format == "sse":
+                    yield ": keepalive\n\n"
+                continue
+            if item is _DONE:
+                break
+            yield format_event(*item, stream_format)
+        if task.cancelled():
+            yield format_event("error", {"detail": "Analysis cancelled"}, stream_format)
+        elif task.exception() is not None:
+            yield format_event("error", {"detail": str(task.exception())}, stream_format)
+        else:
+            yield format_event("result", task.result(), stream_format)
+    finally:
+        stream.closed = True
@@ -0,0 +1,325 @@
+import asyncio
+import email.utils
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Retries of a throttled (429) call, as long as its queue deadline allows
+LIMITER_MAX_RETRIES = int(os.getenv("LIMITER_MAX_RETRIES", "3"))
+# Dispatch pause after a 429 that carries no Retry-After
+LIMITER_THROTTLE_PAUSE_S = float(os.getenv("LIMITER_THROTTLE_PAUSE_S", "0.2"))
+
+T = TypeVar("T")
+
+
+class RateLimited(Exception):
+    """A provider rejected a call for exceeding its quota (HTTP 429 / RESOURCE_EXHAUSTED)."""
+
+    def __init__(self, message: str = "rate limited", retry_after_s: Optional[float] = None) -> None:
+        super().__init__(message)
+        self.retry_after_s = retry_after_s
+
+
+class LimiterRejected(Exception):
+    """Raised when a call cannot start before its deadline or the wait queue is full."""
+
+    def __init__(self, limiter: str, reason: str) -> None:
+        super().__init__(f"{limiter} limiter rejected call: {reason}")
+        self.reason = reason
+
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Parse a ``Retry-After`` header (delta-seconds or HTTP-date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """``rate`` tokens per second, holding at most ``burst``; a rate of 0 means unlimited."""
+
+    def __init__(self, rate: float, burst: float = 0.0) -> None:
+        self.rate = rate
+        self.burst = max(1.0, burst or rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token is available."""
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        if self.rate > 0:
+            self._refill(now)
+            self.tokens -= 1
+
+
+class AdaptiveLimiter:
+    """Token bucket plus AIMD concurrency limit in front of one upstream provider.
+
+    Calls wait in a FIFO queue until a token (``rate_per_s`` with ``burst``)
+    and a concurrency slot are both free. The concurrency limit grows by
+    ``1/limit`` per successful call while it is the bottleneck (about one
+    slot per round trip). It is cut by ``backoff`` on a 429 and by
+    ``latency_backoff`` when a call times out or takes longer than
+    ``latency_target_s``, at most once per typical call latency, so a burst
+    of failures from calls already in flight counts as one signal.
+
+    A 429 also pauses dispatch for the provider's Retry-After, and the call
+    is re-queued at the front (up to ``max_retries`` times) as long as its
+    deadline allows. A call that cannot start before its deadline, or that
+    arrives at a full queue, fails fast with ``LimiterRejected`` instead of
+    piling more load onto the provider. Everything runs on the event loop;
+    no locks are needed.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate_per_s: float = 0.0,
+        burst: float = 0.0,
+        max_concurrency: int = 32,
+        min_concurrency: int = 1,
+        latency_target_s: float = 0.0,
+        max_queue: int = 1000,
+        queue_timeout_s: float = 30.0,
+        max_retries: int = LIMITER_MAX_RETRIES,
+        backoff: float = 0.7,
+        latency_backoff: float = 0.9,
+    ) -> None:
+        self.name = name
+        self.bucket = TokenBucket(rate_per_s, burst)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.latency_target_s = latency_target_s
+        self.max_queue = max_queue
+        self.queue_timeout_s = queue_timeout_s
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.latency_backoff = latency_backoff
+        self.limit = float(max_concurrency)
+        self.paused_until = 0.0
+        self.ewma_latency_s: Optional[float] = None
+        self._last_decrease = 0.0
+        self._waiters: Deque[Tuple[float, asyncio.Future]] = deque()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.in_flight = 0
+        self.admitted = 0
+        self.completed = 0
+        self.throttled = 0
+        self.retried = 0
+        self.rejected_queue_full = 0
+        self.rejected_deadline = 0
+        self.decreases = 0
+        self.total_wait_s = 0.0
+        self.max_wait_s = 0.0
+        _limiters[name] = self
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def concurrency_limit(self) -> int:
+        return max(self.min_concurrency, int(self.limit))
+
+    def _ready_in(self, now: float) -> float:
+        return max(self.paused_until - now, self.bucket.wait_time(now))
+
+    def _start(self, now: float) -> None:
+        self.bucket.take(now)
+        self.in_flight += 1
+        self.admitted += 1
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        now = time.monotonic()
+        while self._waiters:
+            _, future = self._waiters[0]
+            if future.done():
+                # Expired or cancelled while queued
+                self._waiters.popleft()
+                continue
+            if self.in_flight >= self.concurrency_limit:
+                return  # the next release dispatches again
+            delay = self._ready_in(now)
+            if delay > 0:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            self._waiters.popleft()
+            self._start(now)
+            future.set_result(None)
+
+    def _forget(self, waiter: Tuple[float, asyncio.Future]) -> None:
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def _expire(self, waiter: Tuple[float, asyncio.Future]) -> None:
+        future = waiter[1]
+        if not future.done():
+            self._forget(waiter)
+            self.rejected_deadline += 1
+            future.set_exception(LimiterRejected(self.name, "deadline exceeded while queued"))
+
+    async def _acquire(self, deadline: float, front: bool = False) -> None:
+        now = time.monotonic()
+        if not self._waiters and self.in_flight < self.concurrency_limit and self._ready_in(now) <= 0:
+            self._start(now)
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.rejected_queue_full += 1
+            raise LimiterRejected(self.name, "queue full")
+        if deadline <= now:
+            self.rejected_deadline += 1
+            raise LimiterRejected(self.name, "deadline exceeded")
+        loop = asyncio.get_running_loop()
+        waiter = (deadline, loop.create_future())
+        if front:
+            self._waiters.appendleft(waiter)
+        else:
+            self._waiters.append(waiter)
+        expiry = loop.call_later(deadline - now, self._expire, waiter)
+        self._dispatch()
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            # Granted a slot just as the caller was cancelled: hand it back
+            if waiter[1].done() and not waiter[1].cancelled() and waiter[1].exception() is None:
+                self._release()
+            else:
+                self._forget(waiter)
+            raise
+        finally:
+            expiry.cancel()
+        waited = time.monotonic() - now
+        self.total_wait_s += waited
+        self.max_wait_s = max(self.max_wait_s, waited)
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        self.completed += 1
+        if self._waiters:
+            self._dispatch()
+
+    def _decrease(self, factor: float, now: float) -> None:
+        if now - self._last_decrease < (self.ewma_latency_s or 1.0):
+            return
+        self.limit = max(float(self.min_concurrency), self.limit * factor)
+        self._last_decrease = now
+        self.decreases += 1
+
+    def _on_success(self, latency_s: float) -> None:
+        now = time.monotonic()
+        self.ewma_latency_s = latency_s if self.ewma_latency_s is None else 0.8 * self.ewma_latency_s + 0.2 * latency_s
+        if self.latency_target_s and latency_s > self.latency_target_s:
+            self._decrease(self.latency_backoff, now)
+        elif self.in_flight >= self.concurrency_limit:
+            self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+
+    def _on_throttled(self, retry_after_s: Optional[float]) -> None:
+        now = time.monotonic()
+        self.throttled += 1
+        self._decrease(self.backoff, now)
+        self.paused_until = max(self.paused_until, now + (retry_after_s if retry_after_s is not None else LIMITER_THROTTLE_PAUSE_S))
+
+    async def run(self, call: Callable[[], Awaitable[T]], deadline: Optional[float] = None) -> T:
+        """Run ``call`` under the limiter.
+
+        ``deadline`` is the ``time.monotonic()`` instant by which the call
+        must have started (default: ``queue_timeout_s`` from now).
+        """
+        deadline = deadline or time.monotonic() + self.queue_timeout_s
+        attempt = 0
+        while True:
+            await self._acquire(deadline, front=attempt > 0)
+            started = time.monotonic()
+            try:
+                result = await call()
+            except RateLimited as e:
+                self._on_throttled(e.retry_after_s)
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self.retried += 1
+                continue
+            except asyncio.TimeoutError:
+                self._decrease(self.latency_backoff, time.monotonic())
+                raise
+            else:
+                self._on_success(time.monotonic() - started)
+                return result
+            finally:
+                self._release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rate_per_s": self.bucket.rate,
+            "burst": self.bucket.burst,
+            "concurrency_limit": round(self.limit, 2),
+            "min_concurrency": self.min_concurrency,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "queue_max": self.max_queue,
+            "admitted": self.admitted,
+            "throttled": self.throttled,
+            "retried": self.retried,
+            "rejected": {"queue_full": self.rejected_queue_full, "deadline": self.rejected_deadline},
+            "decreases": self.decreases,
+            "paused_for_s": round(max(0.0, self.paused_until - time.monotonic()), 3),
+            "avg_wait_s": round(self.total_wait_s / self.admitted, 4) if self.admitted else 0.0,
+            "max_wait_s": round(self.max_wait_s, 4),
+            "ewma_latency_s": round(self.ewma_latency_s, 4) if self.ewma_latency_s is not None else None,
+        }
+
+
+_limiters: Dict[str, AdaptiveLimiter] = {}
+
+
+def limiter_stats() -> Dict[str, Any]:
+    return {name: limiter.stats() for name, limiter in sorted(_limiters.items())}
+
+
+def render_prometheus() -> str:
+    """Limiter gauges and counters in the Prometheus text format (appended to ``/metrics``)."""
+    limiters = sorted(_limiters.items())
+    lines: List[str] = []
+
+    def family(metric: str, kind: str, help_text: str, value: Callable[[AdaptiveLimiter], float]) -> None:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        lines.extend(f'{metric}{{limiter="{name}"}} {value(limiter)}' for name, limiter in limiters)
+
+    family("filtr_limiter_queue_depth", "gauge", "Calls waiting for a provider slot.", lambda l: l.queue_depth)
+    family("filtr_limiter_in_flight", "gauge", "Provider calls currently running.", lambda l: l.in_flight)
+    family("filtr_limiter_concurrency_limit", "gauge", "Current AIMD concurrency limit.", lambda l: round(l.limit, 2))
+    family("filtr_limiter_admitted_total", "counter", "Calls admitted to the provider.", lambda l: l.admitted)
+    family("filtr_limiter_throttled_total", "counter", "Calls the provider answered with 429.", lambda l: l.throttled)
+    lines.append("# HELP filtr_limiter_rejected_total Calls rejected before reaching the provider.")
+    lines.append("# TYPE filtr_limiter_rejected_total counter")
+    for name, limiter in limiters:
+        lines.append(f'filtr_limiter_rejected_total{{limiter="{name}",reason="queue_full"}} {limiter.rejected_queue_full}')
+        lines.append(f'filtr_limiter_rejected_total{{limiter="{name}",reason="deadline"}} {limiter.rejected_deadline}')
+    return "\n".join(lines) + "\n" if lines else ""
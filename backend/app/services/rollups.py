@@ -0,0 +1,399 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ReplaceOne, UpdateOne
+
+from . import db
+from .metrics import metrics
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Outbox batching for rollup increments (more events per batch = fewer $inc upserts)
+ROLLUP_BATCH = int(os.getenv("ROLLUP_BATCH", "1000"))
+ROLLUP_LINGER_MS = float(os.getenv("ROLLUP_LINGER_MS", "1000"))
+# How long fine-grained buckets are kept (0 = forever); day buckets are never expired
+ROLLUP_MINUTE_RETENTION_H = float(os.getenv("ROLLUP_MINUTE_RETENTION_H", "48"))
+ROLLUP_HOUR_RETENTION_D = float(os.getenv("ROLLUP_HOUR_RETENTION_D", "90"))
+# Most buckets a single stats read may span
+ROLLUP_MAX_BUCKETS = int(os.getenv("ROLLUP_MAX_BUCKETS", "1500"))
+# The backfill leaves buckets this close to "now" to the live counters
+ROLLUP_BACKFILL_GRACE_S = float(os.getenv("ROLLUP_BACKFILL_GRACE_S", "300"))
+
+# granularity -> (key prefix, bucket size in seconds, default read window in buckets)
+GRANULARITIES = {
+    "minute": ("m", 60, 60),
+    "hour": ("h", 3600, 24),
+    "day": ("d", 86400, 30),
+}
+DIMENSIONS = ("verdict", "input_type", "sentiment", "domain")
+
+rollup_collection: Optional[AsyncIOMotorCollection] = None
+
+
+def _retention_s(granularity: str) -> float:
+    if granularity == "minute":
+        return ROLLUP_MINUTE_RETENTION_H * 3600
+    if granularity == "hour":
+        return ROLLUP_HOUR_RETENTION_D * 86400
+    return 0.0
+
+
+def _escape(value: str) -> str:
+    # Counter values become field names: no "." or leading "$" allowed
+    return value.replace("%", "%25").replace(".", "%2E").replace("$", "%24")
+
+
+def _unescape(value: str) -> str:
+    return value.replace("%2E", ".").replace("%24", "$").replace("%25", "%")
+
+
+def source_domain(url: Optional[str]) -> Optional[str]:
+    """Host of ``url`` without a leading ``www.``, lowercased."""
+    if not url:
+        return None
+    try:
+        host = urlparse(url if "//" in url else f"//{url}").hostname
+    except ValueError:
+        return None
+    if not host:
+        return None
+    return host[4:] if host.startswith("www.") else host
+
+
+def rollup_event(
+    created_at: float,
+    input_type: str,
+    verdict: Optional[str],
+    sentiment: Optional[str],
+    url: Optional[str] = None,
+) -> Dict[str, Any]:
+    """The dimensions one analysis contributes to the rollups."""
+    return {
+        "ts": created_at,
+        "verdict": verdict or "Unknown",
+        "input_type": input_type,
+        "sentiment": sentiment or "unknown",
+        "domain": source_domain(url),
+    }
+
+
+def aggregate(events: List[Dict[str, Any]], granularities: Tuple[str, ...] = tuple(GRANULARITIES)) -> Dict[str, Dict[str, Any]]:
+    """Fold events into bucket documents keyed by ``<prefix>:<bucket start>``."""
+    buckets: Dict[str, Dict[str, Any]] = {}
+    for event in events:
+        for granularity in granularities:
+            prefix, size, _ = GRANULARITIES[granularity]
+            start = int(event["ts"] // size * size)
+            key = f"{prefix}:{start}"
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = {"granularity": granularity, "start": start, "n": 0, "c": {dim: {} for dim in DIMENSIONS}}
+            bucket["n"] += 1
+            for dim in DIMENSIONS:
+                value = event.get(dim)
+                if value:
+                    counts = bucket["c"][dim]
+                    value = _escape(str(value))
+                    counts[value] = counts.get(value, 0) + 1
+    return buckets
+
+
+def _bucket_fields(bucket: Dict[str, Any]) -> Dict[str, Any]:
+    """Fields set once when a bucket document is created."""
+    fields: Dict[str, Any] = {
+        "g": GRANULARITIES[bucket["granularity"]][0],
+        "t": datetime.utcfromtimestamp(bucket["start"]),
+    }
+    retention = _retention_s(bucket["granularity"])
+    if retention:
+        fields["expires_at"] = datetime.utcfromtimestamp(bucket["start"] + GRANULARITIES[bucket["granularity"]][1] + retention)
+    return fields
+
+
+def rollups_ready() -> bool:
+    return rollup_collection is not None
+
+
+async def init_rollups() -> None:
+    """Open the rollup collection and its indexes (called after ``init_db``)."""
+    global rollup_collection
+    if db.mongo_db is None:
+        return
+    try:
+        collection = db.mongo_db.analysis_rollups
+        await collection.create_index([("g", 1), ("t", 1)])
+        # Minute/hour buckets carry expires_at; day buckets never expire
+        await collection.create_index("expires_at", expireAfterSeconds=0)
+        rollup_collection = collection
+    except Exception as e:
+        logger.error("Failed to initialise analysis rollups: %s", e)
+
+
+async def write_rollups(events: List[Dict[str, Any]]) -> None:
+    """
+    Add events queued by the outbox to their minute/hour/day buckets.
+
+    A batch becomes one ``$inc`` upsert per touched bucket, sent as a single
+    unordered bulk write. Delivery is at-least-once, so a batch replayed
+    after a crash is counted twice; ``RollupBackfill`` rebuilds closed
+    buckets exactly. Raises on failure so the outbox retries.
+    """
+    if rollup_collection is None or not events:
+        return
+    operations = []
+    for key, bucket in aggregate(events).items():
+        increments = {"n": bucket["n"]}
+        for dim, counts in bucket["c"].items():
+            for value, count in counts.items():
+                increments[f"c.{dim}.{value}"] = count
+        operations.append(UpdateOne({"_id": key}, {"$inc": increments, "$setOnInsert": _bucket_fields(bucket)}, upsert=True))
+    with metrics.span("mongo", "dependency"):
+        await rollup_collection.bulk_write(operations, ordered=False)
+
+
+def _window(granularity: str, since: Optional[datetime], until: Optional[datetime]) -> Tuple[int, int]:
+    _, size, default_buckets = GRANULARITIES[granularity]
+    end = until.replace(tzinfo=until.tzinfo or timezone.utc).timestamp() if until else time.time()
+    # The bucket holding ``until`` is included
+    end = int(end // size * size) + size
+    if since:
+        start = int(since.replace(tzinfo=since.tzinfo or timezone.utc).timestamp() // size * size)
+    else:
+        start = end - default_buckets * size
+    if start >= end:
+        raise ValueError("since must be before until")
+    if (end - start) // size > ROLLUP_MAX_BUCKETS:
+        raise ValueError(f"Window spans more than {ROLLUP_MAX_BUCKETS} {granularity} buckets")
+    return start, end
+
+
+def _top(counts: Dict[str, int], limit: int) -> Dict[str, int]:
+    return dict(sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit])
+
+
+async def get_stats(
+    granularity: str = "hour",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    top_domains: int = 10,
+) -> Dict[str, Any]:
+    """
+    Analysis counts per bucket plus window totals, read from the rollups.
+
+    Reads one small document per bucket (never the raw records), so the
+    cost depends only on the number of buckets in the window.
+
+    Args:
+        granularity: minute, hour or day
+        since: Start of the window (default: the last 60 minutes / 24 hours / 30 days)
+        until: End of the window (default: now); its bucket is included
+        top_domains: How many source domains to report per bucket and in the totals
+
+    Raises:
+        ValueError: On an unknown granularity or an empty/oversized window
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    prefix, size, _ = GRANULARITIES[granularity]
+    start, end = _window(granularity, since, until)
+
+    with metrics.span("mongo", "dependency"):
+        documents = await (
+            rollup_collection.find(
+                {"g": prefix, "t": {"$gte": datetime.utcfromtimestamp(start), "$lt": datetime.utcfromtimestamp(end)}},
+                projection={"_id": 0, "t": 1, "n": 1, "c": 1},
+            )
+            .sort("t", 1)
+            .to_list(length=None)
+        )
+    by_start = {int(doc["t"].replace(tzinfo=timezone.utc).timestamp()): doc for doc in documents}
+
+    totals: Dict[str, Any] = {"total": 0, **{dim: {} for dim in DIMENSIONS}}
+    series = []
+    # Empty buckets are filled with zeros so charts get an evenly spaced series
+    for bucket_start in range(start, end, size):
+        doc = by_start.get(bucket_start, {})
+        counts = doc.get("c", {})
+        entry: Dict[str, Any] = {
+            "t": datetime.fromtimestamp(bucket_start, timezone.utc).isoformat(),
+            "total": doc.get("n", 0),
+        }
+        for dim in DIMENSIONS:
+            values = {_unescape(value): count for value, count in counts.get(dim, {}).items()}
+            entry[dim] = _top(values, top_domains) if dim == "domain" else values
+            for value, count in values.items():
+                totals[dim][value] = totals[dim].get(value, 0) + count
+        totals["total"] += entry["total"]
+        series.append(entry)
+    totals["domain"] = _top(totals["domain"], top_domains)
+
+    return {
+        "granularity": granularity,
+        "since": datetime.fromtimestamp(start, timezone.utc).isoformat(),
+        "until": datetime.fromtimestamp(end, timezone.utc).isoformat(),
+        "totals": totals,
+        "buckets": series,
+    }
+
+
+class RollupBackfill:
+    """Rebuilds the rollups from ``analysis_records``.
+
+    Streams the records (with a small projection) once, folds them into
+    bucket documents in memory and replaces the stored buckets wholesale,
+    deleting buckets that no longer have any records. Only buckets that
+    closed at least ``grace_s`` before the run started are rebuilt; the
+    current ones keep their live counters, so the rebuild does not race
+    the outbox. Minute and hour buckets are only rebuilt inside their
+    retention window, which also bounds the memory used.
+    """
+
+    def __init__(self, grace_s: float = ROLLUP_BACKFILL_GRACE_S, write_batch: int = 500) -> None:
+        self.grace_s = grace_s
+        self.write_batch = write_batch
+        self._task: Optional[asyncio.Task] = None
+        self.status = "idle"
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.records_scanned = 0
+        self.buckets_written = 0
+        self.buckets_deleted = 0
+        self.error: Optional[str] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> bool:
+        """Start a rebuild in the background; False if one is already running."""
+        if self.running:
+            return False
+        self.status = "running"
+        self.started_at = time.time()
+        self.finished_at = None
+        self.records_scanned = 0
+        self.buckets_written = 0
+        self.buckets_deleted = 0
+        self.error = None
+        self._task = asyncio.create_task(self._run())
+        return True
+
+    async def stop(self) -> None:
+        if self.running:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self.status = "cancelled"
+
+    async def _run(self) -> None:
+        try:
+            await self.rebuild()
+            self.status = "completed"
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.status = "failed"
+            self.error = str(e)
+            logger.error("Rollup backfill failed: %s", e)
+        finally:
+            self.finished_at = time.time()
+
+    def _ranges(self, now: float) -> Dict[str, Tuple[float, int]]:
+        # granularity -> [first bucket start kept, end of the last closed bucket)
+        ranges = {}
+        for granularity, (_, size, _) in GRANULARITIES.items():
+            closed_end = int((now - self.grace_s) // size * size)
+            retention = _retention_s(granularity)
+            first = closed_end - retention if retention else float("-inf")
+            ranges[granularity] = (first, closed_end)
+        return ranges
+
+    async def rebuild(self) -> None:
+        # llm_agent imports this module (through the outbox); import lazily
+        from .llm_agent import sentiment_label
+
+        if db.analysis_collection is None or rollup_collection is None:
+            raise RuntimeError("Database not configured")
+        ranges = self._ranges(self.started_at or time.time())
+        scan_end = max(end for _, end in ranges.values())
+
+        buckets: Dict[str, Dict[str, Any]] = {}
+        cursor = db.analysis_collection.find(
+            {"created_at": {"$lt": datetime.utcfromtimestamp(scan_end)}},
+            projection={"_id": 0, "created_at": 1, "input_type": 1, "payload.url": 1, "result.verdict": 1, "result.sentiment": 1},
+        )
+        async for record in cursor:
+            result = record.get("result") or {}
+            ts = record["created_at"].replace(tzinfo=timezone.utc).timestamp()
+            granularities = tuple(g for g, (first, end) in ranges.items() if first <= ts < end)
+            if not granularities:
+                continue
+            event = rollup_event(
+                ts,
+                record.get("input_type"),
+                result.get("verdict"),
+                sentiment_label(result.get("sentiment") or {}),
+                (record.get("payload") or {}).get("url"),
+            )
+            for key, bucket in aggregate([event], granularities).items():
+                current = buckets.get(key)
+                if current is None:
+                    buckets[key] = bucket
+                    continue
+                current["n"] += bucket["n"]
+                for dim, counts in bucket["c"].items():
+                    for value, count in counts.items():
+                        current["c"][dim][value] = current["c"][dim].get(value, 0) + count
+            self.records_scanned += 1
+
+        operations = [
+            ReplaceOne({"_id": key}, {"_id": key, **_bucket_fields(bucket), "n": bucket["n"], "c": bucket["c"]}, upsert=True)
+            for key, bucket in buckets.items()
+        ]
+        for offset in range(0, len(operations), self.write_batch):
+            chunk = operations[offset:offset + self.write_batch]
+            with metrics.span("mongo", "dependency"):
+                await rollup_collection.bulk_write(chunk, ordered=False)
+            self.buckets_written += len(chunk)
+
+        # Closed buckets in the rebuilt ranges without any records left
+        for granularity, (first, end) in ranges.items():
+            prefix = GRANULARITIES[granularity][0]
+            window: Dict[str, Any] = {"$lt": datetime.utcfromtimestamp(end)}
+            if first != float("-inf"):
+                window["$gte"] = datetime.utcfromtimestamp(first)
+            keep = [key for key, bucket in buckets.items() if bucket["granularity"] == granularity]
+            with metrics.span("mongo", "dependency"):
+                deleted = await rollup_collection.delete_many({"g": prefix, "t": window, "_id": {"$nin": keep}})
+            self.buckets_deleted += deleted.deleted_count
+        logger.info("Rollup backfill rebuilt %s buckets from %s records", self.buckets_written, self.records_scanned)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "records_scanned": self.records_scanned,
+            "buckets_written": self.buckets_written,
+            "buckets_deleted": self.buckets_deleted,
+            "error": self.error,
+        }
+
+
+rollup_backfill = RollupBackfill()
+
+
+async def close_rollups() -> None:
+    """Cancel a running backfill (called before the database closes)."""
+    await rollup_backfill.stop()
+
+
+def get_rollup_backfill() -> RollupBackfill:
+    return rollup_backfill
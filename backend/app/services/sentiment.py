@@ -0,0 +1,301 @@
+"""In-process sentiment scoring: a linear model over hashed word features.
+
+Text is tokenized into words and clause punctuation. Every word is hashed
+(``local_embedder.hash_tokens``) to a bucket and a sign of a fixed-size
+weight vector; words inside a negation scope (up to three words after
+"not", "never", "n't", ... within the same clause) are rehashed into a
+separate feature space, and words right after an intensifier count 1.5x. A text's
+score is the signed sum of its words' weights, squashed to a ``compound``
+in [-1, 1] as VADER does (``s / sqrt(s^2 + 15)``); ``evidence`` counts the
+words that carried any weight.
+
+The default weights come from the built-in lexicon below (a negated word
+gets -0.75x its weight). A trained linear model over the same features can
+be loaded instead from ``SENTIMENT_MODEL_PATH`` (an ``.npz`` with a
+``weights`` array). Many texts (or paragraphs) are scored in one
+vectorized pass, so batching costs almost nothing per extra text.
+"""
+import asyncio
+import math
+import os
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .cache import normalize_text
+from .local_embedder import hash_tokens, rehash
+from dotenv import load_dotenv
+load_dotenv()
+
+SENTIMENT_HASH_DIM = int(os.getenv("SENTIMENT_HASH_DIM", str(1 << 20)))
+SENTIMENT_MODEL_PATH = os.getenv("SENTIMENT_MODEL_PATH", "")
+# |compound| below this is neutral
+SENTIMENT_NEUTRAL_BAND = float(os.getenv("SENTIMENT_NEUTRAL_BAND", "0.05"))
+# Per-paragraph scores are reported for at most this many paragraphs
+SENTIMENT_MAX_PARAGRAPHS = int(os.getenv("SENTIMENT_MAX_PARAGRAPHS", "50"))
+SENTIMENT_BATCH_MAX = int(os.getenv("SENTIMENT_BATCH_MAX", "256"))
+
+LABELS = ("negative", "neutral", "positive")
+
+_LEXICON = {
+    3.0: """excellent outstanding superb wonderful fantastic amazing brilliant exceptional magnificent
+        triumph breakthrough delighted thrilled love loved loves beloved heroic miraculous""",
+    2.0: """good great happy pleased glad success successful win wins won winning celebrate celebrated
+        beautiful impressive positive praised praise enjoy enjoyed remarkable excited exciting proud
+        hope hopeful optimistic recovery recovered thriving honest trustworthy reliable accurate
+        effective safe benefit benefits beneficial helpful kind generous best better improved improve
+        improvement perfect strong favorable relief agreed approve approved support supported""",
+    1.0: """nice fine fair okay ok like liked calm stable growth gain gains grow grew rise rising
+        peace peaceful progress useful clear confident confirmed credible fun easy welcome welcomed
+        interesting friendly respect respected secure protect protected solved healthy fresh
+        cheap affordable boost boosted""",
+    -1.0: """concern concerns concerned doubt doubts doubtful unclear risk risky decline declined fall
+        fell drop dropped slow weak delay delayed difficult problem problems issue issues critics
+        criticism criticized controversial questionable dispute disputed denied deny expensive boring
+        confusing confused worry worried uncertain unstable loss losses lost fails""",
+    -2.0: """bad poor sad angry anger fear afraid scared fail failed failure wrong false misleading
+        dangerous danger threat threatens threatened crisis collapse collapsed damage damaged harm
+        harmful hurt injured attack attacked violence violent corrupt corruption lie lies lied lying
+        fake hoax scam fraud fraudulent conspiracy propaganda outrage outraged shocking scandal
+        worse disappointing disappointed hate hated unfair illegal crime criminal toxic panic
+        deadly killed victims suffer suffering""",
+    -3.0: """terrible horrible awful disgusting disaster disastrous catastrophe catastrophic tragic
+        tragedy devastating devastated atrocity evil worst hateful abuse abused massacre murder
+        murdered horrific appalling""",
+}
+_NEGATORS = "not n't no never nor none nobody nothing neither nowhere cannot without hardly barely".split()
+_INTENSIFIERS = "very really extremely incredibly highly deeply truly absolutely totally so too most".split()
+_PUNCT = list(".!?;:,")
+_NEGATED_WEIGHT = -0.75
+_INTENSIFIER_BOOST = 1.5
+_NEGATION_SCOPE = 3
+_CLASS_SLOTS = 4096
+_IS_PUNCT, _IS_NEGATOR, _IS_INTENSIFIER = 1, 2, 3
+# Salt of the negated-word feature space
+_NEGATED_SALT = 0x6E6F74
+
+# Words and clause punctuation; "n't" is split off as its own token first ("don't" -> "do n't")
+_TOKEN = re.compile(r"n't|[^\W\d_]+(?:'[^\W\d_]+)?|[.!?;:,]")
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n|\r\n\s*\r\n")
+
+
+def _buckets(hashes: np.ndarray, dim: int) -> Tuple[np.ndarray, np.ndarray]:
+    return (hashes % np.uint64(dim)).astype(np.int64), np.where(hashes >> np.uint64(63), -1.0, 1.0)
+
+
+def lexicon_weights(dim: int = SENTIMENT_HASH_DIM) -> np.ndarray:
+    """Hashed weight vector of the built-in lexicon (plain and negated features)."""
+    words: List[str] = []
+    scores: List[float] = []
+    for score, group in _LEXICON.items():
+        for word in group.split():
+            words.append(word)
+            scores.append(score)
+    weights = np.zeros(dim, dtype=np.float32)
+    values = np.asarray(scores, dtype=np.float32)
+    hashes = hash_tokens(words)
+    for features, factor in ((hashes, 1.0), (rehash(hashes, _NEGATED_SALT), _NEGATED_WEIGHT)):
+        buckets, signs = _buckets(features, dim)
+        np.add.at(weights, buckets, values * factor * signs)
+    return weights
+
+
+def split_paragraphs(text: str) -> List[str]:
+    paragraphs = [p for p in _PARAGRAPH_BREAK.split(text or "") if p.strip()]
+    if len(paragraphs) <= 1:
+        # Extracted article text often separates paragraphs by single newlines
+        paragraphs = [p for p in (text or "").splitlines() if p.strip()]
+    return paragraphs or [text or ""]
+
+
+def compound(score: float) -> float:
+    return score / math.sqrt(score * score + 15.0)
+
+
+def label_of(value: float) -> str:
+    if value >= SENTIMENT_NEUTRAL_BAND:
+        return "positive"
+    if value <= -SENTIMENT_NEUTRAL_BAND:
+        return "negative"
+    return "neutral"
+
+
+def label_scores(value: float) -> List[Dict[str, Any]]:
+    """negative/neutral/positive probabilities whose argmax agrees with ``label_of``."""
+    logits = np.array([-value - SENTIMENT_NEUTRAL_BAND, 0.0, value - SENTIMENT_NEUTRAL_BAND]) * 10.0
+    probs = np.exp(logits - logits.max())
+    probs /= probs.sum()
+    return [{"label": label, "score": round(float(p), 4)} for label, p in zip(LABELS, probs)]
+
+
+class SentimentModel:
+    """Weight vector over hashed (word, negated) features; see the module docstring."""
+
+    def __init__(self, weights: np.ndarray, name: str) -> None:
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.dim = len(self.weights)
+        self.name = name
+        # Function-word classes, looked up by hash in a small open table (exact: full hashes are compared)
+        self._class_hashes = np.zeros(_CLASS_SLOTS, dtype=np.uint64)
+        self._classes = np.zeros(_CLASS_SLOTS, dtype=np.int8)
+        for code, words in ((_IS_PUNCT, _PUNCT), (_IS_NEGATOR, _NEGATORS), (_IS_INTENSIFIER, _INTENSIFIERS)):
+            hashes = hash_tokens(words)
+            slots = (hashes % np.uint64(_CLASS_SLOTS)).astype(np.int64)
+            if self._classes[slots].any() or len(set(slots.tolist())) < len(slots):
+                raise ValueError("Function-word hash slots collide; change _CLASS_SLOTS")
+            self._class_hashes[slots] = hashes
+            self._classes[slots] = code
+
+    @classmethod
+    def load(cls, path: str = SENTIMENT_MODEL_PATH) -> "SentimentModel":
+        if path:
+            with np.load(path) as data:
+                return cls(data["weights"], f"linear:{os.path.basename(path)}")
+        return cls(lexicon_weights(), "lexicon")
+
+    def score(self, texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Raw score sums and evidence counts of ``texts``, in one vectorized pass."""
+        tokens: List[str] = []
+        doc_lengths = []
+        for text in texts:
+            found = _TOKEN.findall(normalize_text(text).replace("\u2019", "'").replace("n't", " n't"))
+            tokens.extend(found)
+            doc_lengths.append(len(found))
+        sums = np.zeros(len(texts), dtype=np.float64)
+        evidence = np.zeros(len(texts), dtype=np.int64)
+        if not tokens:
+            return sums, evidence
+
+        n = len(tokens)
+        idx = np.arange(n, dtype=np.float64)
+        doc_of = np.repeat(np.arange(len(texts)), doc_lengths)
+        starts = np.cumsum([0] + doc_lengths[:-1])
+        doc_start = np.zeros(n, dtype=bool)
+        doc_start[starts[starts < n]] = True
+        hashes = hash_tokens(tokens)
+        slots = (hashes % np.uint64(_CLASS_SLOTS)).astype(np.int64)
+        classes = np.where(self._class_hashes[slots] == hashes, self._classes[slots], 0)
+        is_punct = classes == _IS_PUNCT
+        is_negator = classes == _IS_NEGATOR
+        is_intensifier = classes == _IS_INTENSIFIER
+
+        # Negation scope: a few words after the last negator, not across a clause or text boundary
+        last_negator = np.maximum.accumulate(np.where(is_negator, idx, -np.inf))
+        last_break = np.maximum.accumulate(np.where(is_punct, idx, np.where(doc_start, idx - 0.5, -np.inf)))
+        negated = (last_negator > last_break) & (idx > last_negator) & (idx - last_negator <= _NEGATION_SCOPE)
+
+        boost = np.ones(n)
+        boost[1:][is_intensifier[:-1] & ~doc_start[1:]] = _INTENSIFIER_BOOST
+
+        buckets, signs = _buckets(np.where(negated, rehash(hashes, _NEGATED_SALT), hashes), self.dim)
+        values = self.weights[buckets] * signs * boost
+        values[is_punct | is_negator] = 0.0
+        sums += np.bincount(doc_of, weights=values, minlength=len(texts))
+        evidence += np.bincount(doc_of, weights=values != 0, minlength=len(texts)).astype(np.int64)
+        return sums, evidence
+
+    def analyze(self, texts: Sequence[str], paragraphs: bool = True) -> List[Dict[str, Any]]:
+        """Sentiment of each text (``{"raw", "compound", "evidence", "model"[, "paragraphs"]}``).
+
+        With ``paragraphs`` each text is scored per paragraph, all texts'
+        paragraphs in one batch; the text's score is their sum. ``raw``
+        keeps the shape of the HF inference API response, so
+        ``llm_agent.sentiment_label`` reads both.
+        """
+        parts = [split_paragraphs(text) if paragraphs else [text] for text in texts]
+        sums, evidence = self.score([p for text_parts in parts for p in text_parts])
+        results = []
+        offset = 0
+        for text_parts in parts:
+            part_sums = sums[offset:offset + len(text_parts)]
+            part_evidence = evidence[offset:offset + len(text_parts)]
+            offset += len(text_parts)
+            value = compound(float(part_sums.sum()))
+            result: Dict[str, Any] = {
+                "raw": [label_scores(value)],
+                "compound": round(value, 4),
+                "evidence": int(part_evidence.sum()),
+                "model": self.name,
+            }
+            if len(text_parts) > 1:
+                result["paragraphs"] = [
+                    {"index": i, "label": label_of(compound(float(s))), "compound": round(compound(float(s)), 4)}
+                    for i, s in enumerate(part_sums[:SENTIMENT_MAX_PARAGRAPHS])
+                ]
+            results.append(result)
+        return results
+
+
+class SentimentBatcher:
+    """Scores concurrent single-text requests together.
+
+    Requests made during one event-loop iteration (e.g. the items of a
+    batch reaching the sentiment step together) are scored in one
+    vectorized pass on the next iteration, up to ``max_batch`` at a time.
+    Scoring runs on the loop itself: it takes microseconds per text.
+    """
+
+    def __init__(self, max_batch: int = SENTIMENT_BATCH_MAX) -> None:
+        self.max_batch = max_batch
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._scheduled = False
+        self.batches = 0
+        self.texts = 0
+
+    async def analyze(self, text: str) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if not self._scheduled:
+            self._scheduled = True
+            loop.call_soon(self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        self._scheduled = False
+        pending, self._pending = self._pending, []
+        model = get_sentiment_model()
+        for start in range(0, len(pending), self.max_batch):
+            batch = [(text, future) for text, future in pending[start:start + self.max_batch] if not future.done()]
+            if not batch:
+                continue
+            self.batches += 1
+            self.texts += len(batch)
+            try:
+                results = model.analyze([text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model": get_sentiment_model().name,
+            "batches": self.batches,
+            "texts": self.texts,
+            "avg_batch_size": round(self.texts / self.batches, 2) if self.batches else 0.0,
+        }
+
+
+sentiment_model: Optional[SentimentModel] = None
+sentiment_batcher = SentimentBatcher()
+
+
+async def init_sentiment() -> None:
+    global sentiment_model
+    sentiment_model = await asyncio.to_thread(SentimentModel.load)
+
+
+def get_sentiment_model() -> SentimentModel:
+    # Loaded at startup; processes that skip it (workers, benchmarks) load on first use
+    global sentiment_model
+    if sentiment_model is None:
+        sentiment_model = SentimentModel.load()
+    return sentiment_model
+
+
+def get_sentiment_batcher() -> SentimentBatcher:
+    return sentiment_batcher
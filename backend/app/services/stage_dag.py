@@ -0,0 +1,346 @@
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from .metrics import metrics
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# How long a stage waits on optional inputs once everything it requires is ready
+DAG_OPTIONAL_GRACE_S = float(os.getenv("DAG_OPTIONAL_GRACE_S", "1.0"))
+# Hedging: a second attempt starts after the stage's p95 attempt latency,
+# once enough samples exist, for at most this fraction of runs
+DAG_HEDGE_MIN_SAMPLES = int(os.getenv("DAG_HEDGE_MIN_SAMPLES", "20"))
+DAG_HEDGE_MIN_DELAY_S = float(os.getenv("DAG_HEDGE_MIN_DELAY_S", "0.05"))
+DAG_HEDGE_MAX_FRACTION = float(os.getenv("DAG_HEDGE_MAX_FRACTION", "0.1"))
+
+Results = Dict[str, Any]
+
+# Key under which stages find the status of every stage finished so far
+STATUS_KEY = "stage_status"
+
+# time.monotonic() instant by which the current request should be answered
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("filtr_deadline", default=None)
+
+
+def set_deadline(seconds: float) -> contextvars.Token:
+    """Give the current request ``seconds`` to finish; stages and provider calls inherit it."""
+    return _deadline.set(time.monotonic() + seconds)
+
+
+def reset_deadline(token: contextvars.Token) -> None:
+    _deadline.reset(token)
+
+
+def request_deadline() -> Optional[float]:
+    return _deadline.get()
+
+
+def time_left(cap: float) -> float:
+    """``cap`` seconds, or less if the request deadline is closer."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return cap
+    return max(0.0, min(cap, deadline - time.monotonic()))
+
+
+class Stage:
+    """One node of a ``StageGraph``.
+
+    ``run`` receives the results of all stages finished so far (plus the
+    graph inputs, and their statuses under ``STATUS_KEY``) and returns
+    this stage's result. ``fallback`` produces a
+    substitute result when the stage fails or runs out of time; without
+    one such a failure fails the whole run. ``optional`` stages are also
+    degraded to their fallback once they are the only thing a ready
+    consumer is still waiting for. ``hedge`` marks the call as idempotent
+    and safe to issue twice. Stages with ``deadline=False`` ignore the
+    request deadline (quick local work whose result must not be dropped).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        run: Callable[[Results], Awaitable[Any]],
+        deps: Iterable[str] = (),
+        optional: bool = False,
+        fallback: Optional[Callable[[Results], Any]] = None,
+        timeout_s: Optional[float] = None,
+        hedge: bool = False,
+        deadline: bool = True,
+    ) -> None:
+        if optional and fallback is None:
+            raise ValueError(f"Optional stage {name!r} needs a fallback")
+        self.name = name
+        self.run = run
+        self.deps = tuple(deps)
+        self.optional = optional
+        self.fallback = fallback
+        self.timeout_s = timeout_s
+        self.hedge = hedge
+        self.deadline = deadline
+
+
+class StageStats:
+    def __init__(self, reservoir: int = 512) -> None:
+        self.runs = 0
+        self.ok = 0
+        self.degraded = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        # Latencies of successful single attempts (the hedge delay is their p95)
+        self.attempts: Deque[float] = deque(maxlen=reservoir)
+
+    def p95(self) -> Optional[float]:
+        if len(self.attempts) < DAG_HEDGE_MIN_SAMPLES:
+            return None
+        samples = sorted(self.attempts)
+        return samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+    def as_dict(self) -> Dict[str, Any]:
+        p95 = self.p95()
+        return {
+            "runs": self.runs,
+            "ok": self.ok,
+            "degraded": self.degraded,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "attempt_p95_s": round(p95, 4) if p95 is not None else None,
+        }
+
+
+class StageGraph:
+    """Runs a DAG of stages, each as soon as its dependencies have results.
+
+    Every stage runs in its own task inside a ``stage`` span, bounded by
+    its ``timeout_s`` and by the request deadline (``set_deadline``), and
+    falls back or fails when either runs out. Consumers that only wait on
+    optional stages wait at most ``grace_s`` more; then those stages are
+    cancelled and replaced by their fallbacks. The grace period starts once
+    every required stage those optional stages depend on has finished.
+    Hedged stages start a second attempt when the first is slower than
+    their recent p95 (capped at ``DAG_HEDGE_MAX_FRACTION`` of runs); the
+    first success wins and the other attempt is cancelled. Callers sharing capacity across runs (a
+    batch) pass ``limits``: semaphores a stage holds while it runs.
+    """
+
+    def __init__(self, name: str, stages: List[Stage], grace_s: float = DAG_OPTIONAL_GRACE_S) -> None:
+        self.name = name
+        self.stages = {stage.name: stage for stage in stages}
+        self.grace_s = grace_s
+        self._stats = {stage.name: StageStats() for stage in stages}
+        self._check()
+        self._required_upstream = {name: self._upstream(name) for name in self.stages}
+
+    def _check(self) -> None:
+        visiting: Set[str] = set()
+        done: Set[str] = set()
+
+        def visit(name: str) -> None:
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Stage graph {self.name!r} has a cycle through {name!r}")
+            visiting.add(name)
+            for dep in self.stages[name].deps:
+                if dep in self.stages:
+                    visit(dep)
+            visiting.discard(name)
+            done.add(name)
+
+        for name in self.stages:
+            visit(name)
+
+    def _upstream(self, name: str) -> Set[str]:
+        """Non-optional stages ``name`` transitively depends on."""
+        found: Set[str] = set()
+        todo = list(self.stages[name].deps)
+        while todo:
+            dep = todo.pop()
+            if dep in found or dep not in self.stages:
+                continue
+            todo.extend(self.stages[dep].deps)
+            if not self.stages[dep].optional:
+                found.add(dep)
+        return found
+
+    async def run(
+        self,
+        inputs: Results,
+        limits: Optional[Dict[str, asyncio.Semaphore]] = None,
+    ) -> Tuple[Results, Dict[str, str]]:
+        """Run every stage; returns all results and each stage's status (ok|degraded|timeout|failed).
+
+        A stage named in ``limits`` waits for its semaphore before starting
+        (the wait counts against neither the request deadline nor its
+        ``timeout_s``).
+        """
+        missing_inputs = {dep for s in self.stages.values() for dep in s.deps if dep not in self.stages and dep not in inputs}
+        if missing_inputs:
+            raise ValueError(f"Stage graph {self.name!r} is missing inputs: {sorted(missing_inputs)}")
+        status: Dict[str, str] = {}
+        results: Results = {**inputs, STATUS_KEY: status}
+        pending = dict(self.stages)
+        running: Dict[asyncio.Task, Stage] = {}
+        blocked_since: Dict[str, float] = {}
+        try:
+            while pending or running:
+                for name, stage in list(pending.items()):
+                    if all(dep in results for dep in stage.deps):
+                        del pending[name]
+                        limit = (limits or {}).get(name)
+                        running[asyncio.create_task(self._execute(stage, results, limit))] = stage
+                timeout = self._degrade_blockers(pending, running, results, status, blocked_since)
+                if timeout == 0:
+                    continue  # degraded something: start its consumers first
+                if not running:
+                    await asyncio.sleep(timeout or 0)
+                    continue
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    stage = running.pop(task)
+                    results[stage.name], status[stage.name] = task.result()
+        finally:
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+        return results, status
+
+    def _degrade_blockers(
+        self,
+        pending: Dict[str, Stage],
+        running: Dict[asyncio.Task, Stage],
+        results: Results,
+        status: Dict[str, str],
+        blocked_since: Dict[str, float],
+    ) -> Optional[float]:
+        """Degrade optional stages that held a consumer up past the grace period.
+
+        Returns seconds until the next grace period ends (0 if something was
+        just degraded, None if no consumer is waiting on optional stages).
+        """
+        now = time.monotonic()
+        next_check: Optional[float] = None
+        degraded = False
+        for name, stage in list(pending.items()):
+            if name not in pending:
+                continue  # degraded as another consumer's blocker in this pass
+            missing = [dep for dep in stage.deps if dep not in results]
+            if not missing or not all(self.stages[dep].optional for dep in missing):
+                blocked_since.pop(name, None)
+                continue
+            if any(up not in results for dep in missing for up in self._required_upstream[dep]):
+                # An optional stage still waiting on required work is not what holds the consumer up
+                blocked_since.pop(name, None)
+                continue
+            waited = now - blocked_since.setdefault(name, now)
+            if waited < self.grace_s:
+                remaining = self.grace_s - waited
+                next_check = remaining if next_check is None else min(next_check, remaining)
+                continue
+            for dep in missing:
+                self._degrade(self.stages[dep], pending, running, results, status)
+            blocked_since.pop(name, None)
+            degraded = True
+        return 0.0 if degraded else next_check
+
+    def _degrade(
+        self,
+        stage: Stage,
+        pending: Dict[str, Stage],
+        running: Dict[asyncio.Task, Stage],
+        results: Results,
+        status: Dict[str, str],
+    ) -> None:
+        for task, other in list(running.items()):
+            if other is stage:
+                task.cancel()
+                del running[task]
+        pending.pop(stage.name, None)
+        results[stage.name] = stage.fallback(results)
+        status[stage.name] = "degraded"
+        self._stats[stage.name].degraded += 1
+        logger.info("Stage %s/%s degraded: consumers stopped waiting for it", self.name, stage.name)
+
+    async def _execute(self, stage: Stage, results: Results, limit: Optional[asyncio.Semaphore] = None) -> Tuple[Any, str]:
+        stats = self._stats[stage.name]
+        stats.runs += 1
+        budget = float("inf")
+        try:
+            with metrics.span(stage.name, "stage"):
+                # Time spent queued for a shared slot is not charged to the deadline
+                left = time_left(float("inf")) if stage.deadline else float("inf")
+                if limit is not None:
+                    await limit.acquire()
+                try:
+                    # Budgeted from when the stage actually starts
+                    budget = stage.timeout_s if stage.timeout_s is not None else float("inf")
+                    budget = min(budget, left)
+                    if budget == float("inf"):
+                        value = await self._attempt(stage, results)
+                    else:
+                        value = await asyncio.wait_for(self._attempt(stage, results), timeout=budget)
+                finally:
+                    if limit is not None:
+                        limit.release()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            timed_out = isinstance(e, asyncio.TimeoutError)
+            stats.timeouts += timed_out
+            if stage.fallback is None:
+                stats.failed += 1
+                raise
+            stats.degraded += 1
+            if timed_out:
+                logger.warning("Stage %s/%s timed out after %.2fs, using fallback", self.name, stage.name, budget)
+            else:
+                logger.warning("Stage %s/%s failed, using fallback: %s", self.name, stage.name, e)
+            return stage.fallback(results), "timeout" if timed_out else "failed"
+        stats.ok += 1
+        return value, "ok"
+
+    async def _timed_attempt(self, stage: Stage, results: Results) -> Any:
+        started = time.monotonic()
+        value = await stage.run(results)
+        self._stats[stage.name].attempts.append(time.monotonic() - started)
+        return value
+
+    async def _attempt(self, stage: Stage, results: Results) -> Any:
+        stats = self._stats[stage.name]
+        delay = stats.p95() if stage.hedge else None
+        if delay is None:
+            return await self._timed_attempt(stage, results)
+        attempts = [asyncio.create_task(self._timed_attempt(stage, results))]
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=max(delay, DAG_HEDGE_MIN_DELAY_S))
+            if not done and stats.hedged < DAG_HEDGE_MAX_FRACTION * stats.runs:
+                stats.hedged += 1
+                attempts.append(asyncio.create_task(self._timed_attempt(stage, results)))
+            # First success wins; an attempt that failed only counts if all did
+            remaining = set(attempts)
+            while True:
+                done, remaining = await asyncio.wait(remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not attempts[0]:
+                            stats.hedge_wins += 1
+                        return task.result()
+                if not remaining:
+                    return attempts[0].result()
+        finally:
+            for task in attempts:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: stats.as_dict() for name, stats in self._stats.items()}
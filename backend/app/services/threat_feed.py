@@ -0,0 +1,230 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .leader import LeaderLease
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+THREAT_FEED_INTERVAL_S = float(os.getenv("THREAT_FEED_INTERVAL_S", "15"))
+# Recent window compared against a longer baseline window
+THREAT_WINDOW_S = float(os.getenv("THREAT_WINDOW_S", "300"))
+THREAT_BASELINE_S = float(os.getenv("THREAT_BASELINE_S", "3600"))
+THREAT_MIN_SAMPLES = int(os.getenv("THREAT_MIN_SAMPLES", "10"))
+# Minimum absolute rise in the rate and its z-score against the baseline
+THREAT_MIN_SHIFT = float(os.getenv("THREAT_MIN_SHIFT", "0.15"))
+THREAT_Z = float(os.getenv("THREAT_Z", "3.0"))
+THREAT_COOLDOWN_S = float(os.getenv("THREAT_COOLDOWN_S", "300"))
+
+# Event bus topic on which workers share their observation buckets
+THREAT_FEED_TOPIC = "threat_observations"
+
+FALSE_VERDICTS = {"likely false", "misleading"}
+# metric -> (index in a bucket, human readable name)
+METRICS = {
+    "false_verdict_rate": (2, "false/misleading verdicts"),
+    "negative_sentiment_rate": (3, "negative sentiment"),
+}
+
+
+class ThreatFeed:
+    """Detects shifts in recent analyses and publishes them as threat alerts.
+
+    ``observe`` folds every finished analysis into one-second buckets
+    ``[second, total, false_verdicts, negative_sentiment]``. A single producer
+    task compares each rate over the last ``window_s`` with the preceding
+    ``baseline_s`` and publishes a ``threat`` message when it rose by at
+    least ``min_shift`` with a z-score of at least ``z_threshold``.
+
+    With several workers, each shares the buckets it filled since its last
+    check with the others (``receive``), so every worker counts all of the
+    traffic. Only the holder of the ``lease`` runs the detector, so each
+    shift is alerted once; if it exits, another worker takes over with
+    the same counts.
+    """
+
+    def __init__(
+        self,
+        interval_s: float = THREAT_FEED_INTERVAL_S,
+        window_s: float = THREAT_WINDOW_S,
+        baseline_s: float = THREAT_BASELINE_S,
+        min_samples: int = THREAT_MIN_SAMPLES,
+        min_shift: float = THREAT_MIN_SHIFT,
+        z_threshold: float = THREAT_Z,
+        cooldown_s: float = THREAT_COOLDOWN_S,
+    ) -> None:
+        self.interval_s = interval_s
+        self.window_s = window_s
+        self.baseline_s = baseline_s
+        self.min_samples = min_samples
+        self.min_shift = min_shift
+        self.z_threshold = z_threshold
+        self.cooldown_s = cooldown_s
+        # second -> [second, total, false_verdicts, negative_sentiment]
+        self._buckets: Dict[int, List[int]] = {}
+        self._unshared: Dict[int, List[int]] = {}
+        self._last_alert: Dict[str, float] = {}
+        self._publish: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+        self._share: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+        self._lease: Optional[LeaderLease] = None
+        self._task: Optional[asyncio.Task] = None
+        self.observed = 0
+        self.received = 0
+        self.checks = 0
+        self.alerts = 0
+        self.last_alert: Optional[Dict[str, Any]] = None
+
+    def observe(self, verdict: Optional[str], sentiment: Optional[str], now: Optional[float] = None) -> None:
+        counts = [
+            int(now if now is not None else time.time()),
+            1,
+            int((verdict or "").strip().lower() in FALSE_VERDICTS),
+            int(sentiment == "negative"),
+        ]
+        _merge(self._buckets, counts)
+        if self._share is not None:
+            _merge(self._unshared, counts)
+        self.observed += 1
+
+    def take_buckets(self) -> List[List[int]]:
+        """Remove and return every bucket (a job subprocess hands them to its parent)."""
+        buckets, self._buckets = list(self._buckets.values()), {}
+        return buckets
+
+    def merge(self, buckets: List[List[int]]) -> None:
+        """Fold in buckets a job subprocess observed, as if observed here."""
+        for counts in buckets:
+            _merge(self._buckets, counts)
+            if self._share is not None:
+                _merge(self._unshared, counts)
+            self.observed += counts[1]
+
+    def receive(self, data: str) -> None:
+        """Fold in the buckets another worker shared on ``THREAT_FEED_TOPIC``."""
+        try:
+            buckets = json.loads(data)["buckets"]
+        except (ValueError, KeyError, TypeError):
+            return
+        for counts in buckets:
+            _merge(self._buckets, counts)
+            self.received += counts[1]
+
+    def _window_totals(self, now: float) -> tuple:
+        horizon = now - self.window_s - self.baseline_s
+        for second in [second for second in self._buckets if second < horizon]:
+            del self._buckets[second]
+        recent = [0, 0, 0]
+        baseline = [0, 0, 0]
+        for second, total, false_count, negative in self._buckets.values():
+            target = recent if second >= now - self.window_s else baseline
+            target[0] += total
+            target[1] += false_count
+            target[2] += negative
+        return recent, baseline
+
+    def detect(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Threat messages for every metric whose recent rate shifted up."""
+        now = now if now is not None else time.time()
+        self.checks += 1
+        recent, baseline = self._window_totals(now)
+        if recent[0] < self.min_samples or baseline[0] < self.min_samples:
+            return []
+        alerts = []
+        for metric, (index, label) in METRICS.items():
+            p_recent = recent[index - 1] / recent[0]
+            p_base = baseline[index - 1] / baseline[0]
+            # Binomial z-score of the recent rate against the baseline rate (floored to avoid /0)
+            stderr = math.sqrt(max(p_base * (1 - p_base), 0.01) / recent[0])
+            z = (p_recent - p_base) / stderr
+            if p_recent - p_base < self.min_shift or z < self.z_threshold:
+                continue
+            if now - self._last_alert.get(metric, float("-inf")) < self.cooldown_s:
+                continue
+            self._last_alert[metric] = now
+            alerts.append({
+                "type": "threat",
+                "level": "L4" if z >= 2 * self.z_threshold else "L3",
+                "message": f"Rising {label}: {p_recent:.0%} in the last {self.window_s / 60:.0f} min vs {p_base:.0%} baseline",
+                "metric": metric,
+                "recent_rate": round(p_recent, 4),
+                "baseline_rate": round(p_base, 4),
+                "z_score": round(z, 2),
+                "samples": recent[0],
+                "ts": int(now),
+            })
+        return alerts
+
+    def start(
+        self,
+        publish: Callable[[Dict[str, Any]], Awaitable[None]],
+        share: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+        lease: Optional[LeaderLease] = None,
+    ) -> None:
+        """Check every ``interval_s``; ``share`` sends buckets to the other workers, ``lease`` elects the detector."""
+        self._publish = publish
+        self._share = share
+        self._lease = lease
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._lease is not None:
+            self._lease.release()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_s)
+            try:
+                if self._share is not None and self._unshared:
+                    buckets, self._unshared = list(self._unshared.values()), {}
+                    await self._share({"buckets": buckets})
+                if self._lease is not None and not self._lease.try_acquire():
+                    continue
+                for alert in self.detect():
+                    self.alerts += 1
+                    self.last_alert = alert
+                    logger.warning("🚨 [THREATS] %s (z=%s)", alert["message"], alert["z_score"])
+                    await self._publish(alert)
+            except Exception as e:
+                logger.error("Threat feed check failed: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        recent, baseline = self._window_totals(time.time())
+        return {
+            "running": self._task is not None,
+            "detector": self._lease is None or self._lease.held,
+            "interval_s": self.interval_s,
+            "observed": self.observed,
+            "received": self.received,
+            "recent_samples": recent[0],
+            "baseline_samples": baseline[0],
+            "checks": self.checks,
+            "alerts": self.alerts,
+            "last_alert": self.last_alert,
+        }
+
+
+def _merge(buckets: Dict[int, List[int]], counts: List[int]) -> None:
+    bucket = buckets.get(counts[0])
+    if bucket is None:
+        buckets[counts[0]] = list(counts)
+    else:
+        for i in range(1, len(bucket)):
+            bucket[i] += counts[i]
+
+
+threat_feed = ThreatFeed()
+
+
+def get_threat_feed() -> ThreatFeed:
+    return threat_feed
@@ -1,74 +1,357 @@
+import asyncio
+import logging
 import os
-from typing import Any, Dict, List, Tuple
+import random
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
 
-import httpx
-import google.generativeai as genai
+import numpy as np
+
+from .cache import content_hash
+from .llm_client import embedding_client
+from .local_embedder import LOCAL_EMBED_DIM, embed_local
+from .metrics import metrics
 from dotenv import load_dotenv
 load_dotenv()
+
+logger = logging.getLogger(__name__)
+
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY", "")
 PINECONE_INDEX = os.getenv("PINECONE_INDEX", "aletheia")
+PINECONE_UPSERT_BATCH = int(os.getenv("PINECONE_UPSERT_BATCH", "100"))
+PINECONE_FLUSH_INTERVAL_MS = float(os.getenv("PINECONE_FLUSH_INTERVAL_MS", "250"))
+PINECONE_QUEUE_MAX = int(os.getenv("PINECONE_QUEUE_MAX", "10000"))
+PINECONE_UPSERT_RETRIES = int(os.getenv("PINECONE_UPSERT_RETRIES", "3"))
+# "pinecone" (default) or "memory" for the in-process fake index
+VECTOR_INDEX_BACKEND = os.getenv("VECTOR_INDEX_BACKEND", "pinecone").lower()
 
-# Configure Gemini for embeddings
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+# Model tag of the hashed n-gram fallback: same dimension as Gemini, different space
+LOCAL_EMBED_MODEL = f"local-ngram-{LOCAL_EMBED_DIM}"
 
 
-async def embed_texts(texts: List[str]) -> List[Tuple[str, List[float]]]:
-    """Generate real embeddings using Gemini Embeddings API."""
-    vectors: List[Tuple[str, List[float]]] = []
-    
-    if not GEMINI_API_KEY:
-        # Fallback to fake embeddings if no API key
-        for t in texts:
-            vec = [float((sum(bytearray(t.encode("utf-8"))) % 100)) / 100.0] * 1536
-            vectors.append((f"doc-{abs(hash(t))}", vec))
-        return vectors
+def vector_id(text: str) -> str:
+    """Stable vector id (unlike the salted builtin ``hash``, identical across processes)."""
+    return f"doc-{content_hash(text)[:32]}"
+
+
+class Embeddings(list):
+    """``(vector id, vector)`` pairs tagged with the ``model`` that produced them.
+
+    Vectors of different models can share a dimension without sharing a
+    space, so only vectors of the same model may be compared or indexed
+    together; local fallback vectors never leave the process.
+    """
+
+    def __init__(self, pairs: Iterable[Tuple[str, np.ndarray]] = (), model: str = LOCAL_EMBED_MODEL) -> None:
+        super().__init__(pairs)
+        self.model = model
+
+    @property
+    def local(self) -> bool:
+        return self.model == LOCAL_EMBED_MODEL
+
+
+def local_embeddings(texts: List[str]) -> Embeddings:
+    # Local hashed n-gram embeddings, all texts in one vectorized pass
+    matrix = embed_local(texts)
+    return Embeddings(((vector_id(text), row) for text, row in zip(texts, matrix)), LOCAL_EMBED_MODEL)
+
+
+async def embed_texts(texts: List[str]) -> Embeddings:
+    """Generate real embeddings using Gemini Embeddings API.
+
+    All texts go out in one batched, non-blocking call through the shared
+    embedding client. Without a provider (or when it fails) the local
+    hashed n-gram embedder is used instead. Vectors are float32 arrays,
+    tagged with the model that produced them.
+    """
+    if not embedding_client.configured:
+        # Fallback to local embeddings if no API key
+        return local_embeddings(texts)
     
     try:
-        for text in texts:
-            # Use Gemini Embeddings API
-            result = genai.embed_content(
-                model="models/embedding-001",
-                content=text,
-                task_type="retrieval_document"
-            )
-            embedding = result['embedding']
-            doc_id = f"doc-{abs(hash(text))}"
-            vectors.append((doc_id, embedding))
+        embeddings = np.asarray(await embedding_client.embed(texts), dtype=np.float32)
+        return Embeddings(((vector_id(text), embedding) for text, embedding in zip(texts, embeddings)), embedding_client.embed_model)
     except Exception as e:
-        print(f"Embedding error: {e}")
-        # Fallback to fake embeddings on error
-        for t in texts:
-            vec = [float((sum(bytearray(t.encode("utf-8"))) % 100)) / 100.0] * 1536
-            vectors.append((f"doc-{abs(hash(t))}", vec))
-    
-    return vectors
+        logger.warning("Embedding error, using local embeddings: %s", e)
+        # Fallback to local embeddings on error
+        return local_embeddings(texts)
+
+
+class EmbeddingBatcher:
+    """Micro-batches concurrent single-text embedding requests.
+
+    Requests are collected until ``chunk_size`` texts are pending or
+    ``linger_s`` has passed since the first one, then embedded with one
+    provider call. Each request gets back a one-vector ``Embeddings``
+    carrying its batch's model.
+    """
+
+    def __init__(self, chunk_size: int = 32, linger_s: float = 0.02) -> None:
+        self.chunk_size = chunk_size
+        self.linger_s = linger_s
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.texts = 0
+
+    async def embed(self, text: str) -> Embeddings:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.chunk_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.linger_s, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        self.batches += 1
+        self.texts += len(batch)
+        try:
+            vectors = await embed_texts([text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(Embeddings([vector], vectors.model))
+
+
+class InMemoryIndex:
+    """Pinecone-compatible ``upsert`` stand-in for tests and offline runs."""
+
+    def __init__(self, latency_s: float = 0.0) -> None:
+        self.latency_s = latency_s
+        self.vectors: Dict[str, Dict[str, Any]] = {}
+        self.upsert_calls = 0
+
+    def upsert(self, vectors: List[Dict[str, Any]]) -> Dict[str, int]:
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        for vector in vectors:
+            self.vectors[vector["id"]] = vector
+        self.upsert_calls += 1
+        return {"upserted_count": len(vectors)}
+
+
+class VectorUpsertBuffer:
+    """Bounded async buffer that upserts vectors in chunks off the request path.
+
+    Flushes up to ``chunk_size`` vectors at a time, at least every
+    ``flush_interval_s``; failed chunks are retried with backoff. When the
+    queue is full new vectors are dropped (and counted) rather than making
+    the request wait on a slow vector DB.
+    """
 
+    def __init__(
+        self,
+        chunk_size: int = PINECONE_UPSERT_BATCH,
+        flush_interval_s: float = PINECONE_FLUSH_INTERVAL_MS / 1000.0,
+        max_queue: int = PINECONE_QUEUE_MAX,
+        retries: int = PINECONE_UPSERT_RETRIES,
+    ) -> None:
+        self.chunk_size = chunk_size
+        self.flush_interval_s = flush_interval_s
+        self.retries = retries
+        self.index: Any = None
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+        self.enqueued = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.flush_failures = 0
+        self.retried = 0
+        self.vectors_written = 0
+        self.total_flush_s = 0.0
+        self.max_flush_s = 0.0
+        self.max_flush_size = 0
 
-async def upsert_embeddings(vectors: List[Tuple[str, List[float]]]) -> None:
-    """Real Pinecone integration for vector storage."""
-    if not PINECONE_API_KEY or not vectors:
+    def enqueue(self, vector: Dict[str, Any]) -> bool:
+        try:
+            self._queue.put_nowait(vector)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self.enqueued += 1
+        return True
+
+    def start(self, index: Any) -> None:
+        self.index = index
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        # Drain whatever is still queued before shutting down
+        while not self._queue.empty():
+            await self._flush(self._take(self.chunk_size))
+
+    def _take(self, limit: int) -> List[Dict[str, Any]]:
+        chunk = []
+        while len(chunk) < limit and not self._queue.empty():
+            chunk.append(self._queue.get_nowait())
+        return chunk
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            chunk = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval_s
+            try:
+                # Linger until the chunk is full or the interval elapses
+                while len(chunk) < self.chunk_size:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        chunk.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+                    except asyncio.TimeoutError:
+                        break
+                    chunk.extend(self._take(self.chunk_size - len(chunk)))
+            except asyncio.CancelledError:
+                # Shutting down mid-linger: write what we already took
+                await self._flush(chunk)
+                raise
+            await self._flush(chunk)
+
+    async def _flush(self, chunk: List[Dict[str, Any]]) -> None:
+        if not chunk or self.index is None:
+            return
+        started = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            try:
+                # The Pinecone client is synchronous; keep it off the event loop
+                with metrics.span("pinecone", "dependency"):
+                    await asyncio.to_thread(self.index.upsert, vectors=chunk)
+                break
+            except Exception as e:
+                if attempt >= self.retries:
+                    self.flush_failures += 1
+                    logger.warning("Pinecone upsert error (dropping %s vectors): %s", len(chunk), e)
+                    return
+                self.retried += 1
+                await asyncio.sleep(random.uniform(0, 0.2 * (2 ** attempt)))
+        elapsed = time.perf_counter() - started
+        self.flushes += 1
+        self.vectors_written += len(chunk)
+        self.total_flush_s += elapsed
+        self.max_flush_s = max(self.max_flush_s, elapsed)
+        self.max_flush_size = max(self.max_flush_size, len(chunk))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": VECTOR_INDEX_BACKEND,
+            "active": self.index is not None,
+            "queue_depth": self._queue.qsize(),
+            "queue_max": self._queue.maxsize,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+            "flush_failures": self.flush_failures,
+            "retried": self.retried,
+            "vectors_written": self.vectors_written,
+            "avg_flush_size": round(self.vectors_written / self.flushes, 2) if self.flushes else 0.0,
+            "max_flush_size": self.max_flush_size,
+            "avg_flush_s": round(self.total_flush_s / self.flushes, 4) if self.flushes else 0.0,
+            "max_flush_s": round(self.max_flush_s, 4),
+        }
+
+
+upsert_buffer = VectorUpsertBuffer()
+
+
+async def init_vector_store() -> None:
+    """Create the index handle once and start the upsert buffer."""
+    if VECTOR_INDEX_BACKEND == "memory":
+        upsert_buffer.start(InMemoryIndex())
+        logger.info("Using in-memory vector index")
+        return
+    if not PINECONE_API_KEY:
+        logger.warning("PINECONE_API_KEY not configured")
         return
-    
     try:
         from pinecone import Pinecone
-        
+
         pc = Pinecone(api_key=PINECONE_API_KEY)
-        index = pc.Index(PINECONE_INDEX)
-        
-        # Prepare vectors for upsert
-        vectors_to_upsert = [
-            {"id": doc_id, "values": embedding}
-            for doc_id, embedding in vectors
-        ]
-        
-        # Upsert to Pinecone
-        index.upsert(vectors=vectors_to_upsert)
-        print(f"Upserted {len(vectors_to_upsert)} vectors to Pinecone")
-        
+        upsert_buffer.start(pc.Index(PINECONE_INDEX))
+        logger.info("Connected to Pinecone index '%s'", PINECONE_INDEX)
     except Exception as e:
-        print(f"Pinecone upsert error: {e}")
-        # Continue without failing the main workflow
+        logger.error("Failed to initialize Pinecone: %s", e)
+
+
+def vector_store_ready() -> bool:
+    return upsert_buffer.index is not None
+
+
+async def write_vectors(items: List[Dict[str, Any]]) -> None:
+    """Upsert vectors queued by the outbox (each item is ``{"vectors": [...]}``); raises on failure."""
+    index = upsert_buffer.index
+    if index is None:
+        return
+    # Later writes of the same id win, as they would in the index
+    vectors = list({v["id"]: v for item in items for v in item["vectors"]}.values())
+    for start in range(0, len(vectors), upsert_buffer.chunk_size):
+        with metrics.span("pinecone", "dependency"):
+            await asyncio.to_thread(index.upsert, vectors=vectors[start:start + upsert_buffer.chunk_size])
+
+
+async def close_vector_store() -> None:
+    """Flush queued upserts (called at app shutdown)."""
+    await upsert_buffer.stop()
+
+
+async def upsert_embeddings(
+    vectors: List[Tuple[str, Sequence[float]]],
+    metadata: Optional[Dict[str, Any]] = None,
+) -> None:
+    """Queue vectors for the next batched upsert; never blocks the request.
+
+    ``metadata`` (input type, verdict, ...) is attached to every vector along
+    with an ``indexed_at`` timestamp. Local fallback vectors are not
+    upserted (see ``shareable``).
+    """
+    if upsert_buffer.index is None or not shareable(vectors):
+        return
+    
+    for vector in vector_records(vectors, metadata):
+        upsert_buffer.enqueue(vector)
+
+
+def shareable(vectors: List[Tuple[str, Sequence[float]]]) -> bool:
+    """Whether ``vectors`` belong in shared indexes: only provider embeddings do, never the local fallback."""
+    return bool(vectors) and isinstance(vectors, Embeddings) and not vectors.local
+
+
+def vector_records(
+    vectors: List[Tuple[str, Sequence[float]]],
+    metadata: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """Pinecone upsert records for ``(id, embedding)`` pairs."""
+    vector_metadata = {**(metadata or {}), "indexed_at": int(time.time())}
+    if isinstance(vectors, Embeddings):
+        vector_metadata["embedding_model"] = vectors.model
+    return [
+        {"id": doc_id, "values": np.asarray(embedding, dtype=np.float32).tolist(), "metadata": vector_metadata}
+        for doc_id, embedding in vectors
+    ]
 
 
+def get_upsert_buffer() -> VectorUpsertBuffer:
+    return upsert_buffer
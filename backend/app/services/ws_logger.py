@@ -1,36 +1,172 @@
-import json
+import asyncio
+import logging
+import os
 import time
-from typing import Any, Dict
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
 
+from dotenv import load_dotenv
+load_dotenv()
 
-def _now() -> str:
-    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Minimum level streamed to WebSocket clients (DEBUG is opt-in)
+WS_LOG_LEVEL = os.getenv("WS_LOG_LEVEL", "INFO").upper()
+WS_LOG_BUFFER = int(os.getenv("WS_LOG_BUFFER", "2048"))
+WS_LOG_BATCH = int(os.getenv("WS_LOG_BATCH", "100"))
+WS_LOG_FLUSH_MS = float(os.getenv("WS_LOG_FLUSH_MS", "100"))
 
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARN": 30, "WARNING": 30, "ERROR": 40}
 
-async def send_ws_log(level: str, message: str, extra: Dict[str, Any] | None = None) -> None:
-    """Print a log line and broadcast it to connected WebSocket clients.
+logger = logging.getLogger(__name__)
 
-    level: INFO, DEBUG, WARN, ERROR
-    message: short message
-    extra: optional dict with extra fields
-    """
+# (unix time, level, message, extra) - formatted only when a frame is built
+LogEvent = Tuple[float, str, str, Optional[Dict[str, Any]]]
+
+
+def configure_logging() -> None:
+    """Console logging for the ``app`` package, honouring ``LOG_LEVEL``."""
+    logging.basicConfig(
+        level=LEVELS.get(LOG_LEVEL, logging.INFO),
+        format="[%(asctime)s] %(levelname)s %(name)s: %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+
+
+def _format(event: LogEvent) -> Dict[str, Any]:
+    ts, level, message, extra = event
     log = {
-        "ts": _now(),
+        "ts": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts)),
         "level": level,
         "message": message,
     }
     if extra:
         log.update(extra)
+    return log
+
+
+class LogPipeline:
+    """Streams workflow log events to WebSocket clients off the request path.
+
+    ``emit`` only checks the level and whether anyone is listening, then
+    appends the raw event to a bounded ring buffer; when the buffer is full
+    the oldest event is dropped and counted. One background task drains the
+    buffer every ``flush_interval_s`` (or as soon as ``batch_size`` events
+    are waiting) and sends them as a single ``log_batch`` frame.
+    """
+
+    def __init__(
+        self,
+        capacity: int = WS_LOG_BUFFER,
+        batch_size: int = WS_LOG_BATCH,
+        flush_interval_s: float = WS_LOG_FLUSH_MS / 1000.0,
+        min_level: str = WS_LOG_LEVEL,
+    ) -> None:
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self.min_level = LEVELS.get(min_level, LEVELS["INFO"])
+        self._buffer: Deque[LogEvent] = deque()
+        self._sink: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+        self._has_listeners: Callable[[], bool] = lambda: False
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.accepted = 0
+        self.filtered = 0
+        self.dropped = 0
+        self.frames = 0
+        self.events_sent = 0
+        self.send_errors = 0
+
+    def attach(
+        self,
+        sink: Callable[[Dict[str, Any]], Awaitable[None]],
+        has_listeners: Callable[[], bool],
+    ) -> None:
+        """Route frames to ``sink``; events are skipped while ``has_listeners()`` is false."""
+        self._sink = sink
+        self._has_listeners = has_listeners
+
+    def emit(self, level: str, message: str, extra: Optional[Dict[str, Any]] = None) -> None:
+        if self._task is None or LEVELS.get(level, 0) < self.min_level or not self._has_listeners():
+            self.filtered += 1
+            return
+        if len(self._buffer) >= self.capacity:
+            # Never make the workflow wait on slow clients: lose the oldest event instead
+            self._buffer.popleft()
+            self.dropped += 1
+        self._buffer.append((time.time(), level, message, extra))
+        self.accepted += 1
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self._drain()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval_s)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self._drain()
+
+    async def _drain(self) -> None:
+        while self._buffer:
+            count = min(self.batch_size, len(self._buffer))
+            batch = [_format(self._buffer.popleft()) for _ in range(count)]
+            if self._sink is None:
+                continue
+            try:
+                await self._sink({"type": "log_batch", "payload": batch})
+            except Exception as e:
+                self.send_errors += 1
+                logger.debug("Log frame send failed: %s", e)
+                continue
+            self.frames += 1
+            self.events_sent += len(batch)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None,
+            "min_level": self.min_level,
+            "buffered": len(self._buffer),
+            "capacity": self.capacity,
+            "accepted": self.accepted,
+            "filtered": self.filtered,
+            "dropped": self.dropped,
+            "frames": self.frames,
+            "events_sent": self.events_sent,
+            "avg_frame_size": round(self.events_sent / self.frames, 2) if self.frames else 0.0,
+            "send_errors": self.send_errors,
+        }
+
+
+log_pipeline = LogPipeline()
+
+
+async def send_ws_log(level: str, message: str, extra: Dict[str, Any] | None = None) -> None:
+    """Queue a log event for connected WebSocket clients.
+
+    level: INFO, DEBUG, WARN, ERROR
+    message: short message
+    extra: optional dict with extra fields
+
+    Returns immediately; events below ``WS_LOG_LEVEL`` or sent while nobody
+    is connected cost a couple of comparisons. Console output goes through
+    the ``logging`` module instead.
+    """
+    log_pipeline.emit(level, message, extra)
+
 
-    # Print to console for server-side visibility
-    print(f"[{log['ts']}] {level}: {message}", json.dumps(extra) if extra else "")
-
-    # Broadcast via WebSocket manager if available
-    try:
-        # Lazy import to avoid circular dependency
-        from app.main import get_ws_manager
-        manager = get_ws_manager()
-        await manager.broadcast({"type": "log", "payload": log})
-    except Exception:
-        # Non-fatal: just continue if WS not available
-        pass
+def get_log_pipeline() -> LogPipeline:
+    return log_pipeline
@@ -0,0 +1,245 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Set
+
+from fastapi import WebSocket
+
+from .event_bus import EventBus
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+WS_CLIENT_QUEUE = int(os.getenv("WS_CLIENT_QUEUE", "256"))
+# "drop_oldest" keeps slow clients connected but loses their oldest frames;
+# "disconnect" closes a client as soon as its queue overflows
+WS_SLOW_POLICY = os.getenv("WS_SLOW_POLICY", "drop_oldest").lower()
+
+TOPICS = ("logs", "threats", "jobs")
+# Message "type" -> topic, for callers that broadcast without naming one
+TOPIC_FOR_TYPE = {"log": "logs", "log_batch": "logs", "threat": "threats", "job_result": "jobs"}
+
+
+def parse_topics(raw: Optional[Iterable[str]]) -> Set[str]:
+    """Known topics from a list or comma-separated values; empty means all."""
+    if raw is None:
+        return set(TOPICS)
+    if isinstance(raw, str):
+        raw = raw.split(",")
+    topics = {t.strip().lower() for t in raw} & set(TOPICS)
+    return topics or set(TOPICS)
+
+
+class ClientConnection:
+    """One WebSocket with its own bounded outbound queue and writer task."""
+
+    def __init__(self, websocket: WebSocket, topics: Set[str], max_queue: int) -> None:
+        self.websocket = websocket
+        self.topics = topics
+        self.max_queue = max_queue
+        self.queue: Deque[str] = deque()
+        self.ready = asyncio.Event()
+        self.writer: Optional[asyncio.Task] = None
+        self.connected_at = time.time()
+        self.sent = 0
+        self.dropped = 0
+        self.max_lag = 0
+        self.closed = False
+
+    def as_dict(self) -> Dict[str, Any]:
+        client = self.websocket.client
+        return {
+            "client": f"{client.host}:{client.port}" if client else None,
+            "topics": sorted(self.topics),
+            "lag": len(self.queue),
+            "max_lag": self.max_lag,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "connected_s": round(time.time() - self.connected_at, 1),
+        }
+
+
+class ConnectionManager:
+    """Tracks WebSocket clients and fans messages out without blocking on them.
+
+    ``broadcast`` serializes a message once and appends the same string to
+    the queue of every client subscribed to its topic; it never awaits a
+    socket. Each client has a writer task draining its queue, so a slow
+    client only delays itself. When a queue is full the slow-consumer
+    policy either drops that client's oldest frame or disconnects it.
+
+    With several workers, broadcasts also go out on the event bus and
+    broadcasts from other workers arrive through ``deliver``. Services
+    exchange their own worker-to-worker messages on other topics through
+    ``sharer`` and ``on_bus_topic``; those never reach clients.
+    """
+
+    def __init__(
+        self,
+        max_queue: int = WS_CLIENT_QUEUE,
+        slow_policy: str = WS_SLOW_POLICY,
+    ) -> None:
+        self.max_queue = max_queue
+        self.slow_policy = slow_policy
+        self.clients: Dict[WebSocket, ClientConnection] = {}
+        self.subscribers: Dict[str, Set[ClientConnection]] = {topic: set() for topic in TOPICS}
+        self.broadcasts = 0
+        self.frames_queued = 0
+        self.dropped = 0
+        self.slow_disconnects = 0
+        self.bus = EventBus()
+        self._bus_handlers: Dict[str, Callable[[str], None]] = {}
+
+    async def attach_bus(self, bus: EventBus) -> None:
+        """Exchange broadcasts with other workers through ``bus``."""
+        await bus.start(self.deliver)
+        self.bus = bus
+
+    async def close_bus(self) -> None:
+        await self.bus.stop()
+        self.bus = EventBus()
+
+    def on_bus_topic(self, topic: str, handler: Callable[[str], None]) -> None:
+        """Hand messages other workers ``share`` on ``topic`` to ``handler`` (with the serialized message)."""
+        self._bus_handlers[topic] = handler
+
+    def sharer(self, topic: str) -> Optional[Callable[[Dict[str, Any]], Awaitable[None]]]:
+        """Coroutine function sending a message to the other workers on ``topic``; None when there are none."""
+        if not self.bus.distributed:
+            return None
+
+        async def share(message: Dict[str, Any]) -> None:
+            await self.bus.publish(topic, json.dumps(message))
+
+        return share
+
+    @property
+    def active_connections(self) -> Set[WebSocket]:
+        return set(self.clients)
+
+    def has_subscribers(self, topic: str) -> bool:
+        # Other workers' clients are invisible from here, so assume someone listens
+        return self.bus.distributed or bool(self.subscribers.get(topic))
+
+    async def connect(self, websocket: WebSocket, topics: Optional[Iterable[str]] = None) -> ClientConnection:
+        await websocket.accept()
+        conn = ClientConnection(websocket, parse_topics(topics), self.max_queue)
+        self.clients[websocket] = conn
+        for topic in conn.topics:
+            self.subscribers[topic].add(conn)
+        conn.writer = asyncio.create_task(self._write(conn))
+        return conn
+
+    def disconnect(self, websocket: WebSocket) -> None:
+        conn = self.clients.pop(websocket, None)
+        if conn is None:
+            return
+        conn.closed = True
+        for topic in conn.topics:
+            self.subscribers[topic].discard(conn)
+        if conn.writer is not None and conn.writer is not asyncio.current_task():
+            conn.writer.cancel()
+
+    def subscribe(self, websocket: WebSocket, topics: Iterable[str]) -> None:
+        conn = self.clients.get(websocket)
+        if conn is None:
+            return
+        for topic in parse_topics(topics):
+            conn.topics.add(topic)
+            self.subscribers[topic].add(conn)
+
+    def unsubscribe(self, websocket: WebSocket, topics: Iterable[str]) -> None:
+        conn = self.clients.get(websocket)
+        if conn is None:
+            return
+        for topic in {t.strip().lower() for t in topics} & set(TOPICS):
+            conn.topics.discard(topic)
+            self.subscribers[topic].discard(conn)
+
+    async def broadcast(self, message: Dict[str, Any], topic: Optional[str] = None) -> None:
+        """Queue ``message`` for every subscriber of ``topic`` (inferred from its type)."""
+        topic = topic or TOPIC_FOR_TYPE.get(message.get("type"), "threats")
+        if not self.has_subscribers(topic):
+            return
+        self.broadcasts += 1
+        data = json.dumps(message)
+        self.deliver(topic, data)
+        await self.bus.publish(topic, data)
+
+    def deliver(self, topic: str, data: str) -> None:
+        """Queue an already serialized message for this worker's subscribers."""
+        handler = self._bus_handlers.get(topic)
+        if handler is not None:
+            handler(data)
+            return
+        for conn in list(self.subscribers.get(topic, ())):
+            self._offer(conn, data)
+
+    async def send_to(self, websocket: WebSocket, message: Dict[str, Any]) -> None:
+        """Queue ``message`` for a single client."""
+        conn = self.clients.get(websocket)
+        if conn is not None:
+            self._offer(conn, json.dumps(message))
+
+    def _offer(self, conn: ClientConnection, data: str) -> None:
+        if len(conn.queue) >= conn.max_queue:
+            if self.slow_policy == "disconnect":
+                self.slow_disconnects += 1
+                logger.warning("Disconnecting slow WebSocket client (%s frames behind)", len(conn.queue))
+                self.disconnect(conn.websocket)
+                asyncio.create_task(self._close(conn.websocket, 1013))
+                return
+            conn.queue.popleft()
+            conn.dropped += 1
+            self.dropped += 1
+        conn.queue.append(data)
+        self.frames_queued += 1
+        conn.max_lag = max(conn.max_lag, len(conn.queue))
+        conn.ready.set()
+
+    async def _write(self, conn: ClientConnection) -> None:
+        try:
+            while not conn.closed:
+                await conn.ready.wait()
+                conn.ready.clear()
+                while conn.queue and not conn.closed:
+                    data = conn.queue.popleft()
+                    await conn.websocket.send_text(data)
+                    conn.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Dead socket: forget it; the handler's receive loop will notice too
+            self.disconnect(conn.websocket)
+
+    async def _close(self, websocket: WebSocket, code: int) -> None:
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
+    def stats(self, clients: bool = False, top: int = 20) -> Dict[str, Any]:
+        conns = list(self.clients.values())
+        lags = [len(c.queue) for c in conns]
+        stats: Dict[str, Any] = {
+            "connections": len(conns),
+            "subscribers": {topic: len(subs) for topic, subs in self.subscribers.items()},
+            "slow_policy": self.slow_policy,
+            "queue_max": self.max_queue,
+            "broadcasts": self.broadcasts,
+            "frames_queued": self.frames_queued,
+            "dropped": self.dropped,
+            "slow_disconnects": self.slow_disconnects,
+            "bus": self.bus.stats(),
+            "max_lag": max(lags, default=0),
+            "avg_lag": round(sum(lags) / len(lags), 2) if lags else 0.0,
+        }
+        if clients:
+            # Most lagging clients first
+            laggards: List[ClientConnection] = sorted(conns, key=lambda c: (len(c.queue), c.dropped), reverse=True)
+            stats["clients"] = [c.as_dict() for c in laggards[:top]]
+        return stats
@@ -0,0 +1,106 @@
+"""Recall and latency of the local near-duplicate (IVF) index.
+
+Run from ``backend/``:
+
+    python -m benchmarks.bench_ann --n 1000000 --dim 128
+
+Builds an index over ``--n`` clustered random unit vectors, then queries it
+with perturbed copies of stored vectors (near-duplicates) and reports
+recall@1/@10 against an exact brute-force scan plus p50/p99 search latency
+for each ``nprobe``. The index is snapshotted and reopened memory-mapped to
+measure the same numbers on the on-disk form.
+"""
+import argparse
+import os
+import tempfile
+import time
+from typing import List
+
+import numpy as np
+
+from app.services.ann_index import IVFIndex, _normalize
+
+
+def make_vectors(n: int, dim: int, clusters: int, seed: int = 11) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    out = np.empty((n, dim), dtype=np.float32)
+    chunk = 100_000
+    for start in range(0, n, chunk):
+        size = min(chunk, n - start)
+        labels = rng.integers(0, clusters, size=size)
+        out[start:start + size] = centers[labels] + 0.6 * rng.standard_normal((size, dim), dtype=np.float32)
+    return _normalize(out)
+
+
+def percentile_ms(samples: List[float], q: float) -> float:
+    return float(np.percentile(samples, q)) * 1000
+
+
+def bench(index: IVFIndex, data: np.ndarray, queries: np.ndarray, truth: np.ndarray, label: str) -> None:
+    for nprobe in (1, 4, 8, 16, 32, 64):
+        index.nprobe = nprobe
+        hits1 = hits10 = 0
+        latencies = []
+        for q, true_row in zip(queries, truth):
+            started = time.perf_counter()
+            found = index.search(q, k=10)
+            latencies.append(time.perf_counter() - started)
+            rows = [int(record_id, 16) for _, record_id in found]
+            hits1 += bool(rows) and rows[0] == true_row
+            hits10 += true_row in rows
+        print(
+            f"{label} nprobe={nprobe:<3} recall@1={hits1 / len(queries):.3f} recall@10={hits10 / len(queries):.3f} "
+            f"p50={percentile_ms(latencies, 50):.2f}ms p99={percentile_ms(latencies, 99):.2f}ms"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n", type=int, default=1_000_000)
+    parser.add_argument("--dim", type=int, default=128, help="768 matches Gemini embeddings but needs ~3 GB")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--clusters", type=int, default=2000, help="topic clusters in the synthetic data")
+    parser.add_argument("--noise", type=float, default=0.05, help="perturbation applied to near-duplicate queries")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    data = make_vectors(args.n, args.dim, args.clusters)
+    print(f"generated {args.n:,} x {args.dim} vectors in {time.perf_counter() - started:.1f}s")
+
+    index = IVFIndex(dim=args.dim)
+    # Record ids shaped like Mongo ObjectIds (24 hex chars)
+    index.add_many(data, [f"{i:024x}" for i in range(args.n)], normalized=True)
+    started = time.perf_counter()
+    index.rebuild()
+    stats = index.stats()
+    print(f"trained nlist={stats['nlist']} and built index in {time.perf_counter() - started:.1f}s")
+
+    rng = np.random.default_rng(3)
+    rows = rng.choice(args.n, size=args.queries, replace=False)
+    queries = _normalize(data[rows] + args.noise * rng.standard_normal((args.queries, args.dim), dtype=np.float32))
+    # Exact answers by brute force (what the index should find)
+    truth = np.array([int(np.argmax(data @ q)) for q in queries])
+    brute = []
+    for q in queries[:50]:
+        t = time.perf_counter()
+        np.argmax(data @ q)
+        brute.append(time.perf_counter() - t)
+    print(f"brute force p50={percentile_ms(brute, 50):.2f}ms p99={percentile_ms(brute, 99):.2f}ms")
+
+    bench(index, data, queries, truth, "in-memory")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = f"{tmp}/ann"
+        started = time.perf_counter()
+        index.save(path)
+        size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+        print(f"snapshot written in {time.perf_counter() - started:.1f}s ({size / 2**20:.0f} MiB)")
+        started = time.perf_counter()
+        mapped = IVFIndex.load(path)
+        print(f"snapshot opened (mmap) in {time.perf_counter() - started:.2f}s")
+        bench(mapped, data, queries, truth, "mmap     ")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Latency of long-document analysis, whole-text versus chunked map-reduce.
+
+Run from ``backend/``:
+
+    LLM_PROVIDER=fake python -m benchmarks.bench_chunking
+    LLM_PROVIDER=fake python -m benchmarks.bench_chunking --per-1k-tokens 0.4 --sizes 8000,64000
+
+Replaces the generation provider with a ``FakeProvider`` whose latency
+grows with the prompt (``--base`` seconds plus ``--per-1k-tokens`` per
+thousand estimated prompt tokens, roughly how a real model's prefill and
+output time scale) and analyzes synthetic articles of each size twice:
+as one ``call_gemini_analyze`` call over the whole text, and through
+``analyze_document`` (paragraph chunks analyzed concurrently within the
+token budget, then reduced). Reports wall time, chunk counts and how many
+chunks the budget let through.
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import List
+
+from app.services.chunking import CHUNK_TOKEN_BUDGET, estimate_tokens, select_chunks, split_chunks
+from app.services.llm_agent import analyze_document, call_gemini_analyze
+from app.services.llm_client import FakeProvider, generation_client
+
+WORDS = (
+    "the council approved a budget for new water pipes while officials disputed the figures reported by "
+    "independent auditors who said the study shows a sharp increase in costs since last year"
+).split()
+
+
+class LengthAwareProvider(FakeProvider):
+    """``FakeProvider`` whose generate latency is linear in the prompt's token count."""
+
+    def __init__(self, base_s: float, per_1k_tokens_s: float) -> None:
+        super().__init__(latency_s=base_s)
+        self.base_s = base_s
+        self.per_1k_tokens_s = per_1k_tokens_s
+
+    async def generate(self, prompt: str) -> str:
+        self.latency_s = self.base_s + self.per_1k_tokens_s * estimate_tokens(prompt) / 1000
+        return await super().generate(prompt)
+
+
+def make_article(chars: int, seed: int) -> str:
+    rng = random.Random(seed)
+    paragraphs: List[str] = []
+    length = 0
+    while length < chars:
+        sentences = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(10, 24))).capitalize() + "." for _ in range(rng.randint(3, 7))]
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        length += len(paragraph) + 2
+    return "\n\n".join(paragraphs)[:chars]
+
+
+async def run(sizes: List[int], repeat: int) -> None:
+    print(f"{'chars':>8} {'tokens':>7} {'chunks':>7} {'analyzed':>9} {'whole s':>9} {'chunked s':>10} {'speedup':>8}")
+    for size in sizes:
+        whole, chunked = [], []
+        for i in range(repeat):
+            text = make_article(size, seed=size + i)
+            chunks = split_chunks(text)
+            started = time.perf_counter()
+            await call_gemini_analyze(text)
+            whole.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            await analyze_document(text, None, chunks)
+            chunked.append(time.perf_counter() - started)
+        whole_s, chunked_s = sum(whole) / repeat, sum(chunked) / repeat
+        print(
+            f"{size:>8} {estimate_tokens(text):>7} {len(chunks):>7} {len(select_chunks(chunks)):>9} "
+            f"{whole_s:>9.3f} {chunked_s:>10.3f} {whole_s / chunked_s:>7.1f}x"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="2000,8000,16000,32000,64000,100000", help="comma-separated document lengths in chars")
+    parser.add_argument("--base", type=float, default=0.2, help="fixed seconds per generate call")
+    parser.add_argument("--per-1k-tokens", type=float, default=0.25, help="extra seconds per 1k prompt tokens")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    generation_client.provider = LengthAwareProvider(args.base, args.per_1k_tokens)
+    print(f"provider latency {args.base}s + {args.per_1k_tokens}s per 1k tokens, chunk budget {CHUNK_TOKEN_BUDGET} tokens")
+    asyncio.run(run([int(size) for size in args.sizes.split(",")], args.repeat))
+
+
+if __name__ == "__main__":
+    main()
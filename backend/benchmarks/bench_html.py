@@ -0,0 +1,141 @@
+"""Article extraction speed over an HTML corpus: current extractor vs the old BeautifulSoup path.
+
+Run from ``backend/``:
+
+    python -m benchmarks.bench_html --pages 300 --save data/html_corpus
+    python -m benchmarks.bench_html --corpus data/html_corpus --concurrency 8
+
+Without ``--corpus`` a synthetic corpus is generated: news-like articles
+wrapped in realistic boilerplate (scripts, navigation, comment threads)
+with sizes from ~20 KB to a few MB. ``--save`` writes it out so later runs
+(and other machines) parse exactly the same pages. Reports pages/sec and
+p50/p99 parse time for the old path (``html.parser`` over the whole page)
+and for ``extract_text``, then the wall time of parsing the corpus
+concurrently through ``extract_text_async`` (thread or process pool).
+"""
+import argparse
+import asyncio
+import glob
+import os
+import random
+import statistics
+import time
+from typing import Callable, List
+
+from app.services import html_extract
+from benchmarks.bench_entities import make_corpus
+
+
+def make_page(article: str, rng: random.Random, filler_blocks: int) -> bytes:
+    paragraphs = "".join(f"<p>{s.strip()}.</p>\n" for s in article.split(".") if s.strip())
+    nav = "".join(f'<li><a href="/section/{i}">Section {i}</a></li>' for i in range(40))
+    script = "<script>var cfg = {" + ",".join(f'"k{i}": {i}' for i in range(200)) + "};</script>\n"
+    comments = "".join(
+        f'<div class="comment"><span>user{rng.randint(1, 9999)}</span><p>{article[:rng.randint(40, 400)]}</p></div>\n'
+        for _ in range(filler_blocks)
+    )
+    return (
+        "<!DOCTYPE html><html><head><title>News</title>" + script * 5 + "<style>body{margin:0}</style></head>"
+        f"<body><header><nav><ul>{nav}</ul></nav></header>"
+        f"<article><h1>{article[:60]}</h1>{paragraphs}</article>"
+        f"<section class=\"comments\">{comments}</section>"
+        f"<footer><nav><ul>{nav}</ul></nav></footer></body></html>"
+    ).encode("utf-8")
+
+
+def make_html_corpus(pages: int, seed: int = 7) -> List[bytes]:
+    rng = random.Random(seed)
+    articles = make_corpus(pages)
+    # Mostly ordinary pages plus a long tail of huge ones (comment threads, live blogs)
+    return [make_page(a, rng, rng.choice([10, 30, 100, 300, 3000]) if rng.random() < 0.9 else 20000) for a in articles]
+
+
+def legacy_extract(html: bytes) -> str:
+    """The pre-streaming fetch_url_content body: html.parser over the whole page."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html.decode("utf-8", errors="replace"), "html.parser")
+    for tag in soup(["script", "style", "nav", "footer", "header", "aside", "iframe"]):
+        tag.decompose()
+    main_content = soup.find("article") or soup.find("main") or soup.find("body")
+    if main_content:
+        text_elements = []
+        title = soup.find("h1")
+        if title:
+            text_elements.append(title.get_text(strip=True))
+        for element in main_content.find_all(["p", "h2", "h3", "h4", "h5", "h6"]):
+            text = element.get_text(strip=True)
+            if len(text) > 20:
+                text_elements.append(text)
+        content = "\n\n".join(text_elements)
+    else:
+        content = soup.get_text(separator="\n", strip=True)
+    content = "\n".join(line.strip() for line in content.split("\n") if line.strip())
+    return content[:8000]
+
+
+def run_serial(name: str, extract: Callable[[bytes], str], corpus: List[bytes]) -> None:
+    timings = []
+    started = time.perf_counter()
+    for html in corpus:
+        t0 = time.perf_counter()
+        extract(html)
+        timings.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+    timings.sort()
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(f"{name:<10} pages/sec={len(corpus) / elapsed:8.1f}  p50={statistics.median(timings) * 1000:8.2f}ms  "
+          f"p99={p99 * 1000:8.2f}ms  max={timings[-1] * 1000:8.2f}ms")
+
+
+async def run_concurrent(corpus: List[bytes], concurrency: int) -> float:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(html: bytes) -> None:
+        async with sem:
+            await html_extract.extract_text_async(html, "utf-8")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(html) for html in corpus))
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--corpus", help="directory of saved .html files")
+    parser.add_argument("--save", help="write the generated corpus to this directory")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    if args.corpus:
+        corpus = []
+        for path in sorted(glob.glob(os.path.join(args.corpus, "*.html"))):
+            with open(path, "rb") as f:
+                corpus.append(f.read())
+    else:
+        corpus = make_html_corpus(args.pages)
+        if args.save:
+            os.makedirs(args.save, exist_ok=True)
+            for i, html in enumerate(corpus):
+                with open(os.path.join(args.save, f"page-{i:05d}.html"), "wb") as f:
+                    f.write(html)
+
+    sizes = sorted(len(h) for h in corpus)
+    print(f"{len(corpus)} pages, median {sizes[len(sizes) // 2] / 1024:.0f} KB, max {sizes[-1] / 1024:.0f} KB, "
+          f"parser={'lxml' if html_extract.HAVE_LXML else 'html.parser'}")
+    if not args.skip_legacy:
+        run_serial("legacy", legacy_extract, corpus)
+    run_serial("current", lambda html: html_extract.extract_text(html, "utf-8"), corpus)
+
+    for workers in (0, html_extract.HTML_PARSE_WORKERS or 2):
+        html_extract.HTML_PARSE_WORKERS = workers
+        elapsed = asyncio.run(run_concurrent(corpus, args.concurrency))
+        html_extract.close_html_pool()
+        label = "threads only" if workers == 0 else f"{workers} pool workers"
+        print(f"async ({label}, concurrency={args.concurrency}): {len(corpus) / elapsed:8.1f} pages/sec")
+
+
+if __name__ == "__main__":
+    main()
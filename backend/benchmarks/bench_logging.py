@@ -0,0 +1,91 @@
+"""Per-event cost of workflow logging: inline broadcast vs the log pipeline.
+
+Run from ``backend/``:
+
+    python -m benchmarks.bench_logging --events 20000 --clients 0
+
+``legacy`` is the previous ``send_ws_log``: a print, a ``json.dumps`` and an
+awaited broadcast for every event. ``pipeline`` is the current one. Both
+broadcast to ``--clients`` stand-in sockets that just record frames. Stdout
+is discarded so terminal speed does not count.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import time
+from typing import Any, Dict, List
+
+from app.services.ws_logger import LogPipeline
+
+
+class StandInSocket:
+    def __init__(self) -> None:
+        self.frames: List[str] = []
+
+    async def send_text(self, data: str) -> None:
+        self.frames.append(data)
+
+
+class StandInManager:
+    """Same broadcast shape as ``ConnectionManager`` without real sockets."""
+
+    def __init__(self, clients: int) -> None:
+        self.active_connections = [StandInSocket() for _ in range(clients)]
+
+    async def broadcast(self, message: Dict[str, Any]) -> None:
+        if not self.active_connections:
+            return
+        data = json.dumps(message)
+        await asyncio.gather(*(c.send_text(data) for c in self.active_connections), return_exceptions=True)
+
+
+async def legacy_send_ws_log(manager: StandInManager, level: str, message: str, extra: Dict[str, Any]) -> None:
+    log = {"ts": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()), "level": level, "message": message}
+    log.update(extra)
+    print(f"[{log['ts']}] {level}: {message}", json.dumps(extra))
+    await manager.broadcast({"type": "log", "payload": log})
+
+
+EVENTS = [("DEBUG", "VERIFY - waiting for embeddings", {}), ("INFO", "Sentiment completed", {"duration_s": 0.12})]
+
+
+async def run(events: int, clients: int) -> None:
+    manager = StandInManager(clients)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        started = time.perf_counter()
+        for i in range(events):
+            level, message, extra = EVENTS[i % 2]
+            await legacy_send_ws_log(manager, level, message, extra)
+        legacy_s = time.perf_counter() - started
+
+    pipeline = LogPipeline(capacity=events)
+    pipeline.attach(manager.broadcast, lambda: bool(manager.active_connections))
+    pipeline.start()
+    started = time.perf_counter()
+    for i in range(events):
+        level, message, extra = EVENTS[i % 2]
+        pipeline.emit(level, message, extra)
+    emit_s = time.perf_counter() - started
+    await pipeline.stop()
+    drain_s = time.perf_counter() - started - emit_s
+
+    print(f"{events} events, {clients} clients")
+    print(f"  legacy:   {legacy_s / events * 1e6:8.2f} us/event on the request path")
+    print(f"  pipeline: {emit_s / events * 1e6:8.2f} us/event on the request path "
+          f"(+{drain_s / events * 1e6:.2f} us/event in the background drainer)")
+    stats = pipeline.stats()
+    print(f"  pipeline frames: {stats['frames']}  events sent: {stats['events_sent']}  filtered: {stats['filtered']}  dropped: {stats['dropped']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--clients", type=int, default=0)
+    args = parser.parse_args()
+    asyncio.run(run(args.events, args.clients))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Goodput of provider calls against a quota-enforcing fake provider.
+
+Run from ``backend/``:
+
+    python -m benchmarks.bench_ratelimit --arrival-rate 60 --seconds 10 --quota 20
+
+Offers an open-loop burst of generate calls to ``FakeProvider`` configured
+with a per-second quota and a concurrency quota, first with no limiting
+(every call fires immediately, as the workflow did before) and then through
+``AdaptiveLimiter`` with and without the quota configured as a token
+bucket. Reports successful calls per second, 429s seen, calls rejected by
+the limiter's deadline queue, queue wait percentiles and the final AIMD
+concurrency limit.
+"""
+import argparse
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+from app.services.llm_client import FakeProvider
+from app.services.rate_limit import AdaptiveLimiter, LimiterRejected, RateLimited
+
+
+def percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q / 100))]
+
+
+async def offer_load(provider: FakeProvider, limiter: Optional[AdaptiveLimiter], rate: float, seconds: float) -> Dict[str, Any]:
+    outcomes = {"ok": 0, "throttled": 0, "rejected": 0}
+    latencies: List[float] = []
+
+    async def one() -> None:
+        started = time.perf_counter()
+        try:
+            if limiter is None:
+                await provider.generate("claim")
+            else:
+                await limiter.run(lambda: provider.generate("claim"))
+        except RateLimited:
+            outcomes["throttled"] += 1
+            return
+        except LimiterRejected:
+            outcomes["rejected"] += 1
+            return
+        outcomes["ok"] += 1
+        latencies.append(time.perf_counter() - started)
+
+    tasks = []
+    started = time.perf_counter()
+    for i in range(int(rate * seconds)):
+        # Open loop: arrivals do not wait for earlier calls
+        await asyncio.sleep(max(0.0, started + i / rate - time.perf_counter()))
+        tasks.append(asyncio.create_task(one()))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    return {
+        **outcomes,
+        "goodput": outcomes["ok"] / elapsed,
+        "provider_429s": provider.rejected,
+        "p50": percentile(latencies, 50),
+        "p99": percentile(latencies, 99),
+        "limit": round(limiter.limit, 1) if limiter else None,
+    }
+
+
+async def run(args: argparse.Namespace) -> None:
+    def provider() -> FakeProvider:
+        return FakeProvider(latency_s=args.latency, quota_per_s=args.quota, quota_concurrency=args.quota_concurrency)
+
+    scenarios = [
+        ("unlimited", None),
+        ("aimd only", AdaptiveLimiter("bench-aimd", max_concurrency=64, queue_timeout_s=args.deadline)),
+        ("bucket + aimd", AdaptiveLimiter(
+            "bench-bucket", rate_per_s=args.quota, burst=args.quota, max_concurrency=64, queue_timeout_s=args.deadline,
+        )),
+    ]
+    offered = int(args.arrival_rate * args.seconds)
+    print(f"offered {offered} calls at {args.arrival_rate}/s; quota {args.quota}/s, {args.quota_concurrency} concurrent; latency {args.latency}s")
+    print(f"{'scenario':<15}{'ok':>6}{'429':>6}{'rejected':>10}{'ok/s':>8}{'p50 s':>8}{'p99 s':>8}{'429s seen':>11}{'limit':>7}")
+    for name, limiter in scenarios:
+        r = await offer_load(provider(), limiter, args.arrival_rate, args.seconds)
+        print(
+            f"{name:<15}{r['ok']:>6}{r['throttled']:>6}{r['rejected']:>10}{r['goodput']:>8.1f}"
+            f"{r['p50']:>8.2f}{r['p99']:>8.2f}{r['provider_429s']:>11}{str(r['limit'] or '-'):>7}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--arrival-rate", type=float, default=60.0, help="offered calls per second")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--quota", type=float, default=20.0, help="provider calls per second")
+    parser.add_argument("--quota-concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.3, help="fake provider latency (s)")
+    parser.add_argument("--deadline", type=float, default=30.0, help="limiter queue timeout (s)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Accuracy and latency of the in-process sentiment model.
+
+Run from ``backend/``:
+
+    python -m benchmarks.bench_sentiment
+    python -m benchmarks.bench_sentiment --remote   # also score the fixture with the HF inference API
+
+Scores the labelled fixture (``benchmarks/fixtures/sentiment_labelled.jsonl``,
+hand-labelled negative/neutral/positive news and social-media sentences)
+and reports accuracy, macro-F1 and the confusion matrix. Then times
+single-document scoring (fixture sentences and article-length documents
+built from them) and batched throughput at several batch sizes. With
+``--remote`` the same fixture goes through ``call_hf_sentiment`` (needs
+``HUGGINGFACEHUB_API_TOKEN``) for an accuracy/latency comparison.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.services.sentiment import LABELS, SentimentModel
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "sentiment_labelled.jsonl")
+
+
+def load_fixture(path: str) -> List[Tuple[str, str]]:
+    with open(path, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return [(row["text"], row["label"]) for row in rows]
+
+
+def percentile(samples: List[float], q: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q / 100))]
+
+
+def report_accuracy(name: str, gold: List[str], predicted: List[Optional[str]]) -> None:
+    correct = sum(g == p for g, p in zip(gold, predicted))
+    f1s = []
+    for label in LABELS:
+        tp = sum(g == label and p == label for g, p in zip(gold, predicted))
+        fp = sum(g != label and p == label for g, p in zip(gold, predicted))
+        fn = sum(g == label and p != label for g, p in zip(gold, predicted))
+        f1s.append(2 * tp / (2 * tp + fp + fn) if tp else 0.0)
+    print(f"{name}: accuracy {correct / len(gold):.3f}, macro-F1 {sum(f1s) / len(f1s):.3f} ({len(gold)} texts)")
+    print("  " + "gold / predicted".ljust(18) + "".join(f"{label:>10}" for label in LABELS))
+    for label in LABELS:
+        row = [sum(g == label and p == other for g, p in zip(gold, predicted)) for other in LABELS]
+        print(f"  {label:<18}" + "".join(f"{n:>10}" for n in row))
+
+
+def label_from(sentiment: Dict) -> Optional[str]:
+    from app.services.llm_agent import sentiment_label
+    return sentiment_label(sentiment)
+
+
+def time_single(model: SentimentModel, texts: List[str], repeat: int) -> List[float]:
+    latencies = []
+    for _ in range(repeat):
+        for text in texts:
+            started = time.perf_counter()
+            model.analyze([text])
+            latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def make_articles(texts: List[str], n: int, chars: int, seed: int = 3) -> List[str]:
+    rng = random.Random(seed)
+    articles = []
+    for _ in range(n):
+        paragraphs, length = [], 0
+        while length < chars:
+            paragraph = " ".join(rng.choice(texts) for _ in range(4))
+            paragraphs.append(paragraph)
+            length += len(paragraph) + 2
+        articles.append("\n\n".join(paragraphs)[:chars])
+    return articles
+
+
+async def score_remote(texts: List[str]) -> Tuple[List[Optional[str]], List[float]]:
+    from app.services.http_client import close_http_client, init_http_client
+    from app.services.llm_agent import call_hf_sentiment
+    await init_http_client()
+    labels, latencies = [], []
+    try:
+        for text in texts:
+            started = time.perf_counter()
+            sentiment = await call_hf_sentiment(text[:512])
+            latencies.append(time.perf_counter() - started)
+            labels.append(label_from(sentiment))
+    finally:
+        await close_http_client()
+    return labels, latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fixture", default=FIXTURE)
+    parser.add_argument("--repeat", type=int, default=20, help="timing passes over the fixture")
+    parser.add_argument("--article-chars", type=int, default=8000)
+    parser.add_argument("--batch-docs", type=int, default=4096, help="documents per throughput run")
+    parser.add_argument("--remote", action="store_true", help="also score the fixture with the remote HF model")
+    args = parser.parse_args()
+
+    fixture = load_fixture(args.fixture)
+    texts = [text for text, _ in fixture]
+    gold = [label for _, label in fixture]
+
+    started = time.perf_counter()
+    model = SentimentModel.load()
+    print(f"model {model.name}: loaded in {(time.perf_counter() - started) * 1000:.1f} ms ({model.dim} features)")
+    report_accuracy("local", gold, [label_from(s) for s in model.analyze(texts)])
+
+    model.analyze(texts)  # warm up
+    sentence = time_single(model, texts, args.repeat)
+    articles = make_articles(texts, 50, args.article_chars)
+    article = time_single(model, articles, max(1, args.repeat // 4))
+    print(f"\nsingle document ({len(sentence)} sentences, {len(article)} x {args.article_chars}-char articles)")
+    for name, samples in (("sentence", sentence), ("article", article)):
+        print(
+            f"  {name:<9} p50 {percentile(samples, 50) * 1e6:8.1f} us   p99 {percentile(samples, 99) * 1e6:8.1f} us"
+        )
+
+    print(f"\nbatched throughput ({args.batch_docs} sentences per run)")
+    docs = (texts * (args.batch_docs // len(texts) + 1))[:args.batch_docs]
+    for batch_size in (1, 8, 32, 256):
+        started = time.perf_counter()
+        for start in range(0, len(docs), batch_size):
+            model.analyze(docs[start:start + batch_size])
+        elapsed = time.perf_counter() - started
+        print(f"  batch {batch_size:>4}: {len(docs) / elapsed:10.0f} docs/s   {elapsed / len(docs) * 1e6:7.1f} us/doc")
+
+    if args.remote:
+        print()
+        labels, latencies = asyncio.run(score_remote(texts))
+        report_accuracy("remote (HF)", gold, labels)
+        print(f"  latency p50 {percentile(latencies, 50) * 1000:.0f} ms   p99 {percentile(latencies, 99) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""WebSocket fan-out with many dashboards and a few slow consumers.
+
+Run from ``backend/``:
+
+    python -m benchmarks.bench_ws --clients 10000 --slow 100 --messages 200
+
+Connects ``--clients`` stand-in sockets to a ``ConnectionManager`` (``--slow``
+of them take ``--slow-ms`` per send), broadcasts ``--messages`` messages at
+``--rate`` per second and reports the broadcast call cost, delivery latency
+seen by fast clients and what happened to the slow ones under the
+configured policy.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from types import SimpleNamespace
+from typing import List
+
+import numpy as np
+
+from app.services.ws_manager import ConnectionManager
+
+
+class StandInSocket:
+    def __init__(self, index: int, delay_s: float, sampled: bool) -> None:
+        self.client = SimpleNamespace(host="127.0.0.1", port=index)
+        self.delay_s = delay_s
+        self.sampled = sampled
+        self.received = 0
+        self.latencies: List[float] = []
+
+    async def accept(self) -> None:
+        pass
+
+    async def close(self, code: int = 1000) -> None:
+        pass
+
+    async def send_text(self, data: str) -> None:
+        if self.delay_s:
+            await asyncio.sleep(self.delay_s)
+        self.received += 1
+        if self.sampled:
+            self.latencies.append(time.perf_counter() - json.loads(data)["sent_at"])
+
+
+async def run(args: argparse.Namespace) -> None:
+    manager = ConnectionManager(max_queue=args.queue, slow_policy=args.policy)
+    sockets = [
+        StandInSocket(i, args.slow_ms / 1000.0 if i < args.slow else 0.0, sampled=i % 100 == 0)
+        for i in range(args.clients)
+    ]
+    started = time.perf_counter()
+    for ws in sockets:
+        await manager.connect(ws, ["threats"])
+    print(f"connected {args.clients} clients in {time.perf_counter() - started:.2f}s")
+
+    call_costs = []
+    for i in range(args.messages):
+        t = time.perf_counter()
+        await manager.broadcast({"type": "threat", "level": "L3", "seq": i, "sent_at": t})
+        call_costs.append(time.perf_counter() - t)
+        await asyncio.sleep(1.0 / args.rate)
+    await asyncio.sleep(0.5)
+
+    fast = np.array([lat for ws in sockets[args.slow:] for lat in ws.latencies])
+    fast_received = sum(ws.received for ws in sockets[args.slow:])
+    slow_received = sum(ws.received for ws in sockets[:args.slow])
+    stats = manager.stats()
+    print(f"broadcast call: p50={np.percentile(call_costs, 50) * 1000:.2f}ms p99={np.percentile(call_costs, 99) * 1000:.2f}ms")
+    print(f"fast clients: {fast_received} deliveries, sampled latency p50={np.percentile(fast, 50) * 1000:.2f}ms "
+          f"p99={np.percentile(fast, 99) * 1000:.2f}ms")
+    print(f"slow clients ({args.policy}): {slow_received} deliveries, dropped={stats['dropped']} "
+          f"disconnected={stats['slow_disconnects']} max_lag={stats['max_lag']}")
+    for ws in sockets:
+        manager.disconnect(ws)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=10000)
+    parser.add_argument("--slow", type=int, default=100)
+    parser.add_argument("--slow-ms", type=float, default=200.0)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=50.0, help="broadcasts per second")
+    parser.add_argument("--queue", type=int, default=64)
+    parser.add_argument("--policy", choices=["drop_oldest", "disconnect"], default="drop_oldest")
+    logging.getLogger("app.services.ws_manager").setLevel(logging.ERROR)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Threat alert fan-out as dashboards scale: shared producer vs per-connection loops.
+
+Run from ``backend/``:
+
+    python -m benchmarks.loadtest_threats --connections 10,100,1000,5000
+
+For each connection count, stand-in sockets subscribe to ``threats`` on a
+real ``ConnectionManager`` while a steady stream of false verdicts keeps the
+``ThreatFeed`` alerting every tick. ``shared`` is the current design: one
+producer task. ``legacy`` mimics the old handler, where every connection
+broadcast to everyone on each tick. Reports messages per client per tick
+and total socket sends per second.
+"""
+import argparse
+import asyncio
+import logging
+import time
+from types import SimpleNamespace
+
+from app.services.threat_feed import ThreatFeed
+from app.services.ws_manager import ConnectionManager
+
+
+class StandInSocket:
+    def __init__(self, index: int) -> None:
+        self.client = SimpleNamespace(host="127.0.0.1", port=index)
+        self.received = 0
+
+    async def accept(self) -> None:
+        pass
+
+    async def close(self, code: int = 1000) -> None:
+        pass
+
+    async def send_text(self, data: str) -> None:
+        self.received += 1
+
+
+async def run_once(connections: int, mode: str, duration_s: float, tick_s: float) -> None:
+    manager = ConnectionManager(max_queue=10_000)
+    sockets = [StandInSocket(i) for i in range(connections)]
+    for ws in sockets:
+        await manager.connect(ws, ["threats"])
+
+    feed = ThreatFeed(interval_s=tick_s, window_s=1.0, baseline_s=60.0, min_samples=10, cooldown_s=0.0)
+    now = time.time()
+    for i in range(100):
+        # Quiet baseline: a minute of mostly true verdicts
+        feed.observe("Likely True", "neutral", now=now - 60 + i * 0.5)
+
+    async def anomalies() -> None:
+        while True:
+            for _ in range(5):
+                feed.observe("Likely False", "negative")
+            await asyncio.sleep(tick_s)
+
+    async def legacy_loop() -> None:
+        while True:
+            await asyncio.sleep(tick_s)
+            await manager.broadcast({"type": "threat", "level": "L3", "message": "Rising sentiment anomaly detected"})
+
+    tasks = [asyncio.create_task(anomalies())]
+    if mode == "shared":
+        feed.start(manager.broadcast)
+    else:
+        tasks += [asyncio.create_task(legacy_loop()) for _ in range(connections)]
+
+    started = time.perf_counter()
+    await asyncio.sleep(duration_s)
+    elapsed = time.perf_counter() - started
+    await feed.stop()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await asyncio.sleep(0.05)
+
+    ticks = duration_s / tick_s
+    total = sum(ws.received for ws in sockets)
+    print(f"{mode:<6} connections={connections:<6} msgs/client/tick={total / connections / ticks:8.2f} "
+          f"sends/s={total / elapsed:12,.0f}")
+    for ws in sockets:
+        manager.disconnect(ws)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--connections", default="10,100,1000,5000")
+    parser.add_argument("--duration", type=float, default=3.0)
+    parser.add_argument("--tick-ms", type=float, default=100.0)
+    parser.add_argument("--modes", default="shared,legacy")
+    args = parser.parse_args()
+    logging.getLogger("app.services.threat_feed").setLevel(logging.ERROR)
+    for mode in args.modes.split(","):
+        for connections in (int(c) for c in args.connections.split(",")):
+            asyncio.run(run_once(connections, mode, args.duration, args.tick_ms / 1000.0))
+
+
+if __name__ == "__main__":
+    main()
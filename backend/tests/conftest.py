@@ -0,0 +1,10 @@
+import os
+import sys
+
+# Services read their configuration at import time: keep every test offline
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("FAKE_LLM_LATENCY_S", "0")
+os.environ.setdefault("VERDICT_CACHE_PERSISTENT", "0")
+os.environ.setdefault("OUTBOX_ENABLED", "0")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
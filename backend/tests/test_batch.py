@@ -0,0 +1,12 @@
+import pytest
+from pydantic import ValidationError
+
+from app.routers.analysis import BatchQueryPayload
+
+
+def test_batch_items_must_be_url_or_text():
+    payload = BatchQueryPayload(items=[{"type": "url", "payload": {"url": "https://example.com"}}, {"type": "text", "payload": {"text": "x"}}])
+    assert [item.type for item in payload.items] == ["url", "text"]
+    for kind in ("image", "video", "URL"):
+        with pytest.raises(ValidationError):
+            BatchQueryPayload(items=[{"type": kind, "payload": {}}])
@@ -0,0 +1,134 @@
+import asyncio
+
+from app.services import cache
+from app.services.cache import VerdictCache, canonicalize_url, is_cacheable_result, make_cache_key
+
+
+def test_canonicalize_url_normalizes_host_port_path_and_fragment():
+    assert canonicalize_url("HTTPS://WWW.Example.com:443/news/story/#comments") == "https://example.com/news/story"
+    assert canonicalize_url("example.com") == "http://example.com/"
+    assert canonicalize_url("http://example.com:8080/a") == "http://example.com:8080/a"
+
+
+def test_canonicalize_url_strips_only_tracking_params():
+    url = "https://example.com/a?utm_source=x&b=2&fbclid=abc&a=1&UTM_Campaign=y&gclid=z"
+    assert canonicalize_url(url) == "https://example.com/a?a=1&b=2"
+    # Generic names select content on some sites
+    assert canonicalize_url("https://blog.example/?s=vaccines&ref=home") == "https://blog.example/?ref=home&s=vaccines"
+
+
+def test_cache_key_follows_content_not_url_noise():
+    text = "Some   article TEXT"
+    assert make_cache_key("url", text, "https://example.com/a?utm_source=x") == make_cache_key("url", "some article text", "https://example.com/a")
+    assert make_cache_key("url", text, "https://example.com/a") != make_cache_key("url", text + " edited", "https://example.com/a")
+
+
+def test_unknown_and_degraded_results_are_not_cacheable():
+    assert is_cacheable_result({"verdict": "Likely True"})
+    assert not is_cacheable_result({"verdict": "Unknown"})
+    assert not is_cacheable_result({})
+    assert not is_cacheable_result({"verdict": "Likely True", "degraded": ["sentiment"]})
+
+
+def run_twice(verdict_cache, result, mode="default"):
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return dict(result)
+
+    async def main():
+        first = await verdict_cache.get_or_compute("k", compute, mode=mode)
+        second = await verdict_cache.get_or_compute("k", compute)
+        return first[1], second[1]
+
+    return asyncio.run(main()), len(calls)
+
+
+def test_cacheable_result_is_served_from_memory():
+    statuses, calls = run_twice(VerdictCache(10, 60, persistent=False), {"verdict": "Likely True"})
+    assert statuses == ("miss", "hit")
+    assert calls == 1
+
+
+def test_uncacheable_results_are_recomputed():
+    for result in ({"verdict": "Unknown"}, {"verdict": "Satire", "degraded": ["analyze"]}):
+        statuses, calls = run_twice(VerdictCache(10, 60, persistent=False), result)
+        assert statuses == ("miss", "miss")
+        assert calls == 2
+
+
+def test_bypass_does_not_store():
+    statuses, calls = run_twice(VerdictCache(10, 60, persistent=False), {"verdict": "Likely True"}, mode="bypass")
+    assert statuses == ("bypass", "miss")
+    assert calls == 2
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: clock[0])
+    verdict_cache = VerdictCache(10, ttl_s=60, persistent=False)
+
+    async def compute():
+        return {"verdict": "Likely True"}
+
+    async def main():
+        await verdict_cache.get_or_compute("k", compute)
+        clock[0] += 59
+        fresh = await verdict_cache.get_or_compute("k", compute)
+        clock[0] += 2
+        expired = await verdict_cache.get_or_compute("k", compute)
+        return fresh[1], expired[1]
+
+    assert asyncio.run(main()) == ("hit", "miss")
+    assert verdict_cache.expirations == 1
+
+
+def test_lru_evicts_oldest_entry():
+    verdict_cache = VerdictCache(2, 60, persistent=False)
+
+    async def main():
+        for key in ("a", "b", "a", "c"):
+            await verdict_cache.get_or_compute(key, lambda: asyncio.sleep(0, {"verdict": "Likely True"}))
+        return [(await verdict_cache.get_or_compute(key, lambda: asyncio.sleep(0, {"verdict": "Satire"})))[1] for key in ("a", "c", "b")]
+
+    assert asyncio.run(main()) == ["hit", "hit", "miss"]
+    assert verdict_cache.evictions == 2
+
+
+def test_concurrent_misses_share_one_computation():
+    verdict_cache = VerdictCache(10, 60, persistent=False)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"verdict": "Likely True"}
+
+    async def main():
+        return await asyncio.gather(*(verdict_cache.get_or_compute("k", compute) for _ in range(5)))
+
+    statuses = sorted(status for _, status in asyncio.run(main()))
+    assert statuses == ["coalesced"] * 4 + ["miss"]
+    assert len(calls) == 1
+
+
+def test_persistent_tier_ignores_uncacheable_records(monkeypatch):
+    verdict_cache = VerdictCache(10, 60, persistent=True)
+    stored = {"verdict": "Unknown"}
+
+    async def find(key):
+        return dict(stored)
+
+    monkeypatch.setattr(verdict_cache, "_get_persistent", find)
+
+    async def main():
+        miss = await verdict_cache.get_or_compute("k", lambda: asyncio.sleep(0, {"verdict": "Satire"}))
+        verdict_cache.clear()
+        stored["verdict"] = "Likely True"
+        hit = await verdict_cache.get_or_compute("k", lambda: asyncio.sleep(0, {"verdict": "Satire"}))
+        return miss, hit
+
+    (miss, miss_status), (hit, hit_status) = asyncio.run(main())
+    assert (miss["verdict"], miss_status) == ("Satire", "miss")
+    assert (hit["verdict"], hit_status) == ("Likely True", "hit")
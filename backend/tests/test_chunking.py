@@ -0,0 +1,68 @@
+from app.services import chunking
+from app.services.chunking import Chunk, reduce_analyses, select_chunks, split_chunks
+
+
+def make_chunks(*sizes):
+    return [Chunk(i, 0, size, "x" * size) for i, size in enumerate(sizes)]
+
+
+def analysis(verdict, confidence=0.8, **extra):
+    return {"verdict": verdict, "confidence": confidence, "summary": f"{verdict}. More.", "reasoning": "r", **extra}
+
+
+def test_split_chunks_covers_the_text_with_overlap():
+    text = "\n\n".join(f"Paragraph {p} sentence one. Sentence two is here." * 20 for p in range(30))
+    chunks = split_chunks(text, max_tokens=500, overlap_tokens=50)
+    assert chunks[0].start == 0 and chunks[-1].end == len(text)
+    for before, after in zip(chunks, chunks[1:]):
+        assert after.start < before.end
+        assert after.text == text[after.start:after.end]
+    assert all(chunk.tokens <= 500 for chunk in chunks)
+    assert len(split_chunks("short text")) == 1
+
+
+def test_select_chunks_spreads_over_the_budget():
+    chunks = make_chunks(*[400] * 10)
+    picked = select_chunks(chunks, budget_tokens=400)
+    assert picked[0].index == 0 and picked[-1].index == 9
+    assert sum(chunk.tokens for chunk in picked) <= 400
+
+
+def test_verdict_is_the_weighted_vote():
+    chunks = make_chunks(4000, 400, 400)
+    result = reduce_analyses(chunks, {0: analysis("Satire"), 1: analysis("Uncertain"), 2: analysis("Uncertain")}, {})
+    assert result["verdict"] == "Satire"
+    assert [ref["status"] for ref in result["chunks"]] == ["skipped"] * 3
+    assert 0 < result["confidence"] <= 0.8
+
+
+def test_unknown_chunks_do_not_vote():
+    chunks = make_chunks(400, 400)
+    result = reduce_analyses(chunks, {0: analysis("Unknown", 0.0), 1: analysis("Likely False", 0.6)}, {0: "analyzed", 1: "analyzed"})
+    assert result["verdict"] == "Likely False"
+    assert result["confidence"] == 0.6
+
+
+def test_no_usable_chunk_gives_unknown():
+    chunks = make_chunks(400, 400)
+    result = reduce_analyses(chunks, {0: analysis("Unknown", 0.0, reasoning="timed out")}, {0: "timeout"})
+    assert result["verdict"] == "Unknown"
+    assert result["confidence"] == 0.0
+    assert result["reasoning"] == "timed out"
+    assert [ref["status"] for ref in result["chunks"]] == ["timeout", "skipped"]
+
+
+def test_flagged_share_makes_a_true_document_misleading():
+    chunks = make_chunks(400, 400, 400, 400)
+    analyses = {0: analysis("Likely True"), 1: analysis("Likely True"), 2: analysis("Likely True"), 3: analysis("Likely False")}
+    assert reduce_analyses(chunks, analyses, {})["verdict"] == "Misleading"
+    analyses[3] = analysis("Likely True")
+    assert reduce_analyses(chunks, analyses, {})["verdict"] == "Likely True"
+
+
+def test_zero_flag_share_needs_a_flagged_chunk(monkeypatch):
+    monkeypatch.setattr(chunking, "CHUNK_FLAG_SHARE", 0.0)
+    chunks = make_chunks(400, 400)
+    result = reduce_analyses(chunks, {0: analysis("Likely True"), 1: analysis("Likely True")}, {})
+    assert result["verdict"] == "Likely True"
+    assert result["confidence"] == 0.8
@@ -0,0 +1,101 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services.llm_client import FakeProvider, LLMClient, LLMProvider, LLMTimeoutError
+from app.services.rate_limit import AdaptiveLimiter
+
+
+def make_client(provider, max_concurrency=8, timeout_s=5.0, name="test"):
+    return LLMClient(provider, name, max_concurrency, timeout_s, AdaptiveLimiter(f"test-{name}", max_concurrency=max_concurrency))
+
+
+def test_providers_must_implement_generate_and_embed():
+    class GenerateOnly(LLMProvider):
+        async def generate(self, prompt):
+            return ""
+
+    with pytest.raises(TypeError):
+        GenerateOnly()
+
+
+def test_concurrent_calls_overlap_instead_of_blocking_the_loop():
+    client = make_client(FakeProvider(latency_s=0.1), max_concurrency=20)
+    ticks = []
+
+    async def ticker():
+        for _ in range(5):
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.02)
+
+    async def main():
+        started = time.monotonic()
+        await asyncio.gather(ticker(), *(client.generate(f"prompt {i}") for i in range(20)))
+        return time.monotonic() - started
+
+    assert asyncio.run(main()) < 0.5
+    assert client.completed == 20
+    # The loop kept serving other work while the calls were in flight
+    assert max(b - a for a, b in zip(ticks, ticks[1:])) < 0.08
+
+
+def test_concurrency_is_capped_per_client():
+    provider = FakeProvider(latency_s=0.02)
+    peak = [0]
+
+    async def watch():
+        while True:
+            peak[0] = max(peak[0], provider.in_flight)
+            await asyncio.sleep(0.002)
+
+    client = make_client(provider, max_concurrency=3)
+
+    async def main():
+        watcher = asyncio.create_task(watch())
+        await asyncio.gather(*(client.generate(str(i)) for i in range(12)))
+        watcher.cancel()
+
+    asyncio.run(main())
+    assert peak[0] == 3
+
+
+def test_timeout_cancels_the_provider_call():
+    provider = FakeProvider(latency_s=1.0)
+    client = make_client(provider, timeout_s=0.05)
+
+    async def main():
+        with pytest.raises(LLMTimeoutError):
+            await client.generate("slow")
+        return provider.in_flight
+
+    assert asyncio.run(main()) == 0
+    assert client.timeouts == 1
+
+
+def test_cancelling_the_caller_cancels_the_call():
+    provider = FakeProvider(latency_s=1.0)
+    client = make_client(provider)
+
+    async def main():
+        task = asyncio.create_task(client.generate("abandoned"))
+        await asyncio.sleep(0.02)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return provider.in_flight
+
+    assert asyncio.run(main()) == 0
+    assert client.cancelled == 1
+
+
+def test_fake_provider_is_deterministic():
+    client = make_client(FakeProvider(latency_s=0, embed_latency_s=0, dim=16))
+
+    async def main():
+        return await client.generate("same"), await client.generate("same"), await client.embed(["a", "b", "a"])
+
+    first, second, vectors = asyncio.run(main())
+    assert first == second and "VERDICT" in first
+    assert len(vectors) == 3 and len(vectors[0]) == 16
+    assert vectors[0] == vectors[2] != vectors[1]
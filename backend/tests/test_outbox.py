@@ -0,0 +1,101 @@
+import asyncio
+import json
+import time
+
+from app.services.outbox import Outbox
+
+
+def make_outbox(path, handler, **kwargs):
+    outbox = Outbox(path=str(path), enabled=True, **kwargs)
+    outbox.register("sink", handler)
+    outbox._open()
+    return outbox
+
+
+def test_claims_are_leased_to_one_worker(tmp_path):
+    path = tmp_path / "outbox.sqlite3"
+    first = make_outbox(path, None, lease_s=0.1)
+    second = make_outbox(path, None, lease_s=0.1)
+    first._insert([("sink", json.dumps({"n": n})) for n in range(3)])
+
+    assert len(first._claim("sink", 10)) == 3
+    assert second._claim("sink", 10) == []
+    # The first worker died holding the lease: the rows come due again
+    time.sleep(0.12)
+    assert [json.loads(row[2])["n"] for row in second._claim("sink", 10)] == [0, 1, 2]
+
+
+def test_delivered_rows_are_deleted(tmp_path):
+    delivered = []
+
+    async def handler(items):
+        delivered.extend(items)
+
+    outbox = make_outbox(tmp_path / "outbox.sqlite3", handler)
+
+    async def main():
+        await outbox.put([("sink", {"n": 1}), ("sink", {"n": 2})])
+        before = await outbox.stats()
+        await outbox.flush()
+        return before, await outbox.stats()
+
+    before, after = asyncio.run(main())
+    assert delivered == [{"n": 1}, {"n": 2}]
+    assert outbox._counts() == {}
+    assert before["sinks"]["sink"]["pending"] == 2
+    assert after["sinks"]["sink"]["pending"] == 0
+    assert after["sinks"]["sink"]["delivered"] == 2
+
+
+def test_failed_batches_back_off_then_dead_letter(tmp_path):
+    async def handler(items):
+        raise RuntimeError("sink down")
+
+    outbox = make_outbox(tmp_path / "outbox.sqlite3", handler, max_attempts=3, backoff_s=10, max_backoff_s=10)
+
+    async def main():
+        await outbox.put([("sink", {"n": 1})])
+        rows = outbox._claim("sink", 10)
+        assert not await outbox._deliver("sink", outbox._sinks["sink"], rows)
+
+    asyncio.run(main())
+    (row_id, attempts, next_attempt_at), = outbox._conn.execute("SELECT id, attempts, next_attempt_at FROM outbox").fetchall()
+    assert attempts == 1
+    assert next_attempt_at <= time.time() + 20
+    # Backoff hides the row from a regular claim, not from a shutdown flush
+    outbox._conn.execute("UPDATE outbox SET next_attempt_at = ? WHERE id = ?", (time.time() + 10, row_id))
+    assert outbox._claim("sink", 10) == []
+
+    for _ in range(2):
+        rows = outbox._claim("sink", 10, ignore_backoff=True)
+        assert asyncio.run(outbox._deliver("sink", outbox._sinks["sink"], rows)) is False
+    counts = outbox._counts()["sink"]
+    assert (counts["pending"], counts["dead"]) == (0, 1)
+    assert outbox._claim("sink", 10, ignore_backoff=True) == []
+    assert outbox._sinks["sink"].dead_lettered == 1
+
+
+def test_drainer_retries_until_the_sink_recovers(tmp_path):
+    attempts = []
+
+    async def handler(items):
+        attempts.append(items)
+        if len(attempts) < 3:
+            raise RuntimeError("flaky")
+
+    outbox = make_outbox(tmp_path / "outbox.sqlite3", handler, backoff_s=0.001, max_backoff_s=0.001, poll_interval_s=0.01)
+    outbox._conn.close()
+    outbox._conn = None
+
+    async def main():
+        await outbox.start()
+        await outbox.put([("sink", {"n": 1})])
+        for _ in range(200):
+            if outbox._sinks["sink"].delivered:
+                break
+            await asyncio.sleep(0.01)
+        await outbox.stop()
+
+    asyncio.run(main())
+    assert len(attempts) == 3
+    assert outbox._sinks["sink"].failures == 2
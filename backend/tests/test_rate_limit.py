@@ -0,0 +1,111 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services.rate_limit import AdaptiveLimiter, LimiterRejected, RateLimited, retry_after_seconds
+
+
+def test_retry_after_parses_seconds_and_dates():
+    assert retry_after_seconds("2.5") == 2.5
+    assert retry_after_seconds("-1") == 0.0
+    assert retry_after_seconds(None) is None
+    assert retry_after_seconds("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert retry_after_seconds("soon") is None
+
+
+def test_429_cuts_the_limit_pauses_and_retries():
+    limiter = AdaptiveLimiter("test-429", max_concurrency=10, max_retries=3)
+    attempts = []
+
+    async def call():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise RateLimited(retry_after_s=0.05)
+        return "ok"
+
+    assert asyncio.run(limiter.run(call)) == "ok"
+    assert len(attempts) == 2
+    # The retry waited out the Retry-After
+    assert attempts[1] - attempts[0] >= 0.045
+    assert limiter.throttled == 1
+    assert limiter.retried == 1
+    assert limiter.limit == pytest.approx(7.0)
+    assert limiter.in_flight == 0
+
+
+def test_persistent_429_gives_up_after_max_retries():
+    limiter = AdaptiveLimiter("test-429-max", max_retries=2)
+    calls = []
+
+    async def call():
+        calls.append(1)
+        raise RateLimited(retry_after_s=0)
+
+    with pytest.raises(RateLimited):
+        asyncio.run(limiter.run(call))
+    assert len(calls) == 3
+    assert limiter.in_flight == 0
+
+
+def test_burst_of_429s_from_in_flight_calls_counts_once():
+    limiter = AdaptiveLimiter("test-429-burst", max_concurrency=8, max_retries=0)
+
+    async def call():
+        await asyncio.sleep(0.01)
+        raise RateLimited(retry_after_s=0)
+
+    async def main():
+        return await asyncio.gather(*(limiter.run(call) for _ in range(8)), return_exceptions=True)
+
+    assert all(isinstance(r, RateLimited) for r in asyncio.run(main()))
+    assert limiter.throttled == 8
+    assert limiter.decreases == 1
+    assert limiter.concurrency_limit == 5
+
+
+def test_limit_grows_back_while_saturated():
+    limiter = AdaptiveLimiter("test-aimd", max_concurrency=4)
+    limiter.limit = 2.0
+
+    async def call():
+        await asyncio.sleep(0.001)
+
+    async def main():
+        for _ in range(10):
+            await asyncio.gather(limiter.run(call), limiter.run(call), limiter.run(call))
+
+    asyncio.run(main())
+    assert 2.0 < limiter.limit <= 4.0
+
+
+def test_calls_past_their_deadline_are_rejected_not_queued():
+    limiter = AdaptiveLimiter("test-deadline", max_concurrency=1, min_concurrency=1)
+
+    async def main():
+        slow = asyncio.create_task(limiter.run(lambda: asyncio.sleep(0.2)))
+        await asyncio.sleep(0)
+        with pytest.raises(LimiterRejected):
+            await limiter.run(lambda: asyncio.sleep(0), deadline=time.monotonic() + 0.02)
+        await slow
+
+    asyncio.run(main())
+    assert limiter.rejected_deadline == 1
+    assert limiter.queue_depth == 0
+
+
+def test_full_queue_rejects_immediately():
+    limiter = AdaptiveLimiter("test-queue", max_concurrency=1, max_queue=1)
+
+    async def main():
+        running = asyncio.create_task(limiter.run(lambda: asyncio.sleep(0.05)))
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(limiter.run(lambda: asyncio.sleep(0)))
+        await asyncio.sleep(0)
+        with pytest.raises(LimiterRejected):
+            await limiter.run(lambda: asyncio.sleep(0))
+        await asyncio.gather(running, queued)
+
+    asyncio.run(main())
+    assert limiter.rejected_queue_full == 1
+    assert limiter.completed == 2
@@ -0,0 +1,149 @@
+import asyncio
+
+import pytest
+
+from app.services.stage_dag import STATUS_KEY, Stage, StageGraph, reset_deadline, set_deadline
+
+
+async def value(result, delay=0.0):
+    await asyncio.sleep(delay)
+    return result
+
+
+def run(graph, inputs=None, deadline_s=None, limits=None):
+    async def main():
+        token = set_deadline(deadline_s) if deadline_s is not None else None
+        try:
+            return await graph.run(inputs or {}, limits)
+        finally:
+            if token is not None:
+                reset_deadline(token)
+
+    return asyncio.run(main())
+
+
+def test_stages_see_inputs_and_earlier_results():
+    graph = StageGraph("test-deps", [
+        Stage("a", lambda r: value(r["x"] + 1)),
+        Stage("b", lambda r: value(r["a"] * 2), deps=("a",)),
+        Stage("c", lambda r: value(dict(r[STATUS_KEY])), deps=("b",)),
+    ])
+    results, status = run(graph, {"x": 1})
+    assert results["b"] == 4
+    assert results["c"] == {"a": "ok", "b": "ok"}
+    assert status == {"a": "ok", "b": "ok", "c": "ok"}
+
+
+def test_missing_inputs_and_cycles_are_rejected():
+    with pytest.raises(ValueError):
+        StageGraph("test-cycle", [Stage("a", value, deps=("b",)), Stage("b", value, deps=("a",))])
+    with pytest.raises(ValueError):
+        run(StageGraph("test-inputs", [Stage("a", value, deps=("x",))]))
+
+
+def test_failed_stage_falls_back():
+    async def boom(r):
+        raise RuntimeError("provider down")
+
+    graph = StageGraph("test-fail", [
+        Stage("a", boom, fallback=lambda r: "default"),
+        Stage("b", lambda r: value(r["a"]), deps=("a",)),
+    ])
+    results, status = run(graph)
+    assert results["b"] == "default"
+    assert status["a"] == "failed"
+
+
+def test_failure_without_fallback_fails_the_run():
+    async def boom(r):
+        raise RuntimeError("provider down")
+
+    with pytest.raises(RuntimeError):
+        run(StageGraph("test-fail-hard", [Stage("a", boom)]))
+
+
+def test_stage_times_out_at_the_request_deadline():
+    graph = StageGraph("test-deadline", [
+        Stage("slow", lambda r: value("late", 1.0), fallback=lambda r: "fallback"),
+        Stage("local", lambda r: value(r["slow"] + "!", 0.05), deps=("slow",), deadline=False),
+    ])
+    results, status = run(graph, deadline_s=0.05)
+    assert results["local"] == "fallback!"
+    assert status == {"slow": "timeout", "local": "ok"}
+
+
+def test_stage_timeout_s_applies_without_a_deadline():
+    graph = StageGraph("test-timeout", [Stage("slow", lambda r: value("late", 1.0), fallback=lambda r: None, timeout_s=0.05)])
+    _, status = run(graph)
+    assert status["slow"] == "timeout"
+
+
+def test_optional_stage_is_degraded_after_the_grace_period():
+    graph = StageGraph("test-optional", [
+        Stage("required", lambda r: value("x")),
+        Stage("extra", lambda r: value("slow", 1.0), optional=True, fallback=lambda r: "skipped"),
+        Stage("consumer", lambda r: value((r["required"], r["extra"])), deps=("required", "extra")),
+    ], grace_s=0.05)
+    results, status = run(graph)
+    assert results["consumer"] == ("x", "skipped")
+    assert status["extra"] == "degraded"
+
+
+def test_optional_stage_needs_a_fallback():
+    with pytest.raises(ValueError):
+        Stage("extra", value, optional=True)
+
+
+def test_limits_bound_a_stage_across_runs():
+    active, peak = [0], [0]
+
+    async def work(r):
+        active[0] += 1
+        peak[0] = max(peak[0], active[0])
+        await asyncio.sleep(0.01)
+        active[0] -= 1
+
+    graph = StageGraph("test-limits", [Stage("store", work)])
+
+    async def main():
+        limit = asyncio.Semaphore(2)
+        await asyncio.gather(*(graph.run({}, {"store": limit}) for _ in range(6)))
+
+    asyncio.run(main())
+    assert peak[0] == 2
+
+
+def test_grace_period_waits_for_the_optional_stage_inputs():
+    graph = StageGraph("test-optional-upstream", [
+        Stage("embed", lambda r: value("vector", 0.2)),
+        Stage("lookup", lambda r: value(r["embed"] + " match"), deps=("embed",), optional=True, fallback=lambda r: None),
+        Stage("consumer", lambda r: value(r["lookup"]), deps=("lookup",)),
+    ], grace_s=0.05)
+    results, status = run(graph)
+    assert results["consumer"] == "vector match"
+    assert status["lookup"] == "ok"
+
+
+def test_skipped_lookup_does_not_degrade_the_verdict():
+    from app.services.llm_agent import degraded_stages
+
+    assert degraded_stages({"embed": "timeout", "near_duplicate": "degraded", "analyze": "ok", "sentiment": "ok"}) == []
+    assert degraded_stages({"near_duplicate": "degraded", "analyze": "timeout", "sentiment": "degraded"}) == ["analyze", "sentiment"]
+
+
+def test_waiting_for_a_limit_is_not_charged_to_the_deadline():
+    graph = StageGraph("test-limit-deadline", [Stage("work", lambda r: value("done", 0.05), fallback=lambda r: "late")])
+
+    async def main():
+        limit = asyncio.Semaphore(1)
+        await limit.acquire()
+        asyncio.get_running_loop().call_later(0.15, limit.release)
+        token = set_deadline(0.1)
+        try:
+            return await graph.run({}, {"work": limit})
+        finally:
+            reset_deadline(token)
+
+    results, status = asyncio.run(main())
+    assert results["work"] == "done"
+    assert status["work"] == "ok"
@@ -30,6 +30,9 @@ const VerificationWorkbench = () => {
     if (!lastMessage || typeof lastMessage !== 'object') return;
     if (lastMessage.type === 'log' && lastMessage.payload) {
       setLogs((prev) => [lastMessage.payload, ...prev].slice(0, 200));
+    } else if (lastMessage.type === 'log_batch' && Array.isArray(lastMessage.payload)) {
+      // Batched frames arrive oldest first; the list shows newest first
+      setLogs((prev) => [...[...lastMessage.payload].reverse(), ...prev].slice(0, 200));
     }
   }, [lastMessage]);
 